@@ -0,0 +1,28 @@
+"""drop users_rank materialized views
+
+Revision ID: 2e6a8d4f0b17
+Revises: 9d4f2b7c1e35
+Create Date: 2021-04-19 11:42:07.318525
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '2e6a8d4f0b17'
+down_revision = '9d4f2b7c1e35'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    # Leaderboards live in Redis now, and are loaded by the leaderboard job.
+    conn = op.get_bind()
+    sql = sa.text('''SELECT matviewname FROM pg_matviews
+                  WHERE matviewname LIKE 'users\\_rank%' ''')
+    for row in conn.execute(sql).fetchall():
+        op.execute('DROP MATERIALIZED VIEW IF EXISTS "%s"' % row[0])
+
+
+def downgrade():
+    # The views are created again on demand by the previous leaderboard job.
+    pass
@@ -0,0 +1,73 @@
+"""task info hash
+
+Revision ID: 4a7c3e9b2d58
+Revises: 2e6a8d4f0b17
+Create Date: 2021-04-26 10:05:44.619032
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '4a7c3e9b2d58'
+down_revision = '2e6a8d4f0b17'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+FUNCTIONS = r'''
+CREATE OR REPLACE FUNCTION jsonb_normalize_numbers(value jsonb)
+RETURNS jsonb AS $$
+DECLARE
+    number numeric;
+BEGIN
+    CASE jsonb_typeof(value)
+    WHEN 'object' THEN
+        RETURN (SELECT COALESCE(jsonb_object_agg(
+                    key, jsonb_normalize_numbers(item)), '{}')
+                FROM jsonb_each(value) AS element(key, item));
+    WHEN 'array' THEN
+        RETURN (SELECT COALESCE(jsonb_agg(
+                    jsonb_normalize_numbers(item) ORDER BY position), '[]')
+                FROM jsonb_array_elements(value)
+                WITH ORDINALITY AS element(item, position));
+    WHEN 'number' THEN
+        number := value::text::numeric;
+        IF number = trunc(number) THEN
+            RETURN to_jsonb(trunc(number));
+        END IF;
+        RETURN to_jsonb(rtrim(number::text, '0')::numeric);
+    ELSE
+        RETURN value;
+    END CASE;
+END
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION task_info_hash(info jsonb)
+RETURNS text AS $$
+    SELECT md5(jsonb_normalize_numbers(info)::text)
+$$ LANGUAGE sql IMMUTABLE;
+'''
+
+
+def upgrade():
+    op.execute(FUNCTIONS)
+    op.add_column('task', sa.Column('info_hash', sa.Text))
+    # Only the first of the tasks repeated within a project gets the hash.
+    op.execute('''
+        UPDATE task SET info_hash=first.info_hash
+        FROM (SELECT DISTINCT ON (project_id, task_info_hash(info)) id,
+              task_info_hash(info) AS info_hash FROM task
+              WHERE info IS NOT NULL
+              ORDER BY project_id, task_info_hash(info), id) AS first
+        WHERE task.id=first.id''')
+    op.execute('COMMIT')
+    op.execute('''CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS
+                  task_project_id_info_hash_key
+                  ON task (project_id, info_hash)''')
+
+
+def downgrade():
+    op.execute('DROP INDEX IF EXISTS task_project_id_info_hash_key')
+    op.drop_column('task', 'info_hash')
+    op.execute('DROP FUNCTION IF EXISTS task_info_hash(jsonb)')
+    op.execute('DROP FUNCTION IF EXISTS jsonb_normalize_numbers(jsonb)')
@@ -0,0 +1,40 @@
+"""compact counter table
+
+Revision ID: 5c3a2b8e1f4d
+Revises: 31c3c2ff9fab
+Create Date: 2021-03-15 10:02:11.413520
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5c3a2b8e1f4d'
+down_revision = '31c3c2ff9fab'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    # Fold every +1/-1 delta into a single row per task
+    sql = '''
+          WITH totals AS (
+          SELECT task_id, MIN(id) AS id, SUM(n_task_runs) AS n_task_runs
+          FROM counter GROUP BY task_id)
+          UPDATE counter SET n_task_runs=totals.n_task_runs
+          FROM totals WHERE counter.id=totals.id;
+          '''
+    op.execute(sql)
+    sql = '''
+          DELETE FROM counter USING (
+          SELECT task_id, MIN(id) AS id FROM counter GROUP BY task_id) AS keep
+          WHERE counter.task_id=keep.task_id AND counter.id<>keep.id;
+          '''
+    op.execute(sql)
+    op.create_unique_constraint('counter_task_id_key', 'counter', ['task_id'])
+    op.create_index('counter_project_id_n_task_runs_idx', 'counter',
+                    ['project_id', 'n_task_runs', 'task_id'])
+
+
+def downgrade():
+    op.drop_index('counter_project_id_n_task_runs_idx', 'counter')
+    op.drop_constraint('counter_task_id_key', 'counter')
@@ -0,0 +1,69 @@
+"""timestamp range indexes
+
+Revision ID: 7b1e9c4d2a60
+Revises: 5c3a2b8e1f4d
+Create Date: 2021-04-06 09:41:27.220418
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '7b1e9c4d2a60'
+down_revision = '5c3a2b8e1f4d'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+FUNCTION = r'''
+CREATE OR REPLACE FUNCTION pybossa_timestamp(value text)
+RETURNS timestamp AS $$
+    SELECT CASE
+        WHEN value ~ '^\d{4}-\d{2}-\d{2}([T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?$'
+        THEN value::timestamp
+        -- The offset is explicit, so the result does not depend on the
+        -- TimeZone setting and the function stays immutable.
+        WHEN value ~ ('^\d{4}-\d{2}-\d{2}([T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?'
+                      '([+-]\d{2}(:?\d{2})?|Z)$')
+        THEN value::timestamptz AT TIME ZONE 'UTC'
+    END
+$$ LANGUAGE sql IMMUTABLE;
+'''
+
+INDEXES = [
+    ('task_run_project_id_finish_time_idx', 'task_run',
+     'project_id, pybossa_timestamp(finish_time)'),
+    ('task_run_finish_time_idx', 'task_run', 'pybossa_timestamp(finish_time)'),
+    ('task_created_idx', 'task', 'pybossa_timestamp(created)'),
+    ('project_created_idx', 'project', 'pybossa_timestamp(created)'),
+    ('project_updated_idx', 'project', 'pybossa_timestamp(updated)'),
+    ('user_created_idx', '"user"', 'pybossa_timestamp(created)'),
+    ('auditlog_created_idx', 'auditlog', 'pybossa_timestamp(created)'),
+]
+
+# Dashboard views are only created when missing, drop them so they are
+# created again with the range predicates.
+VIEWS = ['dashboard_week_users', 'dashboard_week_anon',
+         'dashboard_week_project_draft', 'dashboard_week_project_published',
+         'dashboard_week_project_update', 'dashboard_week_new_task',
+         'dashboard_week_new_task_run', 'dashboard_week_new_users',
+         'dashboard_week_returning_users']
+
+
+def upgrade():
+    op.execute(FUNCTION)
+    for view in VIEWS:
+        op.execute('DROP MATERIALIZED VIEW IF EXISTS %s' % view)
+    # Build the indexes without locking writes on the big tables, which
+    # cannot be done inside a transaction.
+    op.execute('COMMIT')
+    for name, table, columns in INDEXES:
+        op.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS %s ON %s (%s)'
+                   % (name, table, columns))
+
+
+def downgrade():
+    for view in VIEWS:
+        op.execute('DROP MATERIALIZED VIEW IF EXISTS %s' % view)
+    for name, _, _ in INDEXES:
+        op.execute('DROP INDEX IF EXISTS %s' % name)
+    op.execute('DROP FUNCTION IF EXISTS pybossa_timestamp(text)')
@@ -0,0 +1,72 @@
+"""contribution rollups
+
+Revision ID: 9d4f2b7c1e35
+Revises: 7b1e9c4d2a60
+Create Date: 2021-04-12 16:20:53.104238
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '9d4f2b7c1e35'
+down_revision = '7b1e9c4d2a60'
+
+from sqlalchemy.dialects.postgresql import TIMESTAMP
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'project_hourly_stats',
+        sa.Column('project_id', sa.Integer,
+                  sa.ForeignKey('project.id', ondelete='CASCADE'),
+                  primary_key=True),
+        sa.Column('hour', TIMESTAMP, primary_key=True),
+        sa.Column('n_task_runs', sa.Integer, nullable=False, default=0),
+        sa.Column('n_auth', sa.Integer, nullable=False, default=0),
+        sa.Column('n_anon', sa.Integer, nullable=False, default=0),
+        sa.Column('n_completed', sa.Integer, nullable=False, default=0)
+    )
+    op.create_table(
+        'project_daily_contributor',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('project_id', sa.Integer,
+                  sa.ForeignKey('project.id', ondelete='CASCADE'),
+                  nullable=False),
+        sa.Column('day', sa.Date, nullable=False),
+        sa.Column('user_id', sa.Integer),
+        sa.Column('user_ip', sa.Text),
+        sa.Column('n_task_runs', sa.Integer, nullable=False, default=0)
+    )
+    op.execute('''CREATE UNIQUE INDEX project_daily_contributor_key
+                  ON project_daily_contributor (project_id, day,
+                  COALESCE(user_id, 0), COALESCE(user_ip, ''))''')
+    # Fill them with the task runs saved so far
+    op.execute('''
+        INSERT INTO project_hourly_stats
+        (project_id, hour, n_task_runs, n_auth, n_anon, n_completed)
+        SELECT project_id, DATE_TRUNC('hour', finish_time), COUNT(id),
+        COUNT(id) FILTER (WHERE user_ip IS NULL),
+        COUNT(id) FILTER (WHERE user_id IS NULL),
+        COUNT(id) FILTER (WHERE completes)
+        FROM (SELECT task_run.id, task_run.project_id, task_run.user_id,
+              task_run.user_ip,
+              pybossa_timestamp(task_run.finish_time) AS finish_time,
+              ROW_NUMBER() OVER (
+                  PARTITION BY task_run.task_id, task_run.project_id
+                  ORDER BY task_run.id) = task.n_answers AS completes
+              FROM task_run JOIN task ON task.id=task_run.task_id) AS runs
+        WHERE finish_time IS NOT NULL
+        GROUP BY 1, 2''')
+    op.execute('''
+        INSERT INTO project_daily_contributor
+        (project_id, day, user_id, user_ip, n_task_runs)
+        SELECT project_id, pybossa_timestamp(finish_time)::date,
+        user_id, user_ip, COUNT(id) FROM task_run
+        WHERE pybossa_timestamp(finish_time) IS NOT NULL
+        GROUP BY 1, 2, 3, 4''')
+
+
+def downgrade():
+    op.drop_table('project_daily_contributor')
+    op.drop_table('project_hourly_stats')
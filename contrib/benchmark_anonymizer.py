@@ -0,0 +1,77 @@
+# -*- coding: utf8 -*-
+# This file is part of PYBOSSA.
+#
+# Copyright (C) 2015 Scifabric LTD.
+#
+# PYBOSSA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PYBOSSA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Compare the IP anonymizer with expanding the CryptoPAn key on every call,
+as it was done for every anonymous contribution.
+
+Usage:
+    python contrib/benchmark_anonymizer.py [--ips 100] [--number 1000]
+
+Calls cycle over --ips distinct IPs, like that many anonymous volunteers
+asking for tasks and posting answers in turns.
+"""
+import argparse
+import itertools
+import sys
+import os
+import timeit
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from yacryptopan import CryptoPAn  # noqa
+from pybossa.anonymizer import Anonymizer  # noqa
+
+
+KEY = '32-char-str-for-AES-key-and-pad.'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--ips', type=int, default=100,
+                        help='distinct IPs anonymized')
+    parser.add_argument('--number', type=int, default=1000,
+                        help='calls of every timing')
+    parser.add_argument('--cache-size', type=int, default=4096,
+                        help='ANONYMIZER_CACHE_SIZE')
+    args = parser.parse_args()
+    ips = ['10.%d.%d.%d' % (i >> 16 & 255, i >> 8 & 255, i & 255)
+           for i in range(args.ips)]
+    anonymizer = Anonymizer()
+    anonymizer.init_app(SimpleNamespace(config=dict(
+        CRYPTOPAN_KEY=KEY, ANONYMIZER_CACHE_SIZE=args.cache_size)))
+
+    uncached_ips, cached_ips = itertools.cycle(ips), itertools.cycle(ips)
+
+    def uncached():
+        return CryptoPAn(KEY.encode()).anonymize(next(uncached_ips))
+
+    def cached():
+        return anonymizer.ip(next(cached_ips))
+
+    assert uncached() == cached()
+    print('%-24s %12s' % ('anonymize', 'us per call'))
+    for name, func in [('key expanded per call', uncached),
+                       ('Anonymizer.ip', cached)]:
+        seconds = timeit.timeit(func, number=args.number)
+        print('%-24s %12.1f' % (name, seconds * 1e6 / args.number))
+    print('Anonymizer.ip %s' % (anonymizer.ip.cache_info(),))
+
+
+if __name__ == '__main__':
+    main()
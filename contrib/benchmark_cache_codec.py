@@ -0,0 +1,120 @@
+# -*- coding: utf8 -*-
+# This file is part of PYBOSSA.
+#
+# Copyright (C) 2015 Scifabric LTD.
+#
+# PYBOSSA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PYBOSSA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Compare the cache codecs on payloads shaped like the ones of
+cached_projects.get_all(category) and cached_users.get_user_summary.
+
+Usage:
+    python contrib/benchmark_cache_codec.py [--projects 200] [--redis HOST]
+
+For every codec it prints the serialized size, the memory Redis reports for
+the key when --redis is given, and the time to dump and load the payload.
+"""
+import argparse
+import sys
+import os
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pybossa.cache.serialization import get_codec  # noqa
+
+
+CODECS = [('pickle', None), ('msgpack', None), ('msgpack', 'zlib'),
+          ('msgpack', 'lz4')]
+
+
+def projects_payload(n):
+    return [dict(id=i, name='Project %d' % i, short_name='project%d' % i,
+                 created='2019-01-01T00:00:00.%06d' % i, updated=None,
+                 description='Help us classify the images of project %d' % i,
+                 owner='owner%d' % (i % 20), last_activity='2 days ago',
+                 last_activity_raw='2019-01-03T00:00:00.000000',
+                 overall_progress=i % 100, n_tasks=1000 + i,
+                 n_volunteers=i * 3,
+                 info=dict(thumbnail='thumb_%d.png' % i,
+                           container='user_%d' % (i % 20),
+                           thumbnail_url='/uploads/user_%d/thumb_%d.png'
+                           % (i % 20, i),
+                           task_presenter='<div class="row">%s</div>'
+                           % ('<p>presenter</p>' * 10)))
+            for i in range(n)]
+
+
+def user_summary_payload():
+    return dict(id=1, name='johndoe', fullname='John Doe',
+                created='2019-01-01T00:00:00.000000',
+                api_key='6f4b1e61-2b88-4bb7-bd5b-4bfd5f8e0a38',
+                info=dict(avatar='avatar.png', container='user_1',
+                          extra=dict(('key%d' % i, i) for i in range(20))),
+                admin=False, locale='en', email_addr='johndoe@example.com',
+                n_answers=1234, valid_email=True,
+                confirmation_email_sent=False, restrict=False,
+                registered_ago='2 years ago', rank=10, score=1234, total=5000)
+
+
+def redis_memory(conn, key, data):
+    conn.set(key, data)
+    try:
+        return conn.memory_usage(key)
+    finally:
+        conn.delete(key)
+
+
+def run(name, payload, conn, number):
+    print('%s' % name)
+    print('  %-16s %10s %10s %12s %12s' % ('codec', 'bytes', 'redis',
+                                           'dump (us)', 'load (us)'))
+    for codec_name, compression in CODECS:
+        try:
+            codec = get_codec(codec_name, compression, threshold=1024)
+        except ImportError as e:
+            print('  %-16s skipped: %s' % (codec_name, e))
+            continue
+        data = codec.dumps(payload)
+        assert codec.loads(data) == payload
+        dump = timeit.timeit(lambda: codec.dumps(payload), number=number)
+        load = timeit.timeit(lambda: codec.loads(data), number=number)
+        memory = '-'
+        if conn is not None:
+            memory = redis_memory(conn, 'pybossa_cache:benchmark', data)
+        label = codec_name + ('+%s' % compression if compression else '')
+        print('  %-16s %10d %10s %12.1f %12.1f' % (
+            label, len(data), memory, dump * 1e6 / number,
+            load * 1e6 / number))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--projects', type=int, default=200,
+                        help='projects returned by get_all(category)')
+    parser.add_argument('--number', type=int, default=200,
+                        help='iterations of every timing')
+    parser.add_argument('--redis', help='Redis host to measure memory on')
+    args = parser.parse_args()
+    conn = None
+    if args.redis:
+        from redis import StrictRedis
+        conn = StrictRedis(host=args.redis)
+    run('get_all(category), %d projects' % args.projects,
+        projects_payload(args.projects), conn, args.number)
+    run('get_user_summary', user_summary_payload(), conn, args.number)
+
+
+if __name__ == '__main__':
+    main()
@@ -16,11 +16,18 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 
+from functools import lru_cache
 from yacryptopan import CryptoPAn
 
 
 class Anonymizer(object):
 
+    """Anonymize IPs with the CRYPTOPAN_KEY of the app.
+
+    The key is expanded once per process, and the last ANONYMIZER_CACHE_SIZE
+    anonymized IPs are remembered, as the same anonymous volunteer asks for
+    tasks and posts answers many times in a row."""
+
     def __init__(self, app=None):
         self.app = app
         if app is not None:  # pragma: no cover
@@ -28,4 +35,5 @@ class Anonymizer(object):
 
     def init_app(self, app):
         cp = CryptoPAn(str.encode(app.config.get('CRYPTOPAN_KEY')))
-        self.ip = cp.anonymize
+        maxsize = app.config.get('ANONYMIZER_CACHE_SIZE', 4096)
+        self.ip = lru_cache(maxsize=maxsize)(cp.anonymize)
@@ -64,6 +64,8 @@ from werkzeug.exceptions import MethodNotAllowed
 
 blueprint = Blueprint('api', __name__)
 
+PREFETCH_LIMIT = 50
+
 error = ErrorStatus()
 
 
@@ -115,6 +117,15 @@ register_api(FavoritesAPI, 'api_favorites', '/favorites',
              pk='oid', pk_type='int')
 
 
+@jsonpify
+@csrf.exempt
+@blueprint.route('/taskrun/bulk', methods=['POST'])
+@ratelimit(limit=ratelimits.get('LIMIT'), per=ratelimits.get('PER'))
+def taskrun_bulk():
+    """Save a list of task runs in a single request."""
+    return TaskRunAPI().post_bulk()
+
+
 @jsonpify
 @blueprint.route('/project/<project_id>/newtask')
 @ratelimit(limit=ratelimits.get('LIMIT'), per=ratelimits.get('PER'))
@@ -130,8 +141,7 @@ def new_task(project_id):
         # If there is a task for the user, return it
         if tasks is not None:
             guard = ContributionsGuard(sentinel.master)
-            for task in tasks:
-                guard.stamp(task, get_user_id_or_ip())
+            guard.stamp_many(tasks, get_user_id_or_ip())
             data = [task.dictize() for task in tasks]
             if len(data) == 0:
                 response = make_response(json.dumps({}))
@@ -146,7 +156,60 @@ def new_task(project_id):
         return error.format_exception(e, target='project', action='GET')
 
 
-def _retrieve_new_task(project_id):
+@jsonpify
+@blueprint.route('/project/<int:project_id>/prefetch')
+@ratelimit(limit=ratelimits.get('LIMIT'), per=ratelimits.get('PER'))
+def prefetch_tasks(project_id):
+    """Return a batch of new tasks leased to the user in one request."""
+    try:
+        tasks = _retrieve_new_task(project_id, default_limit=PREFETCH_LIMIT)
+
+        if type(tasks) is Response:
+            return tasks
+
+        tasks = tasks or []
+        guard = ContributionsGuard(sentinel.master)
+        expiration = guard.stamp_many(tasks, get_user_id_or_ip())
+        data = dict(tasks=[task.dictize() for task in tasks],
+                    lease_expires=dict((task.id, expiration)
+                                       for task in tasks))
+        return Response(json.dumps(data), mimetype="application/json")
+    except Exception as e:
+        return error.format_exception(e, target='project', action='GET')
+
+
+@jsonpify
+@csrf.exempt
+@blueprint.route('/project/<int:project_id>/release', methods=['POST'])
+@ratelimit(limit=ratelimits.get('LIMIT'), per=ratelimits.get('PER'))
+def release_tasks(project_id):
+    """Release the leases of prefetched tasks the user will not answer."""
+    try:
+        data = json.loads(request.data or '{}')
+        task_ids = [int(task_id) for task_id in data.get('task_ids', [])]
+        user = get_user_id_or_ip()
+        guard = ContributionsGuard(sentinel.master)
+        released = guard.release_many(task_ids, user)
+        if sched.get_project_scheduler(project_id, sched.session) == 'locked':
+            uid = user['user_id'] or user['external_uid'] or \
+                user['user_ip'] or '127.0.0.1'
+            pipeline = sentinel.master.pipeline(transaction=False)
+            for task_id in task_ids:
+                pipeline.hexists(sched.get_task_users_key(task_id), uid)
+            held = [task_id for task_id, locked
+                    in zip(task_ids, pipeline.execute()) if locked]
+            pipeline = sentinel.master.pipeline(transaction=True)
+            for task_id in held:
+                sched.release_lock(task_id, uid, sched.TIMEOUT,
+                                   pipeline=pipeline, execute=False)
+            pipeline.execute()
+        return Response(json.dumps(dict(released=released)),
+                        mimetype="application/json")
+    except Exception as e:
+        return error.format_exception(e, target='project', action='POST')
+
+
+def _retrieve_new_task(project_id, default_limit=1):
 
     project = project_repo.get(project_id)
 
@@ -168,7 +231,7 @@ def _retrieve_new_task(project_id):
     if request.args.get('limit'):
         limit = int(request.args.get('limit'))
     else:
-        limit = 1
+        limit = default_limit
 
     if limit > 100:
         limit = 100
@@ -28,15 +28,19 @@ This package adds GET, POST, PUT and DELETE methods for any class:
 """
 import six
 import json
+import base64
+from itertools import islice
+from urllib.parse import urlencode
 from flask import request, abort, Response, current_app
+from flask import stream_with_context
 from flask_login import current_user
 from flask.views import MethodView
-from werkzeug.exceptions import NotFound, Unauthorized, Forbidden
-from werkzeug.exceptions import MethodNotAllowed
+from werkzeug.exceptions import NotFound
+from werkzeug.exceptions import MethodNotAllowed, BadRequest
 from pybossa.util import jsonpify, fuzzyboolean, get_avatar_url
-from pybossa.util import get_user_id_or_ip
+from pybossa.util import get_user_id_or_ip, get_etag, set_etag, not_modified
 from pybossa.core import ratelimits, uploader
-from pybossa.auth import ensure_authorized_to
+from pybossa.auth import ensure_authorized_to, authorize_many
 from pybossa.hateoas import Hateoas
 from pybossa.ratelimit import ratelimit
 from pybossa.error import ErrorStatus
@@ -96,6 +100,12 @@ class APIBase(MethodView):
 
     hateoas = Hateoas()
 
+    # Whether GET can stream all the matching items as NDJSON.
+    streamable = False
+
+    # Items streamed as NDJSON whose related objects are loaded together.
+    related_batch_size = 100
+
     allowed_classes_upload = ['blogpost',
                               'helpingmaterial',
                               'announcement',
@@ -135,111 +145,255 @@ class APIBase(MethodView):
         """
         try:
             ensure_authorized_to('read', self.__class__)
-            query = self._db_query(oid)
+            if oid is None and self._wants_ndjson():
+                return self._create_ndjson_response()
+            public = not request.args.get('participated')
+            etag = None
+            if self._has_etag():
+                if request.if_none_match:
+                    response = not_modified(self._get_etag(oid), public)
+                    if response is not None:
+                        return response
+                query, fingerprint = self._db_query(oid, fingerprint=True)
+                etag = get_etag(self.__class__.__name__, fingerprint)
+            else:
+                query = self._db_query(oid)
             json_response = self._create_json_response(query, oid)
-            return Response(json_response, mimetype='application/json')
+            response = Response(json_response, mimetype='application/json')
+            if oid is None:
+                self._add_next_link(response, query, self._get_desc())
+            return set_etag(response, etag, public)
         except Exception as e:
             return error.format_exception(
                 e,
                 target=self.__class__.__name__.lower(),
                 action='GET')
 
+    def _has_etag(self):
+        """Return whether the response gets an ETag. Responses with related
+        or stats data also depend on other tables, and have none."""
+        return not (request.args.get('related') or
+                    request.args.get('stats') or
+                    request.args.get('fulltextsearch'))
+
+    def _get_etag(self, oid):
+        """Return the ETag of the response, derived from the hashes of the
+        rows it is built from, which the DB computes without loading them.
+
+        The ETag includes the user, so it only matches a response this user
+        was authorized to read. Responses answered with 200 get the same
+        ETag from the hashes loaded with their rows."""
+        repo_info = repos[self.__class__.__name__]
+        if oid is None:
+            limit, offset, orderby = self._set_limit_and_offset()
+            fingerprint = self._filter_query(repo_info, limit, offset,
+                                             orderby, fingerprint=True)
+        else:
+            fingerprint = repo_info['repo'].get_fingerprint(self.__class__,
+                                                            oid)
+            if fingerprint is None:
+                return None
+        return get_etag(self.__class__.__name__, fingerprint)
+
+    def _unpack_result(self, result):
+        """Return the (item, headline, rank) of a row of the query."""
+        # This is for n_favs orderby case
+        if not isinstance(result, DomainObject):
+            if 'n_favs' in list(result.keys()):
+                result = result[0]
+        if (result.__class__ != self.__class__):
+            return result
+        return result, None, None
+
     def _create_json_response(self, query_result, oid):
         if len(query_result) == 1 and query_result[0] is None:
             raise abort(404)
+        query_result = [self._unpack_result(result)
+                        for result in query_result]
+        if oid is not None:
+            ensure_authorized_to('read', query_result[0][0])
+        else:
+            # Items the user cannot read (401 or 403) are left out
+            authorized = authorize_many('read', [item for item, _, _
+                                                 in query_result])
+            query_result = [row for row, allowed
+                            in zip(query_result, authorized) if allowed]
+        related = self._load_related([item for item, _, _ in query_result])
         items = []
-        for result in query_result:
-            # This is for n_favs orderby case
-            if not isinstance(result, DomainObject):
-                if 'n_favs' in list(result.keys()):
-                    result = result[0]
-            try:
-                if (result.__class__ != self.__class__):
-                    (item, headline, rank) = result
-                else:
-                    item = result
-                    headline = None
-                    rank = None
-                datum = self._create_dict_from_model(item)
-                if headline:
-                    datum['headline'] = headline
-                if rank:
-                    datum['rank'] = rank
-                ensure_authorized_to('read', item)
-                items.append(datum)
-            except (Forbidden, Unauthorized):
-                # pass as it is 401 or 403
-                pass
-            except Exception:  # pragma: no cover
-                raise
+        for (item, headline, rank) in query_result:
+            datum = self._create_dict_from_model(item, related)
+            if headline:
+                datum['headline'] = headline
+            if rank:
+                datum['rank'] = rank
+            items.append(datum)
         if oid is not None:
-            ensure_authorized_to('read', query_result[0])
             items = items[0]
         return json.dumps(items)
 
-    def _create_dict_from_model(self, model):
-        return self._select_attributes(self._add_hateoas_links(model))
+    def _wants_ndjson(self):
+        if not self.streamable:
+            return False
+        best = request.accept_mimetypes.best_match(['application/json',
+                                                    'application/x-ndjson'])
+        return best == 'application/x-ndjson'
+
+    def _create_ndjson_response(self):
+        """Stream the items one JSON document per line.
 
-    def _add_hateoas_links(self, item):
+        The rows are read from a server side cursor as they are sent, so
+        limit is optional and not capped."""
+        repo_info = repos[self.__class__.__name__]
+        _, offset, orderby = self._set_limit_and_offset()
+        try:
+            limit = int(request.args.get('limit'))
+        except (ValueError, TypeError):
+            limit = None
+        results = self._filter_query(repo_info, limit, offset, orderby,
+                                     yielded=True)
+
+        def generate():
+            rows = iter(results)
+            while True:
+                batch = [self._unpack_result(result)
+                         for result in islice(rows, self.related_batch_size)]
+                if not batch:
+                    break
+                authorized = authorize_many('read', [item for item, _, _
+                                                     in batch])
+                batch = [row for row, allowed in zip(batch, authorized)
+                         if allowed]
+                related = self._load_related([item for item, _, _ in batch])
+                for (item, headline, rank) in batch:
+                    datum = self._create_dict_from_model(item, related)
+                    if headline:
+                        datum['headline'] = headline
+                    if rank:
+                        datum['rank'] = rank
+                    yield json.dumps(datum) + '\n'
+
+        return Response(stream_with_context(generate()),
+                        mimetype='application/x-ndjson')
+
+    def _get_desc(self):
+        if request.args.get('last_id'):
+            return False
+        desc = request.args.get('desc') if request.args.get('desc') else False
+        return fuzzyboolean(desc)
+
+    def _encode_cursor(self, item, orderby, desc):
+        """Return the opaque cursor of the items after item."""
+        if orderby == 'fav_user_ids':
+            value = len(item.fav_user_ids or [])
+        else:
+            value = getattr(item, orderby)
+        cursor = json.dumps([orderby, desc, value, item.id])
+        return base64.urlsafe_b64encode(cursor.encode('utf-8')).decode()
+
+    def _decode_cursor(self, orderby, desc):
+        """Return the (value, id) of the cursor arg, or None."""
+        cursor = request.args.get('cursor')
+        if not cursor:
+            return None
+        try:
+            cursor = base64.urlsafe_b64decode(cursor.encode('utf-8'))
+            _orderby, _desc, value, last_id = json.loads(cursor.decode())
+            last_id = int(last_id)
+        except (TypeError, ValueError):
+            raise BadRequest('Invalid cursor')
+        if _orderby != orderby or _desc != desc:
+            raise BadRequest('The cursor was created for another orderby')
+        return value, last_id
+
+    def _add_next_link(self, response, query_result, desc):
+        """Add a Link header with the URL of the next page when the current
+        one is full."""
+        limit, _, orderby = self._set_limit_and_offset()
+        if (not query_result or len(query_result) < limit or
+                request.args.get('fulltextsearch')):
+            return
+        item = self._unpack_result(query_result[-1])[0]
+        args = request.args.copy()
+        args.pop('offset', None)
+        args['cursor'] = self._encode_cursor(item, orderby, desc)
+        url = '%s?%s' % (request.base_url, urlencode(list(args.items(True))))
+        response.headers['Link'] = '<%s>; rel="next"' % url
+
+    def _create_dict_from_model(self, model, related=None):
+        return self._select_attributes(self._add_hateoas_links(model,
+                                                               related))
+
+    def _load_related(self, items):
+        """Return the related objects and stats of items, loaded with one
+        query per kind for all of them."""
+        cls = self.__class__.__name__
+        related = dict(tasks={}, task_runs={}, results={}, stats={})
+        if (request.args.get('related') and
+                cls in ['Task', 'TaskRun', 'Result']):
+            if cls == 'Task':
+                task_ids = set(item.id for item in items)
+            else:
+                task_ids = set(item.task_id for item in items)
+            if cls != 'Task':
+                for t in task_repo.get_tasks(task_ids):
+                    related['tasks'][t.id] = t.dictize()
+            if cls != 'TaskRun':
+                for tr in task_repo.filter_task_runs_by_task_ids(task_ids):
+                    related['task_runs'].setdefault(tr.task_id, []).append(
+                        tr.dictize())
+            if cls != 'Result':
+                for r in result_repo.filter_by_task_ids(task_ids):
+                    related['results'][r.task_id] = r.dictize()
+        if request.args.get('stats') and cls == 'Project':
+            project_ids = set(item.id for item in items)
+            for ps in project_stats_repo.filter_by_project_ids(project_ids):
+                related['stats'].setdefault(ps.project_id, ps.dictize())
+        return related
+
+    def _add_hateoas_links(self, item, related=None):
         obj = item.dictize()
-        related = request.args.get('related')
-        if related:
+        if related is None:
+            related = self._load_related([item])
+        if request.args.get('related'):
             if item.__class__.__name__ == 'Task':
-                obj['task_runs'] = []
-                obj['result'] = None
-                task_runs = task_repo.filter_task_runs_by(task_id=item.id)
-                results = result_repo.filter_by(
-                    task_id=item.id, last_version=True)
-                for tr in task_runs:
-                    obj['task_runs'].append(tr.dictize())
-                for r in results:
-                    obj['result'] = r.dictize()
+                obj['task_runs'] = related['task_runs'].get(item.id, [])
+                obj['result'] = related['results'].get(item.id)
 
             if item.__class__.__name__ == 'TaskRun':
-                tasks = task_repo.filter_tasks_by(id=item.task_id)
-                results = result_repo.filter_by(
-                    task_id=item.task_id, last_version=True)
-                obj['task'] = None
-                obj['result'] = None
-                for t in tasks:
-                    obj['task'] = t.dictize()
-                for r in results:
-                    obj['result'] = r.dictize()
+                obj['task'] = related['tasks'].get(item.task_id)
+                obj['result'] = related['results'].get(item.task_id)
 
             if item.__class__.__name__ == 'Result':
-                tasks = task_repo.filter_tasks_by(id=item.task_id)
-                task_runs = task_repo.filter_task_runs_by(task_id=item.task_id)
-                obj['task_runs'] = []
-                for t in tasks:
-                    obj['task'] = t.dictize()
-                for tr in task_runs:
-                    obj['task_runs'].append(tr.dictize())
-
-        stats = request.args.get('stats')
-        if stats:
+                if item.task_id in related['tasks']:
+                    obj['task'] = related['tasks'][item.task_id]
+                obj['task_runs'] = related['task_runs'].get(item.task_id, [])
+
+        if request.args.get('stats'):
             if item.__class__.__name__ == 'Project':
-                stats = project_stats_repo.filter_by(
-                    project_id=item.id, limit=1)
-                obj['stats'] = stats[0].dictize() if stats else {}
-
-        links, link = self.hateoas.create_links(item)
-        if links:
-            obj['links'] = links
-        if link:
-            obj['link'] = link
+                obj['stats'] = related['stats'].get(item.id, {})
+
+        if fuzzyboolean(request.args.get('links') or True):
+            links, link = self.hateoas.create_links(item)
+            if links:
+                obj['links'] = links
+            if link:
+                obj['link'] = link
         return obj
 
-    def _db_query(self, oid):
-        """Returns a list with the results of the query"""
+    def _db_query(self, oid, fingerprint=False):
+        """Returns a list with the results of the query. With fingerprint,
+        returns it together with the hashes of the rows."""
         repo_info = repos[self.__class__.__name__]
         if oid is None:
             limit, offset, orderby = self._set_limit_and_offset()
-            results = self._filter_query(repo_info, limit, offset, orderby)
-        else:
-            repo = repo_info['repo']
-            query_func = repo_info['get']
-            results = [getattr(repo, query_func)(oid)]
-        return results
+            return self._filter_query(repo_info, limit, offset, orderby,
+                                      with_fingerprint=fingerprint)
+        repo = repo_info['repo']
+        if fingerprint:
+            item, fingerprint = repo.get_with_fingerprint(self.__class__, oid)
+            return [item], fingerprint
+        query_func = repo_info['get']
+        return [getattr(repo, query_func)(oid)]
 
     def api_context(self, all_arg, **filters):
         if current_user.is_authenticated:
@@ -248,12 +402,15 @@ class APIBase(MethodView):
             del filters['owner_id']
         return filters
 
-    def _filter_query(self, repo_info, limit, offset, orderby):
+    def _filter_query(self, repo_info, limit, offset, orderby,
+                      yielded=False, fingerprint=False,
+                      with_fingerprint=False):
         filters = {}
         for k in list(request.args.keys()):
             if k not in ['limit', 'offset', 'api_key', 'last_id', 'all',
                          'fulltextsearch', 'desc', 'orderby', 'related',
-                         'participated', 'full', 'stats']:
+                         'participated', 'full', 'stats', 'cursor',
+                         'links']:
                 # Raise an error if the k arg is not a column
                 if self.__class__ == Task and k == 'external_uid':
                     pass
@@ -268,19 +425,27 @@ class APIBase(MethodView):
         if request.args.get('participated'):
             filters['participated'] = get_user_id_or_ip()
         fulltextsearch = request.args.get('fulltextsearch')
-        desc = request.args.get('desc') if request.args.get('desc') else False
-        desc = fuzzyboolean(desc)
+        desc = self._get_desc()
+        cursor = self._decode_cursor(orderby, desc)
+        if cursor:
+            filters['cursor'] = cursor
+        if fingerprint:
+            filters['fingerprint'] = True
+        if with_fingerprint:
+            filters['with_fingerprint'] = True
         if last_id:
             results = getattr(repo, query_func)(limit=limit, last_id=last_id,
                                                 fulltextsearch=fulltextsearch,
                                                 desc=False,
                                                 orderby=orderby,
+                                                yielded=yielded,
                                                 **filters)
         else:
             results = getattr(repo, query_func)(limit=limit, offset=offset,
                                                 fulltextsearch=fulltextsearch,
                                                 desc=desc,
                                                 orderby=orderby,
+                                                yielded=yielded,
                                                 **filters)
         return results
 
@@ -53,18 +53,21 @@ class FavoritesAPI(APIBase):
             uid = current_user.id
             limit, offset, orderby = self._set_limit_and_offset()
             last_id = request.args.get('last_id')
-            print(last_id)
             desc = request.args.get('desc') if request.args.get('desc') else False
             desc = fuzzyboolean(desc)
+            cursor = self._decode_cursor(orderby, desc)
 
             tasks = task_repo.filter_tasks_by_user_favorites(uid, limit=limit,
                                                              offset=offset,
                                                              orderby=orderby,
                                                              desc=desc,
-                                                             last_id=last_id)
+                                                             last_id=last_id,
+                                                             cursor=cursor)
             data = self._create_json_response(tasks, oid)
-            return Response(data, 200,
-                            mimetype='application/json')
+            response = Response(data, 200,
+                                mimetype='application/json')
+            self._add_next_link(response, tasks, desc)
+            return response
         except Exception as e:
             return error.format_exception(
                 e,
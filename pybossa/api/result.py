@@ -34,6 +34,7 @@ class ResultAPI(APIBase):
     __class__ = Result
     reserved_keys = set(['id', 'created', 'project_id',
                          'task_id', 'task_run_ids', 'last_version'])
+    streamable = True
 
     def _forbidden_attributes(self, data):
         for key in list(data.keys()):
@@ -29,14 +29,14 @@ from flask_login import current_user
 from pybossa.model.task_run import TaskRun
 from werkzeug.exceptions import Forbidden, BadRequest
 
-from .api_base import APIBase
+from .api_base import APIBase, error
 from pybossa.util import get_user_id_or_ip, get_avatar_url
 from pybossa.core import task_repo, sentinel, anonymizer, project_repo
 from pybossa.core import uploader
 from pybossa.contributions_guard import ContributionsGuard
 from pybossa.auth import jwt_authorize_project
 from pybossa.auth import ensure_authorized_to, is_authorized
-from pybossa.sched import can_post
+from pybossa.sched import can_post, get_project_scheduler, session
 
 
 class TaskRunAPI(APIBase):
@@ -45,6 +45,61 @@ class TaskRunAPI(APIBase):
 
     __class__ = TaskRun
     reserved_keys = set(['id', 'created', 'finish_time'])
+    bulk_limit = 100
+    streamable = True
+
+    def post_bulk(self):
+        """Post a list of task runs in a single transaction.
+
+        :returns: The JSON list of task runs stored in the DB
+
+        """
+        try:
+            self.valid_args()
+            data = json.loads(request.data)
+            if not isinstance(data, list) or len(data) == 0:
+                raise BadRequest("A list of task runs is expected")
+            if len(data) > self.bulk_limit:
+                raise BadRequest("Too many task runs in payload")
+            taskruns = self._create_instances_from_request(data)
+            task_repo.save_task_runs(taskruns)
+            ContributionsGuard(sentinel.master).release_many(
+                [taskrun.task_id for taskrun in taskruns],
+                get_user_id_or_ip())
+            json_response = json.dumps([taskrun.dictize()
+                                        for taskrun in taskruns])
+            return Response(json_response, mimetype='application/json')
+        except Exception as e:
+            return error.format_exception(e, target='taskrun', action='POST')
+
+    def _create_instances_from_request(self, data):
+        taskruns = []
+        for datum in data:
+            self._forbidden_attributes(datum)
+            taskruns.append(self.__class__(**self.hateoas.remove_links(datum)))
+        task_ids = [taskrun.task_id for taskrun in taskruns]
+        if len(set(task_ids)) != len(task_ids):
+            raise BadRequest("Duplicated task_id in payload")
+        user = get_user_id_or_ip()
+        tasks = dict((task.id, task) for task in task_repo.get_tasks(task_ids))
+        guard = ContributionsGuard(sentinel.master)
+        timestamps = guard.retrieve_timestamps(task_ids, user)
+        schedulers = dict()
+        for taskrun, timestamp in zip(taskruns, timestamps):
+            project_id = taskrun.project_id
+            if project_id not in schedulers:
+                schedulers[project_id] = get_project_scheduler(project_id,
+                                                               session)
+            if not can_post(project_id, taskrun.task_id, user,
+                            scheduler=schedulers[project_id]):
+                raise Forbidden("You must request a task first!")
+            self._validate_project_and_task(taskrun, tasks.get(taskrun.task_id))
+            if timestamp is None:
+                raise Forbidden('You must request a task first!')
+            self._add_user_info(taskrun)
+            taskrun.created = timestamp
+            ensure_authorized_to('create', taskrun)
+        return taskruns
 
     def check_can_post(self, project_id, task_id, user_ip_or_id):
         if not can_post(project_id, task_id, user_ip_or_id):
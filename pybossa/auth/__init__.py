@@ -16,12 +16,14 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 
+import hashlib
 import inspect
-from flask import abort
+from flask import abort, current_app, has_request_context, _request_ctx_stack
 from flask_login import current_user
 from pybossa.core import announcement_repo, task_repo, project_repo, result_repo
 from pybossa.core import project_stats_repo
 from pybossa.auth.errcodes import *
+from pybossa.cache.local import LocalCache
 
 import jwt
 from flask import jsonify
@@ -76,15 +78,68 @@ _auth_classes = {'project': project.ProjectAuth,
 
 
 def is_authorized(user, action, resource, **kwargs):
+    return _is_authorized(user, action, resource, _request_decisions(),
+                          **kwargs)
+
+
+def authorize_many(action, resources, **kwargs):
+    """Return whether current_user can do action on each of resources.
+
+    Decisions which only depend on the project of a resource are made once
+    per project, so the distinct parent projects are only looked up once.
+    """
+    decisions = _request_decisions()
+    if decisions is None:
+        decisions = {}
+    return [_is_authorized(current_user, action, resource, decisions,
+                           **kwargs)
+            for resource in resources]
+
+
+def _is_authorized(user, action, resource, decisions, **kwargs):
     is_class = inspect.isclass(resource)
     name = resource.__name__ if is_class else resource.__class__.__name__
     if resource == 'token':
         name = resource
-    resource = None if is_class else resource
     auth = _authorizer_for(name.lower())
     actions = _actions + auth.specific_actions
     assert action in actions, "%s is not a valid action" % action
-    return auth.can(user, action, resource, **kwargs)
+    key = None
+    if decisions is not None:
+        key = _decision_key(user, action, name, auth, resource, is_class,
+                            **kwargs)
+        if key in decisions:
+            return decisions[key]
+    resource = None if is_class else resource
+    authorized = auth.can(user, action, resource, **kwargs)
+    if key is not None:
+        decisions[key] = authorized
+    return authorized
+
+
+def _decision_key(user, action, name, auth, resource, is_class, **kwargs):
+    """Return the key a decision is remembered by, or None if it depends on
+    more than the user and the project of the resource."""
+    if action not in getattr(auth, 'project_scoped_actions', []):
+        return None
+    if set(kwargs) - set(['project_id']):
+        return None
+    project_id = kwargs.get('project_id')
+    if not is_class and project_id is None:
+        project_id = getattr(resource, 'project_id', None)
+    user_id = None if user.is_anonymous else user.id
+    return (user_id, action, name, is_class, project_id)
+
+
+def _request_decisions():
+    """Return the authorization decisions made during the current request,
+    or None outside of requests."""
+    if not has_request_context():
+        return None
+    ctx = _request_ctx_stack.top
+    if not hasattr(ctx, 'pybossa_authorizations'):
+        ctx.pybossa_authorizations = {}
+    return ctx.pybossa_authorizations
 
 
 def ensure_authorized_to(action, resource, **kwargs):
@@ -97,7 +152,12 @@ def ensure_authorized_to(action, resource, **kwargs):
     return authorized
 
 
+_authorizers = {}
+
+
 def _authorizer_for(resource_name):
+    if resource_name in _authorizers:
+        return _authorizers[resource_name]
     kwargs = {}
     if resource_name in ('project', 'taskrun'):
         kwargs.update({'task_repo': task_repo})
@@ -107,7 +167,10 @@ def _authorizer_for(resource_name):
         kwargs.update({'project_repo': project_repo})
     if resource_name in ('project', 'task', 'taskrun'):
         kwargs.update({'result_repo': result_repo})
-    return _auth_classes[resource_name](**kwargs)
+    # Authorizers keep no state besides the repositories.
+    auth = _auth_classes[resource_name](**kwargs)
+    _authorizers[resource_name] = auth
+    return auth
 
 
 def handle_error(error):
@@ -117,6 +180,30 @@ def handle_error(error):
     return resp
 
 
+_verified_tokens = None
+
+
+def _jwt_tokens():
+    """Return the LRU of the tokens verified in the last JWT_CACHE_TIMEOUT
+    seconds."""
+    global _verified_tokens
+    if _verified_tokens is None:
+        _verified_tokens = LocalCache(
+            current_app.config.get('JWT_CACHE_MAX_SIZE', 1024),
+            current_app.config.get('JWT_CACHE_TIMEOUT', 0), None)
+    return _verified_tokens
+
+
+def _jwt_token_key(project, token):
+    """Return the key of a token verified for a project. It changes with
+    the secret key, so tokens signed with an old one are verified again."""
+    if type(token) == bytes:
+        token = token.decode('utf-8')
+    key = '%s:%s:%s:%s' % (project.id, project.short_name,
+                           project.secret_key, token)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
 def jwt_authorize_project(project, payload):
     """Authorize the project for the payload."""
     try:
@@ -136,11 +223,19 @@ def jwt_authorize_project(project, payload):
         elif len(parts) > 2:
             return handle_error(INVALID_HEADER_BEARER_TOKEN)
 
+        tokens = _jwt_tokens()
+        key = _jwt_token_key(project, parts[1])
+        if tokens.enabled and tokens.get(key):
+            return True
         data = jwt.decode(parts[1],
                           project.secret_key,
                           'H256')
         if (data['project_id'] == project.id
             and data['short_name'] == project.short_name):
+            # Tokens not valid yet fail to decode, so only the expiration
+            # has to be checked again on a hit.
+            if tokens.enabled:
+                tokens.set(key, True, expires=data.get('exp'))
             return True
         else:
             return handle_error(WRONG_PROJECT_SIGNATURE)
@@ -19,6 +19,7 @@
 
 class PageAuth(object):
     _specific_actions = []
+    project_scoped_actions = ['read']
 
     def __init__(self, project_repo):
         self.project_repo = project_repo
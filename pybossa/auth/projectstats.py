@@ -20,6 +20,7 @@
 class ProjectStatsAuth(object):
 
     _specific_actions = []
+    project_scoped_actions = ['read']
 
     def __init__(self):
         pass
@@ -19,6 +19,7 @@
 
 class TaskAuth(object):
     _specific_actions = []
+    project_scoped_actions = ['read']
 
     def __init__(self, project_repo, result_repo):
         self.project_repo = project_repo
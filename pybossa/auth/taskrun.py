@@ -21,6 +21,7 @@ from flask import abort
 
 class TaskRunAuth(object):
     _specific_actions = []
+    project_scoped_actions = ['read']
 
     def __init__(self, task_repo, project_repo, result_repo):
         self.task_repo = task_repo
@@ -24,20 +24,39 @@ It exports:
     * memoize: for caching functions using its arguments as part of the key
     * delete_cached: to remove a cached value
     * delete_memoized: to remove a cached value from the memoize decorator
+    * delete_memoized_project: to remove the memoized values of a project
+
+Every memoized key is added to a tag of its function, and to one of its
+project for functions memoized with project=True, so that they can be
+deleted together without scanning the keyspace. Tags are sorted sets scored
+by the expiration of their keys, which drop the expired ones as they grow.
+
+Memoized functions of one argument also get a many(args) method, which reads
+the values of many arguments with a single MGET and computes the misses with
+the function registered with their batch decorator, if any.
+
+When CACHE_LOCAL_TIMEOUT is set, values read from Redis are also kept for
+that many seconds in an in-process LRU of CACHE_LOCAL_MAX_SIZE entries, which
+delete_cached and delete_memoized invalidate in every process via pub/sub.
+
+Values are serialized with the codec selected by CACHE_CODEC, see
+pybossa.cache.serialization.
 
 """
 import os
+import time
+import uuid
 import hashlib
+import importlib
+from collections import OrderedDict
 from functools import wraps
+from redis.exceptions import ResponseError
 from pybossa.core import sentinel
+from pybossa.cache.local import LocalCache
+from pybossa.cache.serialization import get_codec
 
 from pybossa import util
 
-try:
-    import pickle as pickle
-except ImportError:  # pragma: no cover
-    import pickle
-
 try:
     import settings_local as settings
 except ImportError:  # pragma: no cover
@@ -49,6 +68,151 @@ ONE_HOUR = 60 * 60
 HALF_HOUR = 30 * 60
 FIVE_MINUTES = 5 * 60
 
+# Seconds a caller has to refresh a stale value before another one can
+REFRESH_LOCK_TIMEOUT = 60
+REFRESH_QUEUE = 'high'
+
+# Tag sorted sets score their keys by expiration, so the expired ones are
+# pruned whenever a key is added, and live at least as long as their keys.
+# Delete the tags and their keys in batches of this size.
+TAG_BATCH_SIZE = 1000
+
+# Store a value and add its key to the tags, pruning the expired keys.
+SET_TAGGED = """
+redis.call('setex', KEYS[1], ARGV[1], ARGV[2])
+local expires = tonumber(ARGV[3]) + tonumber(ARGV[1])
+for i = 2, #KEYS do
+    redis.call('zremrangebyscore', KEYS[i], '-inf', ARGV[3])
+    redis.call('zadd', KEYS[i], expires, KEYS[1])
+    if redis.call('ttl', KEYS[i]) < tonumber(ARGV[1]) then
+        redis.call('expire', KEYS[i], ARGV[1])
+    end
+end
+"""
+
+local_cache = LocalCache(getattr(settings, 'CACHE_LOCAL_MAX_SIZE', 1024),
+                         getattr(settings, 'CACHE_LOCAL_TIMEOUT', 0),
+                         '%s:invalidate' % settings.REDIS_KEYPREFIX)
+
+codec = get_codec(getattr(settings, 'CACHE_CODEC', 'pickle'),
+                  getattr(settings, 'CACHE_COMPRESSION', None),
+                  getattr(settings, 'CACHE_COMPRESSION_THRESHOLD', 1024))
+
+
+def _get(key):
+    """Return the serialized value of key from the local tier or Redis."""
+    if not local_cache.enabled:
+        return sentinel.slave.get(key)
+    local_cache.listen(sentinel.master)
+    output = local_cache.get(key)
+    if output is None:
+        output = sentinel.slave.get(key)
+        if output:
+            local_cache.set(key, output)
+    return output
+
+
+def _get_many(keys):
+    """Return the serialized values of keys, in order, with one MGET."""
+    if not local_cache.enabled:
+        return sentinel.slave.mget(keys) if keys else []
+    local_cache.listen(sentinel.master)
+    outputs = [local_cache.get(key) for key in keys]
+    missing = [i for i, output in enumerate(outputs) if output is None]
+    if missing:
+        values = sentinel.slave.mget([keys[i] for i in missing])
+        for i, output in zip(missing, values):
+            if output:
+                outputs[i] = output
+                local_cache.set(keys[i], output)
+    return outputs
+
+
+_scripts = {}
+
+
+def _script(source):
+    """Return the Script of source, registered once per process. Call it
+    with an explicit client."""
+    if source not in _scripts:
+        _scripts[source] = sentinel.master.register_script(source)
+    return _scripts[source]
+
+
+def _set(key, timeout, output, tags=()):
+    if tags:
+        _script(SET_TAGGED)(keys=[key] + list(tags),
+                            args=[timeout, output, time.time()],
+                            client=sentinel.master)
+    else:
+        sentinel.master.setex(key, timeout, output)
+    if local_cache.enabled:
+        local_cache.set(key, output)
+
+
+def _set_many(items, timeout):
+    """Store (key, serialized value, tags) items with one pipeline."""
+    pipeline = sentinel.master.pipeline(transaction=False)
+    set_tagged = _script(SET_TAGGED)
+    now = time.time()
+    for key, output, tags in items:
+        set_tagged(keys=[key] + list(tags), args=[timeout, output, now],
+                   client=pipeline)
+        if local_cache.enabled:
+            local_cache.set(key, output)
+    pipeline.execute()
+
+
+def _invalidate(key):
+    if local_cache.enabled:
+        local_cache.invalidate(sentinel.master, key)
+
+
+def _delete_tagged(*tags):
+    """Delete every key in the tags and return how many existed, along with
+    the keys.
+
+    Each tag is renamed first, so keys tagged meanwhile go to a new one, and
+    is then read and deleted in batches, so Redis is never blocked for long.
+    """
+    conn = sentinel.master
+    deleted, keys = 0, []
+    for tag in tags:
+        for name, scan in ((tag, conn.zscan_iter),
+                           (legacy_tag(tag), conn.sscan_iter)):
+            pending = '%s:deleting:%s' % (name, uuid.uuid4().hex)
+            try:
+                conn.rename(name, pending)
+            except ResponseError:  # the tag does not exist
+                continue
+            batch = []
+            for member in scan(pending, count=TAG_BATCH_SIZE):
+                batch.append(member[0] if type(member) is tuple else member)
+                if len(batch) == TAG_BATCH_SIZE:
+                    deleted += conn.unlink(*batch)
+                    keys += batch
+                    batch = []
+            if batch:
+                deleted += conn.unlink(*batch)
+                keys += batch
+            conn.unlink(pending)
+    return deleted, [key.decode('utf-8') for key in keys]
+
+
+def function_tag(function):
+    return "%s:tags:function:%s" % (settings.REDIS_KEYPREFIX,
+                                    function.__name__)
+
+
+def project_tag(project_id):
+    return "%s:tags:project:%s" % (settings.REDIS_KEYPREFIX, project_id)
+
+
+def legacy_tag(tag):
+    """Return the name of the plain set a tag was kept in before, which is
+    drained too until it expires."""
+    return tag.replace(':tags:', ':tag:', 1)
+
 
 def get_key_to_hash(*args, **kwargs):
     """Return key to hash for *args and **kwargs."""
@@ -69,56 +233,187 @@ def get_hash_key(prefix, key_to_hash):
     return key
 
 
-def cache(key_prefix, timeout=300):
+def _load(output, stale):
+    """Return (value, fresh) for a serialized value, or None if it lacks the
+    soft expiration of stale values, like values cached before stale was
+    set on the function, so that it is computed again."""
+    value = codec.loads(output)
+    if not stale:
+        return value, True
+    if not (isinstance(value, list) and len(value) == 2 and
+            isinstance(value[0], float)):
+        return None
+    fresh_until, value = value
+    return value, fresh_until >= time.time()
+
+
+def _dump(value, timeout, stale):
+    """Return the serialized value, along with its soft expiration if any."""
+    if not stale:
+        return codec.dumps(value)
+    return codec.dumps([time.time() + timeout, value])
+
+
+def _store(key, timeout, stale, value, tags=()):
+    _set(key, timeout + (stale or 0), _dump(value, timeout, stale), tags)
+
+
+def _acquire_refresh(key):
+    """Return True if the caller is the one that must refresh key."""
+    return bool(sentinel.master.set(key + ':refresh', 1, nx=True,
+                                    ex=REFRESH_LOCK_TIMEOUT))
+
+
+def _enqueue_refresh(function, args, kwargs):
+    from rq import Queue
+    queue = Queue(REFRESH_QUEUE, connection=sentinel.master)
+    queue.enqueue(refresh, function.__module__, function.__name__,
+                  args, kwargs)
+
+
+def _cached_call(f, wrapper, key, timeout, stale, background, args, kwargs,
+                 tags=()):
+    """Return the cached value of key, computing it with f if missing.
+
+    Values older than timeout are served for stale more seconds while the
+    single caller holding the refresh lock recomputes them, either in the
+    request or in a background job."""
+    output = _get(key)
+    loaded = _load(output, stale) if output else None
+    if loaded:
+        value, fresh = loaded
+        if fresh or not _acquire_refresh(key):
+            return value
+        if background:
+            _enqueue_refresh(wrapper, args, kwargs)
+            return value
+    value = f(*args, **kwargs)
+    _store(key, timeout, stale, value, tags)
+    if loaded:
+        sentinel.master.delete(key + ':refresh')
+    return value
+
+
+def refresh(module, name, args, kwargs):
+    """Recompute and store the value of a cached function (RQ job)."""
+    function = getattr(importlib.import_module(module), name)
+    return function.refresh(*args, **kwargs)
+
+
+def cache(key_prefix, timeout=300, stale=None, background=False):
     """
     Decorator for caching functions.
 
     Returns the function value from cache, or the function if cache disabled
 
+    With stale, expired values are still returned for that many seconds
+    while they are refreshed, in an RQ job if background is True.
+
     """
     if timeout is None:
         timeout = 300
     def decorator(f):
+        key = "%s::%s" % (settings.REDIS_KEYPREFIX, key_prefix)
+
         @wraps(f)
         def wrapper(*args, **kwargs):
-            key = "%s::%s" % (settings.REDIS_KEYPREFIX, key_prefix)
             if util.redis_cache_is_enabled():
-                output = sentinel.slave.get(key)
-                if output:
-                    return pickle.loads(output)
-                output = f(*args, **kwargs)
-                sentinel.master.setex(key, timeout, pickle.dumps(output))
-                return output
+                return _cached_call(f, wrapper, key, timeout, stale,
+                                    background, args, kwargs)
+            output = f(*args, **kwargs)
+            return output
+
+        def _refresh(*args, **kwargs):
             output = f(*args, **kwargs)
+            _store(key, timeout, stale, output)
+            sentinel.master.delete(key + ':refresh')
             return output
+
+        wrapper.refresh = _refresh
         return wrapper
     return decorator
 
 
-def memoize(timeout=300):
+def memoize(timeout=300, stale=None, background=False, project=False):
     """
     Decorator for caching functions using its arguments as part of the key.
 
     Returns the cached value, or the function if the cache is disabled
 
+    With stale, expired values are still returned for that many seconds
+    while they are refreshed, in an RQ job if background is True.
+
+    With project, keys are also tagged with the project id given as first
+    argument, so that delete_memoized_project deletes them.
+
     """
     if timeout is None:
         timeout = 300
     def decorator(f):
-        @wraps(f)
-        def wrapper(*args, **kwargs):
+        def get_key(*args, **kwargs):
             key = "%s:%s_args:" % (settings.REDIS_KEYPREFIX, f.__name__)
             key_to_hash = get_key_to_hash(*args, **kwargs)
-            key = get_hash_key(key, key_to_hash)
+            return get_hash_key(key, key_to_hash)
+
+        def get_tags(*args, **kwargs):
+            tags = [function_tag(f)]
+            if project:
+                project_id = args[0] if args else kwargs['project_id']
+                tags.append(project_tag(project_id))
+            return tags
+
+        @wraps(f)
+        def wrapper(*args, **kwargs):
             if util.redis_cache_is_enabled():
-                output = sentinel.slave.get(key)
-                if output:
-                    return pickle.loads(output)
-                output = f(*args, **kwargs)
-                sentinel.master.setex(key, timeout, pickle.dumps(output))
-                return output
+                return _cached_call(f, wrapper, get_key(*args, **kwargs),
+                                    timeout, stale, background, args, kwargs,
+                                    get_tags(*args, **kwargs))
             output = f(*args, **kwargs)
             return output
+
+        def _refresh(*args, **kwargs):
+            key = get_key(*args, **kwargs)
+            output = f(*args, **kwargs)
+            _store(key, timeout, stale, output, get_tags(*args, **kwargs))
+            sentinel.master.delete(key + ':refresh')
+            return output
+
+        def many(args):
+            """Return a dict with the value of the function for each arg."""
+            args = list(OrderedDict.fromkeys(args))
+            keys = dict((arg, get_key(arg)) for arg in args)
+            values = dict()
+            enabled = util.redis_cache_is_enabled()
+            if enabled:
+                outputs = _get_many([keys[arg] for arg in args])
+                for arg, output in zip(args, outputs):
+                    loaded = _load(output, stale) if output else None
+                    if loaded and loaded[1]:
+                        values[arg] = loaded[0]
+            misses = [arg for arg in args if arg not in values]
+            if misses:
+                if wrapper.batch_loader:
+                    computed = wrapper.batch_loader(misses)
+                else:
+                    computed = dict((arg, f(arg)) for arg in misses)
+                if enabled:
+                    _set_many([(keys[arg], _dump(computed[arg], timeout, stale),
+                                get_tags(arg)) for arg in misses],
+                              timeout + (stale or 0))
+                values.update(computed)
+            return values
+
+        def batch(loader):
+            """Register loader(args), returning a dict with the value for
+            each arg, to compute the misses of many in one go."""
+            wrapper.batch_loader = loader
+            return loader
+
+        wrapper.get_tags = get_tags
+        wrapper.refresh = _refresh
+        wrapper.many = many
+        wrapper.batch = batch
+        wrapper.batch_loader = None
         return wrapper
     return decorator
 
@@ -132,7 +427,9 @@ def delete_cached(key):
     """
     if util.redis_cache_is_enabled():
         key = "%s::%s" % (settings.REDIS_KEYPREFIX, key)
-        return bool(sentinel.master.delete(key))
+        deleted = bool(sentinel.master.delete(key))
+        _invalidate(key)
+        return deleted
     return True
 
 
@@ -148,9 +445,30 @@ def delete_memoized(function, *args, **kwargs):
         if args or kwargs:
             key_to_hash = get_key_to_hash(*args, **kwargs)
             key = get_hash_key(key, key_to_hash)
-            return bool(sentinel.master.delete(key))
-        keys_to_delete = sentinel.slave.keys(pattern=key + '*')
-        if not keys_to_delete:
-            return False
-        return bool(sentinel.master.delete(*keys_to_delete))
+            pipeline = sentinel.master.pipeline()
+            pipeline.delete(key)
+            if hasattr(function, 'get_tags'):
+                for tag in function.get_tags(*args, **kwargs):
+                    pipeline.zrem(tag, key)
+            deleted = bool(pipeline.execute()[0])
+            _invalidate(key)
+            return deleted
+        deleted, _ = _delete_tagged(function_tag(function))
+        _invalidate(key + '*')
+        return bool(deleted)
+    return True
+
+
+def delete_memoized_project(project_id):
+    """
+    Delete every value memoized with project=True for a project.
+
+    Returns True if success or no cache is enabled
+
+    """
+    if util.redis_cache_is_enabled():
+        deleted, keys = _delete_tagged(project_tag(project_id))
+        for key in keys:
+            _invalidate(key)
+        return bool(deleted)
     return True
@@ -0,0 +1,117 @@
+# -*- coding: utf8 -*-
+# This file is part of PYBOSSA.
+#
+# Copyright (C) 2015 Scifabric LTD.
+#
+# PYBOSSA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PYBOSSA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+"""
+In-process LRU tier kept in front of the Redis cache.
+
+Entries live for a few seconds at most and are dropped from every process as
+soon as they are deleted from Redis, through a pub/sub channel.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class LocalCache(object):
+
+    """Size bounded LRU of serialized values with a short TTL."""
+
+    def __init__(self, maxsize, timeout, channel):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.channel = channel
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._listener = None
+
+    @property
+    def enabled(self):
+        return bool(self.timeout and self.maxsize)
+
+    def get(self, key):
+        """Return the value stored for key, or None."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires=None):
+        """Store value for key, until the expires timestamp at the latest."""
+        timeout = time.time() + self.timeout
+        if expires is not None:
+            timeout = min(timeout, expires)
+        with self._lock:
+            self._data[key] = (timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """Delete key, or every key starting with it if it ends with '*'."""
+        with self._lock:
+            if not key.endswith('*'):
+                self._data.pop(key, None)
+                return
+            prefix = key[:-1]
+            for k in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[k]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def invalidate(self, conn, key):
+        """Delete key here and in every other process."""
+        self.delete(key)
+        conn.publish(self.channel, key)
+
+    def listen(self, conn):
+        """Make sure this process is subscribed to the invalidations."""
+        pid = os.getpid()
+        if self._pid == pid and self._listener.is_alive():
+            return
+        with self._lock:
+            if self._pid == pid and self._listener.is_alive():
+                return
+            # Forked processes inherit the entries but not the thread.
+            self._data.clear()
+            self._pid = pid
+            self._listener = threading.Thread(target=self._listen,
+                                              args=(conn,))
+            self._listener.daemon = True
+            self._listener.start()
+
+    def _listen(self, conn):
+        while True:
+            try:
+                pubsub = conn.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # Invalidations sent while not subscribed are lost.
+                self.clear()
+                for message in pubsub.listen():
+                    self.delete(message['data'].decode('utf-8'))
+            except Exception:
+                self.clear()
+                time.sleep(1)
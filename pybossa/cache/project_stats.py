@@ -18,7 +18,7 @@
 """Cache module for project stats."""
 from sqlalchemy.sql import text
 from pybossa.core import db
-from pybossa.cache import memoize, ONE_DAY, FIVE_MINUTES
+from pybossa.cache import memoize, ONE_DAY, ONE_HOUR, FIVE_MINUTES
 import pybossa.cache.projects as cached_projects
 from pybossa.model.project_stats import ProjectStats
 
@@ -40,96 +40,59 @@ def n_tasks(project_id):
     return projects.n_tasks(project_id)
 
 
-@memoize(timeout=ONE_DAY)
+@memoize(timeout=ONE_DAY, stale=ONE_HOUR, background=True)
 def stats_users(project_id, period=None):
     """Return users's stats for a given project_id."""
     users = {}
     auth_users = []
     anon_users = []
 
-    # Get Authenticated Users
-    params = dict(project_id=project_id)
-    sql = text('''SELECT task_run.user_id AS user_id,
-               COUNT(task_run.id) as n_tasks FROM task_run
-               WHERE task_run.user_id IS NOT NULL AND
-               task_run.user_ip IS NULL AND
-               task_run.project_id=:project_id
-               GROUP BY task_run.user_id ORDER BY n_tasks DESC
-               LIMIT 5;''')\
-        .execution_options(stream=True)
+    params = dict(project_id=project_id, period=period)
+    in_period = ''
     if period:
-        sql = text('''SELECT task_run.user_id AS user_id,
-                   COUNT(task_run.id) as n_tasks FROM task_run
-                   WHERE task_run.user_id IS NOT NULL AND
-                   task_run.user_ip IS NULL AND
-                   task_run.project_id=:project_id AND
-                   TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                   >= NOW() AT TIME ZONE 'utc' - :period ::INTERVAL
-                   GROUP BY task_run.user_id ORDER BY n_tasks DESC
-                   LIMIT 5;''')\
-            .execution_options(stream=True)
-        params['period'] = period
+        in_period = '''AND day >= (NOW() AT TIME ZONE 'utc'
+                       - :period ::INTERVAL)::date'''
 
+    # Get Authenticated Users
+    sql = text('''SELECT user_id, SUM(n_task_runs) AS n_tasks
+               FROM project_daily_contributor
+               WHERE project_id=:project_id AND n_task_runs > 0
+               AND user_id IS NOT NULL
+               AND user_ip IS NULL {}
+               GROUP BY user_id ORDER BY n_tasks DESC
+               LIMIT 5;'''.format(in_period))
     results = session.execute(sql, params)
 
     for row in results:
         auth_users.append([row.user_id, row.n_tasks])
 
-    sql = text('''SELECT count(distinct(task_run.user_id)) AS user_id
-               FROM task_run WHERE task_run.user_id IS NOT NULL AND
-               task_run.user_ip IS NULL AND
-               task_run.project_id=:project_id;''')
-    if period:
-        sql = text('''SELECT count(distinct(task_run.user_id)) AS user_id
-                   FROM task_run WHERE task_run.user_id IS NOT NULL AND
-                   task_run.user_ip IS NULL AND
-                   task_run.project_id=:project_id AND
-                   TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                   >= NOW() AT TIME ZONE 'utc' - :period ::INTERVAL
-                   ;''')
-
+    sql = text('''SELECT COUNT(DISTINCT(user_id)) AS user_id
+               FROM project_daily_contributor
+               WHERE project_id=:project_id AND n_task_runs > 0
+               AND user_id IS NOT NULL
+               AND user_ip IS NULL {};'''.format(in_period))
     results = session.execute(sql, params)
     for row in results:
         users['n_auth'] = row[0]
 
     # Get all Anonymous Users
-    sql = text('''SELECT task_run.user_ip AS user_ip,
-               COUNT(task_run.id) as n_tasks FROM task_run
-               WHERE task_run.user_ip IS NOT NULL AND
-               task_run.user_id IS NULL AND
-               task_run.project_id=:project_id
-               GROUP BY task_run.user_ip ORDER BY n_tasks DESC;''')\
+    sql = text('''SELECT user_ip, SUM(n_task_runs) AS n_tasks
+               FROM project_daily_contributor
+               WHERE project_id=:project_id AND n_task_runs > 0
+               AND user_ip IS NOT NULL
+               AND user_id IS NULL {}
+               GROUP BY user_ip ORDER BY n_tasks DESC;'''.format(in_period))\
         .execution_options(stream=True)
-
-    if period:
-        sql = text('''SELECT task_run.user_ip AS user_ip,
-                   COUNT(task_run.id) as n_tasks FROM task_run
-                   WHERE task_run.user_ip IS NOT NULL AND
-                   task_run.user_id IS NULL AND
-                   task_run.project_id=:project_id AND
-                   TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                   >= NOW() AT TIME ZONE 'utc' - :period ::INTERVAL
-                   GROUP BY task_run.user_ip ORDER BY n_tasks DESC;''')\
-            .execution_options(stream=True)
-
     results = session.execute(sql, params)
 
     for row in results:
         anon_users.append([row.user_ip, row.n_tasks])
 
-    sql = text('''SELECT COUNT(DISTINCT(task_run.user_ip)) AS user_ip
-               FROM task_run WHERE task_run.user_ip IS NOT NULL AND
-               task_run.user_id IS NULL AND
-               task_run.project_id=:project_id;''')
-    if period:
-        sql = text('''SELECT COUNT(DISTINCT(task_run.user_ip)) AS user_ip
-                   FROM task_run WHERE task_run.user_ip IS NOT NULL AND
-                   task_run.user_id IS NULL AND
-                   task_run.project_id=:project_id AND
-                   TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                   >= NOW() AT TIME ZONE 'utc' - :period ::INTERVAL
-                   ;''')
-
+    sql = text('''SELECT COUNT(DISTINCT(user_ip)) AS user_ip
+               FROM project_daily_contributor
+               WHERE project_id=:project_id AND n_task_runs > 0
+               AND user_ip IS NOT NULL
+               AND user_id IS NULL {};'''.format(in_period))
     results = session.execute(sql, params)
 
     for row in results:
@@ -156,7 +119,7 @@ def convert_period_to_days(period):
     return int_period
 
 
-@memoize(timeout=ONE_DAY)
+@memoize(timeout=ONE_DAY, stale=ONE_HOUR, background=True)
 def stats_dates(project_id, period='15 day'):
     """Return statistics with dates for a project."""
     dates = {}
@@ -167,33 +130,23 @@ def stats_dates(project_id, period='15 day'):
 
     params = dict(project_id=project_id, period=period)
 
-    # Get all completed tasks
-    sql = text('''
-               WITH myquery AS (
-               SELECT task.id, coalesce(ct, 0) as n_task_runs, task.n_answers
-               FROM task LEFT OUTER JOIN
-               (SELECT task_id, COUNT(id) AS ct FROM task_run
-               WHERE project_id=:project_id AND
-               TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-               >= NOW() AT TIME ZONE 'utc' - :period :: INTERVAL
-               GROUP BY task_id) AS log_counts
-               ON task.id=log_counts.task_id
-               WHERE task.project_id=:project_id ORDER BY id ASC)
-               select myquery.id, max(task_run.finish_time) as day
-               from task_run, myquery where task_run.task_id=myquery.id
-               and
-               TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-               >= NOW() AT TIME ZONE 'utc' - :period :: INTERVAL
-               group by myquery.id order by day;
-               ''').execution_options(stream=True)
+    # Get completed tasks and answers per date
+    sql = text('''SELECT TO_CHAR(hour, 'YYYY-MM-DD') AS d,
+               SUM(n_completed) AS n_completed, SUM(n_anon) AS n_anon,
+               SUM(n_auth) AS n_auth
+               FROM project_hourly_stats
+               WHERE project_id=:project_id AND hour >= DATE_TRUNC('hour',
+               NOW() AT TIME ZONE 'utc' - :period ::INTERVAL)
+               GROUP BY d;''')
 
     results = session.execute(sql, params)
     for row in results:
-        day = row.day[:10]
-        if day in list(dates.keys()):
-            dates[day] += 1
-        else:
-            dates[day] = 1
+        if row.n_completed:
+            dates[row.d] = row.n_completed
+        if row.n_anon:
+            dates_anon[row.d] = row.n_anon
+        if row.n_auth:
+            dates_auth[row.d] = row.n_auth
 
     # No completed tasks in the last period
     def _fill_empty_days(days, obj):
@@ -206,57 +159,18 @@ def stats_dates(project_id, period='15 day'):
         return obj
 
     dates = _fill_empty_days(list(dates.keys()), dates)
-
-    # Get all answers per date for auth
-    sql = text('''
-                WITH myquery AS (
-                    SELECT TO_DATE(finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                    as d, COUNT(id)
-                    FROM task_run WHERE project_id=:project_id
-                    AND user_ip IS NULL AND
-                    TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                    >= NOW() AT TIME ZONE 'utc' - :period :: INTERVAL
-                    GROUP BY d)
-                SELECT to_char(d, 'YYYY-MM-DD') as d, count from myquery;
-               ''').execution_options(stream=True)
-
-    results = session.execute(sql, params)
-    for row in results:
-        dates_auth[row.d] = row.count
-
     dates_auth = _fill_empty_days(list(dates_auth.keys()), dates_auth)
-
-    # Get all answers per date for anon
-    sql = text('''
-                WITH myquery AS (
-                    SELECT TO_DATE(finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                    as d, COUNT(id)
-                    FROM task_run WHERE project_id=:project_id
-                    AND user_id IS NULL AND
-                    TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                    >= NOW() AT TIME ZONE 'utc' - :period :: INTERVAL
-                    GROUP BY d)
-               SELECT to_char(d, 'YYYY-MM-DD') as d, count  from myquery;
-               ''').execution_options(stream=True)
-
-    results = session.execute(sql, params)
-    for row in results:
-        dates_anon[row.d] = row.count
-
     dates_anon = _fill_empty_days(list(dates_anon.keys()), dates_anon)
 
     return dates, dates_anon, dates_auth
 
 
-@memoize(timeout=ONE_DAY)
+@memoize(timeout=ONE_DAY, stale=ONE_HOUR, background=True)
 def stats_hours(project_id, period='2 week'):
     """Return statistics of a project per hours."""
     hours = {}
     hours_anon = {}
     hours_auth = {}
-    max_hours = 0
-    max_hours_anon = 0
-    max_hours_auth = 0
 
     # initialize hours keys
     for i in range(0, 24):
@@ -265,126 +179,26 @@ def stats_hours(project_id, period='2 week'):
         hours_auth[str(i).zfill(2)] = 0
 
     params = dict(project_id=project_id, period=period)
-    # Get hour stats for all users
-    sql = text('''
-               WITH myquery AS
-                (SELECT to_char(
-                    DATE_TRUNC('hour',
-                        TO_TIMESTAMP(finish_time, 'YYYY-MM-DD"T"HH24:MI:SS.US')
-                    ),
-                    'HH24') AS h, COUNT(id)
-                    FROM task_run WHERE project_id=:project_id AND
-                    TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                    >= NOW() AT TIME ZONE 'utc' - :period :: INTERVAL
-                    GROUP BY h)
-               SELECT h, count from myquery;
-               ''').execution_options(stream=True)
-
-    results = session.execute(sql, params)
-
-    for row in results:
-        hours[row.h] = row.count
-
-    # Get maximum stats for all users
-    sql = text('''
-               WITH myquery AS
-                (SELECT to_char(
-                    DATE_TRUNC('hour',
-                        TO_TIMESTAMP(finish_time, 'YYYY-MM-DD"T"HH24:MI:SS.US')
-                    ),
-                    'HH24') AS h, COUNT(id)
-                    FROM task_run WHERE project_id=:project_id  AND
-                    TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                    >= NOW() AT TIME ZONE 'utc' - :period :: INTERVAL
-                    GROUP BY h)
-               SELECT max(count) from myquery;
-               ''').execution_options(stream=True)
-
-    results = session.execute(sql, params)
-    for row in results:
-        max_hours = row.max
-
-    # Get hour stats for Anonymous users
-    sql = text('''
-               WITH myquery AS
-                (SELECT to_char(
-                    DATE_TRUNC('hour',
-                        TO_TIMESTAMP(finish_time, 'YYYY-MM-DD"T"HH24:MI:SS.US')
-                    ),
-                    'HH24') AS h, COUNT(id)
-                    FROM task_run WHERE project_id=:project_id
-                    AND user_id IS NULL AND
-                    TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                    >= NOW() AT TIME ZONE 'utc' - :period :: INTERVAL
-                    GROUP BY h)
-               SELECT h, count from myquery;
-               ''').execution_options(stream=True)
+    # Get hour stats for all, anonymous and authenticated users
+    sql = text('''SELECT TO_CHAR(hour, 'HH24') AS h,
+               SUM(n_task_runs) AS n_task_runs, SUM(n_anon) AS n_anon,
+               SUM(n_auth) AS n_auth
+               FROM project_hourly_stats
+               WHERE project_id=:project_id AND hour >= DATE_TRUNC('hour',
+               NOW() AT TIME ZONE 'utc' - :period ::INTERVAL)
+               GROUP BY h;''')
 
     results = session.execute(sql, params)
 
     for row in results:
-        hours_anon[row.h] = row.count
-
-    # Get maximum stats for Anonymous users
-    sql = text('''
-               WITH myquery AS
-                (SELECT to_char(
-                    DATE_TRUNC('hour',
-                        TO_TIMESTAMP(finish_time, 'YYYY-MM-DD"T"HH24:MI:SS.US')
-                    ),
-                    'HH24') AS h, COUNT(id)
-                    FROM task_run WHERE project_id=:project_id
-                    AND user_id IS NULL AND
-                    TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                    >= NOW() AT TIME ZONE 'utc' - :period :: INTERVAL
-                    GROUP BY h)
-               SELECT max(count) from myquery;
-               ''').execution_options(stream=True)
-
-    results = session.execute(sql, params)
-    for row in results:
-        max_hours_anon = row.max
-
-    # Get hour stats for Auth users
-    sql = text('''
-               WITH myquery AS
-                (SELECT to_char(
-                    DATE_TRUNC('hour',
-                        TO_TIMESTAMP(finish_time, 'YYYY-MM-DD"T"HH24:MI:SS.US')
-                    ),
-                    'HH24') AS h, COUNT(id)
-                    FROM task_run WHERE project_id=:project_id
-                    AND user_ip IS NULL AND
-                    TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                    >= NOW() AT TIME ZONE 'utc' - :period :: INTERVAL
-                    GROUP BY h)
-               SELECT h, count from myquery;
-               ''').execution_options(stream=True)
-
-    results = session.execute(sql, params)
-
-    for row in results:
-        hours_auth[row.h] = row.count
-
-    # Get hour stats for Anon users
-    sql = text('''
-               WITH myquery AS
-                (SELECT to_char(
-                    DATE_TRUNC('hour',
-                        TO_TIMESTAMP(finish_time, 'YYYY-MM-DD"T"HH24:MI:SS.US')
-                    ),
-                    'HH24') AS h, COUNT(id)
-                    FROM task_run WHERE project_id=:project_id
-                    AND user_ip IS NULL AND
-                    TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                    >= NOW() AT TIME ZONE 'utc' - :period :: INTERVAL
-                    GROUP BY h)
-               SELECT max(count) from myquery;
-               ''').execution_options(stream=True)
-
-    results = session.execute(sql, params)
-    for row in results:
-        max_hours_auth = row.max
+        hours[row.h] = row.n_task_runs
+        hours_anon[row.h] = row.n_anon
+        hours_auth[row.h] = row.n_auth
+
+    # Maximum stats, None when there are no answers
+    max_hours = max(hours.values()) or None
+    max_hours_anon = max(hours_anon.values()) or None
+    max_hours_auth = max(hours_auth.values()) or None
 
     return hours, hours_anon, hours_auth, max_hours, max_hours_anon, \
         max_hours_auth
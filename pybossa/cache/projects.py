@@ -20,7 +20,8 @@ from sqlalchemy.sql import text
 from pybossa.core import db, timeouts
 from pybossa.model.project import Project
 from pybossa.util import pretty_date
-from pybossa.cache import memoize, cache, delete_memoized, delete_cached
+from pybossa.cache import memoize, cache, delete_memoized, delete_cached, \
+    delete_memoized_project, FIVE_MINUTES
 
 
 session = db.slave_session
@@ -38,14 +39,17 @@ def get_top(n=4):
                AND project.id=project_id
                AND (project.info->>'passwd_hash') IS NULL
                GROUP BY project.id ORDER BY total DESC LIMIT :limit;''')
-    results = session.execute(sql, dict(limit=n))
+    results = session.execute(sql, dict(limit=n)).fetchall()
+    project_ids = [row.id for row in results]
+    volunteers = n_volunteers.many(project_ids)
+    completed_tasks = n_completed_tasks.many(project_ids)
     top_projects = []
     for row in results:
         project = dict(id=row.id, name=row.name, short_name=row.short_name,
                        description=row.description,
                        info=row.info,
-                       n_volunteers=n_volunteers(row.id),
-                       n_completed_tasks=n_completed_tasks(row.id))
+                       n_volunteers=volunteers[row.id],
+                       n_completed_tasks=completed_tasks[row.id])
 
         top_projects.append(Project().to_public_json(project))
     return top_projects
@@ -54,10 +58,9 @@ def get_top(n=4):
 def browse_tasks(project_id, limit=10, offset=0):
     """Cache browse tasks view for a project."""
     sql = text('''
-               SELECT task.id, task.n_answers, sum(counter.n_task_runs) as n_task_runs
+               SELECT task.id, task.n_answers, counter.n_task_runs
                FROM task, counter
                WHERE task.id=counter.task_id and task.project_id=:project_id
-               GROUP BY task.id
                ORDER BY task.id ASC LIMIT :limit OFFSET :offset
                ''')
     results = session.execute(sql, dict(project_id=project_id,
@@ -72,6 +75,14 @@ def browse_tasks(project_id, limit=10, offset=0):
     return tasks
 
 
+def _by_project(project_ids, results, default):
+    """Return a dict with the value of each (project_id, value) row, and
+    default for the projects without a row."""
+    values = dict((project_id, default) for project_id in project_ids)
+    values.update((row[0], row[1]) for row in results)
+    return values
+
+
 def _pct_status(n_task_runs, n_answers):
     """Return percentage status."""
     if n_answers != 0 and n_answers is not None:
@@ -82,7 +93,7 @@ def _pct_status(n_task_runs, n_answers):
     return float(0)
 
 
-@memoize(timeout=timeouts.get('APP_TIMEOUT'))
+@memoize(timeout=timeouts.get('APP_TIMEOUT'), project=True)
 def n_tasks(project_id):
     """Return number of tasks of a project."""
     sql = text('''SELECT COUNT(task.id) AS n_tasks FROM task
@@ -94,7 +105,16 @@ def n_tasks(project_id):
     return n_tasks
 
 
-@memoize(timeout=timeouts.get('APP_TIMEOUT'))
+@n_tasks.batch
+def _n_tasks_many(project_ids):
+    sql = text('''SELECT task.project_id, COUNT(task.id) AS n_tasks FROM task
+                  WHERE task.project_id = ANY(:project_ids)
+                  GROUP BY task.project_id;''')
+    results = session.execute(sql, dict(project_ids=project_ids))
+    return _by_project(project_ids, results, 0)
+
+
+@memoize(timeout=timeouts.get('APP_TIMEOUT'), project=True)
 def n_completed_tasks(project_id):
     """Return number of completed tasks of a project."""
     sql = text('''SELECT COUNT(task.id) AS n_completed_tasks FROM task
@@ -108,7 +128,16 @@ def n_completed_tasks(project_id):
     return n_completed_tasks
 
 
-@memoize(timeout=timeouts.get('APP_TIMEOUT'))
+@n_completed_tasks.batch
+def _n_completed_tasks_many(project_ids):
+    sql = text('''SELECT task.project_id, COUNT(task.id) AS n_completed_tasks
+               FROM task WHERE task.project_id = ANY(:project_ids)
+               AND task.state=\'completed\' GROUP BY task.project_id;''')
+    results = session.execute(sql, dict(project_ids=project_ids))
+    return _by_project(project_ids, results, 0)
+
+
+@memoize(timeout=timeouts.get('APP_TIMEOUT'), project=True)
 def n_results(project_id):
     """Return number of results of a project."""
     query = text('''
@@ -125,7 +154,7 @@ def n_results(project_id):
     return n_results
 
 
-@memoize(timeout=timeouts.get('REGISTERED_USERS_TIMEOUT'))
+@memoize(timeout=timeouts.get('REGISTERED_USERS_TIMEOUT'), project=True)
 def n_registered_volunteers(project_id):
     """Return number of registered users that have participated in a project."""
     sql = text('''SELECT COUNT(DISTINCT(task_run.user_id))
@@ -141,7 +170,20 @@ def n_registered_volunteers(project_id):
     return n_registered_volunteers
 
 
-@memoize(timeout=timeouts.get('ANON_USERS_TIMEOUT'))
+@n_registered_volunteers.batch
+def _n_registered_volunteers_many(project_ids):
+    sql = text('''SELECT task_run.project_id,
+               COUNT(DISTINCT(task_run.user_id)) AS n_registered_volunteers
+               FROM task_run
+               WHERE task_run.user_id IS NOT NULL AND
+               task_run.user_ip IS NULL AND
+               task_run.project_id = ANY(:project_ids)
+               GROUP BY task_run.project_id;''')
+    results = session.execute(sql, dict(project_ids=project_ids))
+    return _by_project(project_ids, results, 0)
+
+
+@memoize(timeout=timeouts.get('ANON_USERS_TIMEOUT'), project=True)
 def n_anonymous_volunteers(project_id):
     """Return number of anonymous users that have participated in a project."""
     sql = text('''SELECT COUNT(DISTINCT(task_run.user_ip))
@@ -157,6 +199,19 @@ def n_anonymous_volunteers(project_id):
     return n_anonymous_volunteers
 
 
+@n_anonymous_volunteers.batch
+def _n_anonymous_volunteers_many(project_ids):
+    sql = text('''SELECT task_run.project_id,
+               COUNT(DISTINCT(task_run.user_ip)) AS n_anonymous_volunteers
+               FROM task_run
+               WHERE task_run.user_ip IS NOT NULL AND
+               task_run.user_id IS NULL AND
+               task_run.project_id = ANY(:project_ids)
+               GROUP BY task_run.project_id;''')
+    results = session.execute(sql, dict(project_ids=project_ids))
+    return _by_project(project_ids, results, 0)
+
+
 def n_volunteers(project_id):
     """Return total number of volunteers of a project."""
     total = (n_anonymous_volunteers(project_id) +
@@ -164,7 +219,17 @@ def n_volunteers(project_id):
     return total
 
 
-@memoize(timeout=timeouts.get('APP_TIMEOUT'))
+def _n_volunteers_many(project_ids):
+    anonymous = n_anonymous_volunteers.many(project_ids)
+    registered = n_registered_volunteers.many(project_ids)
+    return dict((project_id, anonymous[project_id] + registered[project_id])
+                for project_id in project_ids)
+
+
+n_volunteers.many = _n_volunteers_many
+
+
+@memoize(timeout=timeouts.get('APP_TIMEOUT'), project=True)
 def n_task_runs(project_id):
     """Return number of task_runs of a project."""
     sql = text('''SELECT COUNT(task_run.id) AS n_task_runs FROM task_run
@@ -177,7 +242,7 @@ def n_task_runs(project_id):
     return n_task_runs
 
 
-@memoize(timeout=timeouts.get('APP_TIMEOUT'))
+@memoize(timeout=timeouts.get('APP_TIMEOUT'), project=True)
 def overall_progress(project_id):
     """Return the percentage of completed tasks for a project."""
     if n_tasks(project_id) != 0:
@@ -186,7 +251,21 @@ def overall_progress(project_id):
         return 0
 
 
-@memoize(timeout=timeouts.get('APP_TIMEOUT'))
+@overall_progress.batch
+def _overall_progress_many(project_ids):
+    tasks = n_tasks.many(project_ids)
+    completed = n_completed_tasks.many(project_ids)
+    progress = dict()
+    for project_id in project_ids:
+        if tasks[project_id] != 0:
+            progress[project_id] = ((completed[project_id] * 100) /
+                                    tasks[project_id])
+        else:
+            progress[project_id] = 0
+    return progress
+
+
+@memoize(timeout=timeouts.get('APP_TIMEOUT'), project=True)
 def last_activity(project_id):
     """Return last activity, date, from a project."""
     sql = text('''SELECT finish_time FROM task_run WHERE project_id=:project_id
@@ -200,6 +279,15 @@ def last_activity(project_id):
             return None
 
 
+@last_activity.batch
+def _last_activity_many(project_ids):
+    sql = text('''SELECT DISTINCT ON (project_id) project_id, finish_time
+               FROM task_run WHERE project_id = ANY(:project_ids)
+               ORDER BY project_id, finish_time DESC''')
+    results = session.execute(sql, dict(project_ids=project_ids))
+    return _by_project(project_ids, results, None)
+
+
 @memoize(timeout=timeouts.get('APP_TIMEOUT'))
 def average_contribution_time(project_id):
     sql = text('''SELECT
@@ -230,6 +318,15 @@ def n_blogposts(project_id):
     return n_blogposts
 
 
+def listing_stats(project_ids):
+    """Return the stats shown in project listings for many projects, as a
+    dict of dicts by project id, with one MGET per stat."""
+    return dict(last_activity=last_activity.many(project_ids),
+                overall_progress=overall_progress.many(project_ids),
+                n_tasks=n_tasks.many(project_ids),
+                n_volunteers=n_volunteers.many(project_ids))
+
+
 # This function does not change too much, so cache it for a longer time
 @cache(timeout=timeouts.get('STATS_FRONTPAGE_TIMEOUT'),
        key_prefix="number_featured_projects")
@@ -244,7 +341,8 @@ def _n_featured():
 
 
 # This function does not change too much, so cache it for a longer time
-@memoize(timeout=timeouts.get('STATS_FRONTPAGE_TIMEOUT'))
+@memoize(timeout=timeouts.get('STATS_FRONTPAGE_TIMEOUT'),
+         stale=FIVE_MINUTES)
 def get_all_featured(category=None):
     """Return a list of featured projects with a pagination."""
     sql = text(
@@ -257,18 +355,19 @@ def get_all_featured(category=None):
            AND "user".restrict=false
            GROUP BY project.id, "user".id;''')
 
-    results = session.execute(sql)
+    results = session.execute(sql).fetchall()
+    stats = listing_stats([row.id for row in results])
     projects = []
     for row in results:
         project = dict(id=row.id, name=row.name, short_name=row.short_name,
                        created=row.created, description=row.description,
                        updated=row.updated,
-                       last_activity=pretty_date(last_activity(row.id)),
-                       last_activity_raw=last_activity(row.id),
+                       last_activity=pretty_date(stats['last_activity'][row.id]),
+                       last_activity_raw=stats['last_activity'][row.id],
                        owner=row.owner,
-                       overall_progress=overall_progress(row.id),
-                       n_tasks=n_tasks(row.id),
-                       n_volunteers=n_volunteers(row.id),
+                       overall_progress=stats['overall_progress'][row.id],
+                       n_tasks=stats['n_tasks'][row.id],
+                       n_volunteers=stats['n_volunteers'][row.id],
                        info=row.info)
         projects.append(Project().to_public_json(project))
     return projects
@@ -317,7 +416,8 @@ def get_all_draft(category=None):
            AND "user".restrict=false
            AND project.published=false;''')
 
-    results = session.execute(sql)
+    results = session.execute(sql).fetchall()
+    stats = listing_stats([row.id for row in results])
     projects = []
     for row in results:
         project = dict(id=row.id, name=row.name, short_name=row.short_name,
@@ -325,11 +425,11 @@ def get_all_draft(category=None):
                        updated=row.updated,
                        description=row.description,
                        owner=row.owner,
-                       last_activity=pretty_date(last_activity(row.id)),
-                       last_activity_raw=last_activity(row.id),
-                       overall_progress=overall_progress(row.id),
-                       n_tasks=n_tasks(row.id),
-                       n_volunteers=n_volunteers(row.id),
+                       last_activity=pretty_date(stats['last_activity'][row.id]),
+                       last_activity_raw=stats['last_activity'][row.id],
+                       overall_progress=stats['overall_progress'][row.id],
+                       n_tasks=stats['n_tasks'][row.id],
+                       n_volunteers=stats['n_volunteers'][row.id],
                        info=row.info)
         projects.append(Project().to_public_json(project))
     return projects
@@ -367,7 +467,8 @@ def n_count(category):
     return count
 
 
-@memoize(timeout=timeouts.get('APP_TIMEOUT'))
+@memoize(timeout=timeouts.get('APP_TIMEOUT'),
+         stale=FIVE_MINUTES)
 def get_all(category):
     """Return a list of published projects for a given category.
     """
@@ -385,7 +486,8 @@ def get_all(category):
            AND (project.info->>'passwd_hash') IS NULL
            GROUP BY project.id, "user".id ORDER BY project.name;''')
 
-    results = session.execute(sql, dict(category=category))
+    results = session.execute(sql, dict(category=category)).fetchall()
+    stats = listing_stats([row.id for row in results])
     projects = []
     for row in results:
         project = dict(id=row.id,
@@ -395,11 +497,11 @@ def get_all(category):
                        description=row.description,
                        owner=row.owner,
                        featured=row.featured,
-                       last_activity=pretty_date(last_activity(row.id)),
-                       last_activity_raw=last_activity(row.id),
-                       overall_progress=overall_progress(row.id),
-                       n_tasks=n_tasks(row.id),
-                       n_volunteers=n_volunteers(row.id),
+                       last_activity=pretty_date(stats['last_activity'][row.id]),
+                       last_activity_raw=stats['last_activity'][row.id],
+                       overall_progress=stats['overall_progress'][row.id],
+                       n_tasks=stats['n_tasks'][row.id],
+                       n_volunteers=stats['n_volunteers'][row.id],
                        info=row.info)
         projects.append(Project().to_public_json(project))
     return projects
@@ -498,16 +600,7 @@ def clean(project_id):
 def clean_project(project_id, category=None):
     """Clean cache for a specific project"""
     project = db.session.query(Project).get(project_id)
-    delete_browse_tasks(project_id)
-    delete_n_tasks(project_id)
-    delete_n_completed_tasks(project_id)
-    delete_n_results(project_id)
-    delete_n_registered_volunteers(project_id)
-    delete_n_anonymous_volunteers(project_id)
-    delete_n_volunteers(project_id)
-    delete_last_activity(project_id)
-    delete_n_task_runs(project_id)
-    delete_overall_progress(project_id)
+    delete_memoized_project(project_id)
     if project:
         delete_memoized(get_all, project.category.short_name)
         delete_memoized(n_count, project.category.short_name)
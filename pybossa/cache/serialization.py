@@ -0,0 +1,116 @@
+# -*- coding: utf8 -*-
+# This file is part of PYBOSSA.
+#
+# Copyright (C) 2015 Scifabric LTD.
+#
+# PYBOSSA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PYBOSSA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Serialization of the values the cache and the feed keep in Redis.
+
+The codec is chosen with CACHE_CODEC. Values written by the msgpack codec
+start with a marker byte telling whether they are compressed, so it still
+reads the pickles written before it was enabled.
+"""
+import pickle
+import zlib
+
+try:
+    import lz4.frame as lz4
+except ImportError:  # pragma: no cover
+    lz4 = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+
+RAW = b'\x00'
+ZLIB = b'\x01'
+LZ4 = b'\x02'
+
+# msgpack extension holding a pickle, for the types msgpack does not know
+PICKLE_EXT = 1
+
+
+class PickleCodec(object):
+
+    """Serialize values with pickle."""
+
+    def dumps(self, value):
+        return pickle.dumps(value)
+
+    def loads(self, data):
+        return pickle.loads(data)
+
+
+class MsgpackCodec(object):
+
+    """Serialize values with msgpack, compressing the ones bigger than
+    threshold bytes if compression is 'zlib' or 'lz4'.
+
+    Tuples, sets, datetimes and any other type without a msgpack
+    representation are kept as pickles, so values are loaded back exactly
+    as they were stored."""
+
+    def __init__(self, compression=None, threshold=1024):
+        if msgpack is None:
+            raise ImportError('CACHE_CODEC msgpack needs msgpack installed')
+        if compression not in (None, 'zlib', 'lz4'):
+            raise ValueError('Unknown CACHE_COMPRESSION: %s' % compression)
+        if compression == 'lz4' and lz4 is None:
+            raise ImportError('CACHE_COMPRESSION lz4 needs lz4 installed')
+        self.compression = compression
+        self.threshold = threshold
+        self._unpack_kwargs = dict(raw=False, ext_hook=_ext_hook)
+        if msgpack.version >= (0, 6, 1):
+            self._unpack_kwargs['strict_map_key'] = False
+
+    def dumps(self, value):
+        data = msgpack.packb(value, use_bin_type=True, strict_types=True,
+                             default=_default)
+        if not self.compression or len(data) <= self.threshold:
+            return RAW + data
+        if self.compression == 'zlib':
+            return ZLIB + zlib.compress(data)
+        return LZ4 + lz4.compress(data)
+
+    def loads(self, data):
+        marker, data = data[:1], data[1:]
+        if marker == ZLIB:
+            data = zlib.decompress(data)
+        elif marker == LZ4:
+            data = lz4.decompress(data)
+        elif marker != RAW:
+            return pickle.loads(marker + data)
+        return msgpack.unpackb(data, **self._unpack_kwargs)
+
+
+def _default(value):
+    return msgpack.ExtType(PICKLE_EXT, pickle.dumps(value))
+
+
+def _ext_hook(code, data):
+    if code == PICKLE_EXT:
+        return pickle.loads(data)
+    return msgpack.ExtType(code, data)  # pragma: no cover
+
+
+def get_codec(name='pickle', compression=None, threshold=1024):
+    """Return the codec configured with CACHE_CODEC."""
+    if name == 'pickle':
+        return PickleCodec()
+    if name == 'msgpack':
+        return MsgpackCodec(compression, threshold)
+    raise ValueError('Unknown CACHE_CODEC: %s' % name)
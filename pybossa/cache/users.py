@@ -16,16 +16,17 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 """Cache module for users."""
-from sqlalchemy.sql import text
-from sqlalchemy.exc import ProgrammingError
-from pybossa.core import db, timeouts
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.sql import select, text
+from pybossa.core import db, sentinel, timeouts
 from pybossa.cache import cache, memoize, delete_memoized
-from pybossa.util import pretty_date, exists_materialized_view
+from pybossa.util import pretty_date
 from pybossa.model.user import User
 from pybossa.cache.projects import overall_progress, n_tasks, n_volunteers
 from pybossa.model.project import Project
 from pybossa.leaderboard.data import get_leaderboard as gl
 from pybossa.leaderboard.jobs import leaderboard as lb
+from pybossa.leaderboard.ranking import Leaderboard
 
 
 session = db.slave_session
@@ -33,12 +34,9 @@ session = db.slave_session
 
 def get_leaderboard(n, user_id=None, window=0, info=None):
     """Return the top n users with their rank."""
-    try:
-        return gl(top_users=n, user_id=user_id, window=window, info=info)
-    except ProgrammingError:
-        db.session.rollback()
+    if not Leaderboard(sentinel.master, info).is_loaded():
         lb(info=info)
-        return gl(top_users=n, user_id=user_id, window=window, info=info)
+    return gl(top_users=n, user_id=user_id, window=window, info=info)
 
 
 @memoize(timeout=timeouts.get('USER_TIMEOUT'))
@@ -97,18 +95,13 @@ def public_get_user_summary(name):
     return public_user
 
 
-@memoize(timeout=timeouts.get('USER_TIMEOUT'))
 def rank_and_score(user_id):
     """Return rank and score for a user."""
-    if exists_materialized_view(db, 'users_rank') is False:
+    board = Leaderboard(sentinel.master)
+    if not board.is_loaded():
         lb()
-    sql = text('''SELECT * from users_rank WHERE id=:user_id''')
-    results = session.execute(sql, dict(user_id=user_id))
-    rank_and_score = dict(rank=None, score=None)
-    for row in results:
-        rank_and_score['rank'] = row.rank
-        rank_and_score['score'] = row.score
-    return rank_and_score
+    rank, score = board.rank(user_id)
+    return dict(rank=rank, score=score)
 
 
 def projects_contributed(user_id, order_by='name'):
@@ -120,13 +113,17 @@ def projects_contributed(user_id, order_by='name'):
                SELECT * FROM project, projects_contributed
                WHERE project.id=projects_contributed.project_id ORDER BY {} DESC;
                '''.format(order_by))
-    results = session.execute(sql, dict(user_id=user_id))
+    results = session.execute(sql, dict(user_id=user_id)).fetchall()
     projects_contributed = []
+    project_ids = [row.id for row in results]
+    tasks = n_tasks.many(project_ids)
+    volunteers = n_volunteers.many(project_ids)
+    progress = overall_progress.many(project_ids)
     for row in results:
         project = dict(row)
-        project['n_tasks'] = n_tasks(row.id)
-        project['n_volunteers'] = n_volunteers(row.id)
-        project['overall_progress'] = overall_progress(row.id)
+        project['n_tasks'] = tasks[row.id]
+        project['n_volunteers'] = volunteers[row.id]
+        project['overall_progress'] = progress[row.id]
         projects_contributed.append(project)
     return projects_contributed
 
@@ -164,12 +161,16 @@ def published_projects(user_id):
                AND :user_id = ANY (project.owners_ids::int[]);
                ''')
     projects_published = []
-    results = session.execute(sql, dict(user_id=user_id))
+    results = session.execute(sql, dict(user_id=user_id)).fetchall()
+    project_ids = [row.id for row in results]
+    tasks = n_tasks.many(project_ids)
+    volunteers = n_volunteers.many(project_ids)
+    progress = overall_progress.many(project_ids)
     for row in results:
         project = dict(row)
-        project['n_tasks'] = n_tasks(row.id)
-        project['n_volunteers'] = n_volunteers(row.id)
-        project['overall_progress'] = overall_progress(row.id)
+        project['n_tasks'] = tasks[row.id]
+        project['n_volunteers'] = volunteers[row.id]
+        project['overall_progress'] = progress[row.id]
         projects_published.append(project)
     return projects_published
 
@@ -207,12 +208,16 @@ def draft_projects(user_id):
                AND :user_id = ANY (project.owners_ids::int[]);
                ''')
     projects_draft = []
-    results = session.execute(sql, dict(user_id=user_id))
+    results = session.execute(sql, dict(user_id=user_id)).fetchall()
+    project_ids = [row.id for row in results]
+    tasks = n_tasks.many(project_ids)
+    volunteers = n_volunteers.many(project_ids)
+    progress = overall_progress.many(project_ids)
     for row in results:
         project = dict(row)
-        project['n_tasks'] = n_tasks(row.id)
-        project['n_volunteers'] = n_volunteers(row.id)
-        project['overall_progress'] = overall_progress(row.id)
+        project['n_tasks'] = tasks[row.id]
+        project['n_volunteers'] = volunteers[row.id]
+        project['overall_progress'] = progress[row.id]
         projects_draft.append(project)
     return projects_draft
 
@@ -267,6 +272,44 @@ def delete_user_summary(name):
     delete_memoized(get_user_summary, name)
 
 
+# Columns of the users cached for their API key. Others, like the password
+# hash or the email address, are not kept in Redis.
+API_KEY_USER_COLUMNS = ['id', 'name', 'fullname', 'locale', 'api_key',
+                        'admin', 'pro', 'privacy_mode', 'restrict']
+
+
+@memoize(timeout=timeouts.get('API_KEY_TIMEOUT'))
+def get_api_key_user(api_key):
+    """Return the API_KEY_USER_COLUMNS of the user with api_key, or None."""
+    table = User.__table__
+    columns = [table.c[name] for name in API_KEY_USER_COLUMNS]
+    # Read from the master, a user who just got an API key can use it.
+    row = db.session.execute(
+        select(columns).where(table.c.api_key == api_key)).first()
+    if row is None:
+        return None
+    return dict((column.name, row[column]) for column in columns)
+
+
+def get_user_by_api_key(api_key):
+    """Return the user with api_key, or None.
+
+    The user is rebuilt from the cached columns and added to the session as
+    a persistent object, without querying the DB. The other columns are
+    loaded from the DB when they are used."""
+    data = get_api_key_user(api_key)
+    if data is None:
+        return None
+    user = User(**data)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def delete_api_key_user(api_key):
+    """Delete from cache the user of an API key."""
+    delete_memoized(get_api_key_user, api_key)
+
+
 @memoize(timeout=timeouts.get('APP_TIMEOUT'))
 def get_project_report_userdata(project_id):
     """Return users details who contributed to a particular project."""
@@ -16,6 +16,7 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 
+from datetime import datetime, timedelta
 from pybossa.model import make_timestamp
 
 
@@ -31,6 +32,25 @@ class ContributionsGuard(object):
         key = self._create_key(task, user)
         self.conn.setex(key, self.STAMP_TTL, make_timestamp())
 
+    def stamp_many(self, tasks, user, ttl=None):
+        """Stamp several tasks in one round trip and return the lease
+        expiration timestamp shared by all of them."""
+        ttl = ttl or self.STAMP_TTL
+        timestamp = make_timestamp()
+        pipeline = self.conn.pipeline(transaction=False)
+        for task in tasks:
+            pipeline.setex(self._create_key(task, user), ttl, timestamp)
+        pipeline.execute()
+        expiration = datetime.utcnow() + timedelta(seconds=ttl)
+        return expiration.isoformat()
+
+    def release_many(self, task_ids, user):
+        """Remove the stamps of unused tasks, returning how many existed."""
+        keys = [self._create_key_from_id(task_id, user) for task_id in task_ids]
+        if not keys:
+            return 0
+        return self.conn.delete(*keys)
+
     def check_task_stamped(self, task, user):
         key = self._create_key(task, user)
         task_requested = self.conn.get(key) is not None
@@ -41,11 +61,22 @@ class ContributionsGuard(object):
         timestamp = self.conn.get(key)
         return timestamp and timestamp.decode()
 
+    def retrieve_timestamps(self, task_ids, user):
+        """Return the stamp timestamps of several tasks in one round trip."""
+        pipeline = self.conn.pipeline(transaction=False)
+        for task_id in task_ids:
+            pipeline.get(self._create_key_from_id(task_id, user))
+        return [timestamp and timestamp.decode()
+                for timestamp in pipeline.execute()]
+
     def _create_key(self, task, user):
+        return self._create_key_from_id(task.id, user)
+
+    def _create_key_from_id(self, task_id, user):
         user_id = user['user_id'] or user['user_ip']
         if user.get('external_uid'):
             user_id = user['external_uid']
-        return self.KEY_PREFIX % (user_id, task.id)
+        return self.KEY_PREFIX % (user_id, task_id)
 
     def _remove_task_stamped(self, task, user):
         key = self._create_key(task, user)
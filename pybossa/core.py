@@ -482,7 +482,8 @@ def setup_hooks(app):
         if 'Authorization' in request.headers:
             apikey = request.headers.get('Authorization')
         if apikey:
-            user = user_repo.get_by(api_key=apikey)
+            from pybossa.cache.users import get_user_by_api_key
+            user = get_user_by_api_key(apikey)
             if user:
                 _request_ctx_stack.top.user = user
         # Handle forms
@@ -621,6 +622,7 @@ def setup_cache_timeouts(app):
     timeouts['USER_TIMEOUT'] = app.config['USER_TIMEOUT']
     timeouts['USER_TOP_TIMEOUT'] = app.config['USER_TOP_TIMEOUT']
     timeouts['USER_TOTAL_TIMEOUT'] = app.config['USER_TOTAL_TIMEOUT']
+    timeouts['API_KEY_TIMEOUT'] = app.config['API_KEY_TIMEOUT']
 
 
 def setup_scheduled_jobs(app):  # pragma: no cover
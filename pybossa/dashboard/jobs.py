@@ -43,13 +43,12 @@ def active_users_week():
     else:
         sql = text('''CREATE MATERIALIZED VIEW dashboard_week_users AS
                    WITH crafters_per_day AS
-                        (select to_date(task_run.finish_time,
-                                        'YYYY-MM-DD\THH24:MI:SS.US') AS day,
+                        (select pybossa_timestamp(task_run.finish_time)::date
+                                AS day,
                                 user_id, COUNT(task_run.user_id) AS day_crafters
                         FROM task_run
-                        WHERE to_date(task_run.finish_time,
-                                      'YYYY-MM-DD\THH24:MI:SS.US')
-                            >= NOW() - ('1 week'):: INTERVAL
+                        WHERE pybossa_timestamp(task_run.finish_time)
+                            >= NOW() AT TIME ZONE 'utc' - ('1 week')::INTERVAL
                         GROUP BY day, task_run.user_id)
                    SELECT day, COUNT(crafters_per_day.user_id) AS n_users
                    FROM crafters_per_day GROUP BY day ORDER BY day;''')
@@ -65,13 +64,12 @@ def active_anon_week():
     else:
         sql = text('''CREATE MATERIALIZED VIEW dashboard_week_anon AS
                    WITH crafters_per_day AS
-                        (select to_date(task_run.finish_time,
-                                        'YYYY-MM-DD\THH24:MI:SS.US') AS day,
+                        (select pybossa_timestamp(task_run.finish_time)::date
+                                AS day,
                                 user_ip, COUNT(task_run.user_ip) AS day_crafters
                         FROM task_run
-                        WHERE to_date(task_run.finish_time,
-                                      'YYYY-MM-DD\THH24:MI:SS.US')
-                            >= NOW() - ('1 week'):: INTERVAL
+                        WHERE pybossa_timestamp(task_run.finish_time)
+                            >= NOW() AT TIME ZONE 'utc' - ('1 week')::INTERVAL
                         GROUP BY day, task_run.user_ip)
                    SELECT day, COUNT(crafters_per_day.user_ip) AS n_users
                    FROM crafters_per_day GROUP BY day ORDER BY day;''')
@@ -86,13 +84,12 @@ def draft_projects_week():
         return _refresh_materialized_view('dashboard_week_project_draft')
     else:
         sql = text('''CREATE MATERIALIZED VIEW dashboard_week_project_draft AS
-                   SELECT TO_DATE(project.created, 'YYYY-MM-DD\THH24:MI:SS.US') AS day,
+                   SELECT pybossa_timestamp(project.created)::date AS day,
                    project.id, short_name, project.name,
                    owner_id, "user".name AS u_name, "user".email_addr
                    FROM project, "user"
-                   WHERE TO_DATE(project.created,
-                                'YYYY-MM-DD\THH24:MI:SS.US') >= now() -
-                                ('1 week')::INTERVAL
+                   WHERE pybossa_timestamp(project.created)
+                         >= NOW() AT TIME ZONE 'utc' - ('1 week')::INTERVAL
                    AND "user".id = project.owner_id
                    AND "user".restrict = false
                    AND project.published = false
@@ -108,13 +105,12 @@ def published_projects_week():
         return _refresh_materialized_view('dashboard_week_project_published')
     else:
         sql = text('''CREATE MATERIALIZED VIEW dashboard_week_project_published AS
-                   SELECT TO_DATE(auditlog.created, 'YYYY-MM-DD\THH24:MI:SS.US') AS day,
+                   SELECT pybossa_timestamp(auditlog.created)::date AS day,
                    project.id, project.short_name, project.name,
                    owner_id, "user".name AS u_name, "user".email_addr
                    FROM auditlog, project, "user"
-                   WHERE TO_DATE(auditlog.created,
-                                'YYYY-MM-DD\THH24:MI:SS.US') >= now() -
-                                ('1 week')::INTERVAL
+                   WHERE pybossa_timestamp(auditlog.created)
+                         >= NOW() AT TIME ZONE 'utc' - ('1 week')::INTERVAL
                    AND "user".id = project.owner_id
                    AND "user".restrict = false
                    AND project.owner_id = auditlog.user_id
@@ -132,13 +128,12 @@ def update_projects_week():
         return _refresh_materialized_view('dashboard_week_project_update')
     else:
         sql = text('''CREATE MATERIALIZED VIEW dashboard_week_project_update AS
-                   SELECT TO_DATE(project.updated, 'YYYY-MM-DD\THH24:MI:SS.US') AS day,
+                   SELECT pybossa_timestamp(project.updated)::date AS day,
                    project.id, short_name, project.name,
                    owner_id, "user".name AS u_name, "user".email_addr
                    FROM project, "user"
-                   WHERE TO_DATE(project.updated,
-                                'YYYY-MM-DD\THH24:MI:SS.US') >= now() -
-                                ('1 week')::INTERVAL
+                   WHERE pybossa_timestamp(project.updated)
+                         >= NOW() AT TIME ZONE 'utc' - ('1 week')::INTERVAL
                    AND "user".id = project.owner_id
                    AND "user".restrict = false
                    GROUP BY project.id, "user".name, "user".email_addr;''')
@@ -153,12 +148,10 @@ def new_tasks_week():
         return _refresh_materialized_view('dashboard_week_new_task')
     else:
         sql = text('''CREATE MATERIALIZED VIEW dashboard_week_new_task AS
-                      SELECT TO_DATE(task.created,
-                                     'YYYY-MM-DD\THH24:MI:SS.US') AS day,
+                      SELECT pybossa_timestamp(task.created)::date AS day,
                       COUNT(task.id) AS day_tasks
-                      FROM task WHERE TO_DATE(task.created,
-                                              'YYYY-MM-DD\THH24:MI:SS.US')
-                                          >= now() - ('1 week'):: INTERVAL
+                      FROM task WHERE pybossa_timestamp(task.created)
+                          >= NOW() AT TIME ZONE 'utc' - ('1 week')::INTERVAL
                       GROUP BY day ORDER BY day ASC;''')
         db.session.execute(sql)
         db.session.commit()
@@ -171,12 +164,10 @@ def new_task_runs_week():
         return _refresh_materialized_view('dashboard_week_new_task_run')
     else:
         sql = text('''CREATE MATERIALIZED VIEW dashboard_week_new_task_run AS
-                      SELECT TO_DATE(task_run.finish_time,
-                                     'YYYY-MM-DD\THH24:MI:SS.US') AS day,
+                      SELECT pybossa_timestamp(task_run.finish_time)::date AS day,
                       COUNT(task_run.id) AS day_task_runs
-                      FROM task_run WHERE TO_DATE(task_run.finish_time,
-                                              'YYYY-MM-DD\THH24:MI:SS.US')
-                                          >= now() - ('1 week'):: INTERVAL
+                      FROM task_run WHERE pybossa_timestamp(task_run.finish_time)
+                          >= NOW() AT TIME ZONE 'utc' - ('1 week')::INTERVAL
                       GROUP BY day;''')
         db.session.execute(sql)
         db.session.commit()
@@ -189,12 +180,10 @@ def new_users_week():
         return _refresh_materialized_view('dashboard_week_new_users')
     else:
         sql = text('''CREATE MATERIALIZED VIEW dashboard_week_new_users AS
-                      SELECT TO_DATE("user".created,
-                                     'YYYY-MM-DD\THH24:MI:SS.US') AS day,
+                      SELECT pybossa_timestamp("user".created)::date AS day,
                       COUNT("user".id) AS day_users
-                      FROM "user" WHERE TO_DATE("user".created,
-                                              'YYYY-MM-DD\THH24:MI:SS.US')
-                                          >= now() - ('1 week'):: INTERVAL
+                      FROM "user" WHERE pybossa_timestamp("user".created)
+                          >= NOW() AT TIME ZONE 'utc' - ('1 week')::INTERVAL
                       AND "user".restrict=false
                       GROUP BY day;''')
         db.session.execute(sql)
@@ -209,12 +198,12 @@ def returning_users_week():
     else:
         sql = text('''CREATE MATERIALIZED VIEW dashboard_week_returning_users AS
                    WITH data AS (
-                    SELECT user_id, TO_DATE(task_run.finish_time,
-                    'YYYY-MM-DD\THH24:MI:SS.US') AS day
+                    SELECT user_id,
+                    pybossa_timestamp(task_run.finish_time)::date AS day
                    FROM task_run
-                   WHERE TO_DATE(task_run.finish_time,
-                   'YYYY-MM-DD\THH24:MI:SS.US') >= NOW()
-                   - ('1 week')::INTERVAL GROUP BY day, task_run.user_id)
+                   WHERE pybossa_timestamp(task_run.finish_time)
+                   >= NOW() AT TIME ZONE 'utc' - ('1 week')::INTERVAL
+                   GROUP BY day, task_run.user_id)
                    SELECT user_id, COUNT(user_id) AS n_days
                    FROM data GROUP BY user_id HAVING(count(user_id) > 1)
                    ORDER by n_days;
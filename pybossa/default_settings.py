@@ -65,6 +65,17 @@ REDIS_RETRY_ON_TIMEOUT = True
 
 REDIS_KEYPREFIX = 'pybossa_cache'
 
+# Seconds cached values are also kept in memory by each process, 0 disables it
+CACHE_LOCAL_TIMEOUT = 0
+CACHE_LOCAL_MAX_SIZE = 1024
+
+# Serialization of cached values and feed events: pickle or msgpack. Values
+# bigger than CACHE_COMPRESSION_THRESHOLD bytes are compressed with
+# CACHE_COMPRESSION (None, zlib or lz4) by the msgpack codec
+CACHE_CODEC = 'pickle'
+CACHE_COMPRESSION = None
+CACHE_COMPRESSION_THRESHOLD = 1024
+
 # Default cache timeouts
 # Project cache
 AVATAR_TIMEOUT = 30 * 24 * 60 * 60
@@ -82,6 +93,13 @@ CATEGORY_TIMEOUT = 24 * 60 * 60
 USER_TIMEOUT = 15 * 60
 USER_TOP_TIMEOUT = 24 * 60 * 60
 USER_TOTAL_TIMEOUT = 24 * 60 * 60
+# Users authenticated by API key
+API_KEY_TIMEOUT = 5 * 60
+
+# Seconds a verified JWT token is trusted by each process without checking
+# its signature again, 0 disables it
+JWT_CACHE_TIMEOUT = 60
+JWT_CACHE_MAX_SIZE = 1024
 
 # Project Presenters
 PRESENTERS = ["basic", "image", "sound", "video", "map", "pdf"]
@@ -155,8 +173,13 @@ UNPUBLISH_PROJECTS = True
 # TTL for ZIP files of personal data
 TTL_ZIP_SEC_FILES = 3
 
+# Delta files appended to an export ZIP before it is generated from scratch
+EXPORT_MAX_DELTAS = 30
+
 # Default cryptopan key
 CRYPTOPAN_KEY = '32-char-str-for-AES-key-and-pad.'
+# Anonymized IPs kept in memory by each process
+ANONYMIZER_CACHE_SIZE = 4096
 
 # Instruct PYBOSSA to generate absolute paths or not for avatars
 AVATAR_ABSOLUTE = True
@@ -170,4 +193,4 @@ USER_INACTIVE_NOTIFICATION = 5
 USER_INACTIVE_DELETE = 6
 
 # Inactive users SQL query to select
-INACTIVE_USERS_SQL_QUERY = """SELECT user_id FROM task_run WHERE user_id IS NOT NULL AND to_date(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US') >= NOW() - '12 month'::INTERVAL AND to_date(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US') < NOW() - '3 month'::INTERVAL GROUP BY user_id ORDER BY user_id;"""
+INACTIVE_USERS_SQL_QUERY = """SELECT user_id FROM task_run WHERE user_id IS NOT NULL AND pybossa_timestamp(task_run.finish_time) >= NOW() AT TIME ZONE 'utc' - '12 month'::INTERVAL AND pybossa_timestamp(task_run.finish_time) < NOW() AT TIME ZONE 'utc' - '3 month'::INTERVAL GROUP BY user_id ORDER BY user_id;"""
@@ -21,11 +21,15 @@ Exporter module for exporting tasks and tasks results out of PYBOSSA
 """
 
 import copy
+import io
 import os
+import shutil
 import zipfile
 import tempfile
 import json
-from pybossa.core import uploader, task_repo, result_repo
+from contextlib import contextmanager
+from sqlalchemy import text
+from pybossa.core import db, sentinel, uploader, task_repo, result_repo
 from pybossa.uploader import local
 from unidecode import unidecode
 from flask import url_for, safe_join, send_file, redirect, current_app
@@ -41,10 +45,37 @@ class Exporter(object):
                         task_run=[task_repo, 'filter_task_runs_by'],
                         result=[result_repo, 'filter_by'])
 
+    # Rows fetched per query while exporting, so memory stays flat no matter
+    # how big the project is.
+    chunk_size = 1000
+
+    # Per ZIP high-water mark of the last nightly export.
+    state_key = 'pybossa:export:%s'
+
     def _get_data(self, table, project_id, flat=False, info_only=False):
         """Get the data for a given table."""
+        return list(self._iter_data(table, project_id, flat, info_only))
+
+    def _iter_rows(self, table, project_id, last_id=None, max_id=None):
+        """Yield the rows of a given table with last_id < id <= max_id,
+        fetching them by id chunks."""
         repo, query = self.repositories[table]
-        data = getattr(repo, query)(project_id=project_id)
+        while True:
+            rows = getattr(repo, query)(project_id=project_id,
+                                        limit=self.chunk_size,
+                                        last_id=last_id)
+            for row in rows:
+                if max_id is not None and row.id > max_id:
+                    return
+                yield row
+            if len(rows) < self.chunk_size:
+                break
+            last_id = rows[-1].id
+
+    def _iter_data(self, table, project_id, flat=False, info_only=False,
+                   last_id=None, max_id=None):
+        """Yield the exported dicts of a given table one at a time."""
+        data = self._iter_rows(table, project_id, last_id, max_id)
         ignore_keys = current_app.config.get('IGNORE_FLAT_KEYS') or []
         if table == 'task':
             csv_export_key = current_app.config.get('TASK_CSV_EXPORT_INFO_KEY')
@@ -54,7 +85,6 @@ class Exporter(object):
             csv_export_key = current_app.config.get('RESULT_CSV_EXPORT_INFO_KEY')
         if info_only:
             if flat:
-                tmp = []
                 for row in data:
                     inf = copy.deepcopy(row.dictize()['info'])
                     if inf and type(inf) == dict and csv_export_key and inf.get(csv_export_key):
@@ -62,24 +92,18 @@ class Exporter(object):
                     new_key = '%s_id' % table
                     if inf and type(inf) == dict:
                         inf[new_key] = row.id
-                        tmp.append(flatten(inf,
-                                           root_keys_to_ignore=ignore_keys))
+                        yield flatten(inf, root_keys_to_ignore=ignore_keys)
                     elif inf and type(inf) == list:
                         for datum in inf:
                             if type(datum) == dict:
                                 datum[new_key] = row.id
-                                tmp.append(flatten(datum,
-                                                   root_keys_to_ignore=ignore_keys))
+                                yield flatten(datum,
+                                              root_keys_to_ignore=ignore_keys)
             else:
-                tmp = []
                 for row in data:
-                    if row.dictize()['info']:
-                        tmp.append(row.dictize()['info'])
-                    else:
-                        tmp.append({})
+                    yield row.info or {}
         else:
             if flat:
-                tmp = []
                 for row in data:
                     cleaned = row.dictize()
                     fav_user_ids = None
@@ -99,17 +123,17 @@ class Exporter(object):
                     if task_run_ids:
                         cleaned['task_run_ids'] = task_run_ids
 
-                    tmp.append(cleaned)
+                    yield cleaned
             else:
-                tmp = [row.dictize() for row in data]
-        return tmp
+                for row in data:
+                    yield row.dictize()
 
     def _project_name_latin_encoded(self, project):
         """project short name for later HTML header usage"""
         name = unidecode(project.short_name)
         return name
 
-    def _zip_factory(self, filename):
+    def _zip_factory(self, filename, mode='w'):
         """create a ZipFile Object with compression and allow big ZIP files (allowZip64)"""
         try:
             import zlib
@@ -117,13 +141,119 @@ class Exporter(object):
             zip_compression= zipfile.ZIP_DEFLATED
         except Exception as ex:
             zip_compression= zipfile.ZIP_STORED
-        _zip = zipfile.ZipFile(file=filename, mode='w', compression=zip_compression, allowZip64=True)
+        _zip = zipfile.ZipFile(file=filename, mode=mode, compression=zip_compression, allowZip64=True)
         return _zip
 
-    def _make_zip(self, project, ty):
+    @contextmanager
+    def _zip_member(self, _zip, filename):
+        """Open a text stream writing straight into a new ZIP member."""
+        member = _zip.open(secure_filename(filename), mode='w',
+                           force_zip64=True)
+        stream = io.TextIOWrapper(member, encoding='utf-8', newline='')
+        try:
+            yield stream
+        finally:
+            stream.close()
+
+    def _make_zip(self, project, ty, max_id=None):
         """Generate a ZIP of a certain type and upload it"""
         pass
 
+    def _append_to_zip(self, _zip, project, ty, last_id, max_id):
+        """Add to a ZIP the rows of a certain type in (last_id, max_id]"""
+        pass
+
+    def _table_state(self, table, project_id, max_id=None):
+        """Return the highest id and a watermark of the exported rows of a
+        table: their count and highest id, plus the completed ones for tasks.
+
+        Only aggregates of the ids are read, not the rows, so rows edited
+        in place without changing the watermark are only exported again
+        when the ZIP is generated from scratch."""
+        columns = 'MAX(t.id), COUNT(t.id)'
+        if table == 'task':
+            columns += ", COUNT(t.id) FILTER (WHERE t.state='completed')"
+        sql = '''SELECT {} FROM {} AS t
+                 WHERE t.project_id=:project_id'''.format(columns, table)
+        if table == 'result':
+            sql += ' AND t.last_version'
+        if max_id is not None:
+            sql += ' AND t.id <= :max_id'
+        row = db.session.execute(text(sql), dict(project_id=project_id,
+                                                 max_id=max_id)).first()
+        watermark = ':'.join(str(value or 0) for value in row)
+        return row[0] or 0, watermark
+
+    def _get_export_state(self, project, ty):
+        state = sentinel.master.hgetall(
+            self.state_key % self.download_name(project, ty))
+        if not state:
+            return None
+        return dict((k.decode(), v.decode()) for k, v in state.items())
+
+    def _set_export_state(self, project, ty, max_id, fingerprint, deltas,
+                          size):
+        key = self.state_key % self.download_name(project, ty)
+        state = dict(max_id=max_id, fingerprint=fingerprint,
+                     deltas=deltas, size=size)
+        pipeline = sentinel.master.pipeline()
+        pipeline.delete(key)
+        for field, value in state.items():
+            pipeline.hset(key, field, value)
+        pipeline.execute()
+
+    def _zip_matches(self, project, ty, state, path):
+        """Return True if the stored ZIP is the one described by state."""
+        if state is None:
+            return False
+        if path is None:
+            return uploader.file_exists(self.download_name(project, ty),
+                                        self._container(project))
+        return (os.path.isfile(path) and
+                os.path.getsize(path) == int(state['size']))
+
+    def _append_delta(self, project, ty, path, last_id, max_id):
+        zipped_datafile = tempfile.NamedTemporaryFile()
+        try:
+            shutil.copyfile(path, zipped_datafile.name)
+            _zip = self._zip_factory(zipped_datafile.name, mode='a')
+            try:
+                self._append_to_zip(_zip, project, ty, last_id, max_id)
+            finally:
+                _zip.close()
+            _file = FileStorage(filename=self.download_name(project, ty),
+                                stream=zipped_datafile)
+            uploader.upload_file(_file, container=self._container(project))
+        finally:
+            zipped_datafile.close()
+
+    def update_zip(self, project, ty):
+        """Bring the ZIP of a certain type up to date for the nightly export.
+
+        Nothing is done when the rows did not change since the last run. When
+        rows were only added, and the ZIP is on local disk, they are appended
+        to it as a delta file. Otherwise the ZIP is generated from scratch."""
+        state = self._get_export_state(project, ty)
+        path = self._local_zip_path(project, ty)
+        max_id, fingerprint = self._table_state(ty, project.id)
+        if self._zip_matches(project, ty, state, path):
+            last_id = int(state['max_id'])
+            if last_id == max_id and fingerprint == state['fingerprint']:
+                return
+            max_deltas = current_app.config.get('EXPORT_MAX_DELTAS', 30)
+            if (path is not None and last_id < max_id and
+                    int(state['deltas']) < max_deltas and
+                    self._table_state(ty, project.id, last_id)[1] ==
+                    state['fingerprint']):
+                self._append_delta(project, ty, path, last_id, max_id)
+                self._set_export_state(project, ty, max_id, fingerprint,
+                                       int(state['deltas']) + 1,
+                                       os.path.getsize(path))
+                return
+        self._make_zip(project, ty, max_id=max_id)
+        size = os.path.getsize(path) if path and os.path.isfile(path) else 0
+        self._set_export_state(project, ty, max_id, fingerprint, 0, size)
+
     def _container(self, project):
         return "user_%d" % project.owner_id
 
@@ -136,6 +266,13 @@ class Exporter(object):
             filepath = container
         return filepath
 
+    def _local_zip_path(self, project, ty):
+        """Return the path of the ZIP when it is stored on local disk."""
+        if not isinstance(uploader, local.LocalUploader):
+            return None
+        return safe_join(self._download_path(project),
+                         self.download_name(project, ty))
+
     def download_name(self, project, ty, _format):
         """Get the filename (without) path of the file which should be downloaded.
            This function does not check if this filename actually exists!"""
@@ -20,60 +20,82 @@
 CSV Exporter module for exporting tasks and tasks results out of PYBOSSA
 """
 
+import csv
+import json
 import tempfile
+from collections import OrderedDict
 from pybossa.exporter import Exporter
 from pybossa.core import uploader, task_repo
 from pybossa.model.task import Task
 from pybossa.model.task_run import TaskRun
 from werkzeug.datastructures import FileStorage
-from werkzeug.utils import secure_filename
-import pandas as pd
 
 
 class CsvExporter(Exporter):
 
-    def _respond_csv(self, table, project_id, info_only=False):
-        flat_data = self._get_data(table, project_id,
-                                   flat=True, info_only=info_only)
-        return pd.DataFrame(flat_data)
+    def _respond_csv(self, table, project_id, info_only=False, last_id=None,
+                     max_id=None):
+        """Return the flat rows of table spooled to a temporary file, one
+        JSON document per line, along with the union of their keys in order
+        of appearance, which become the CSV columns."""
+        spool = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+        columns = OrderedDict()
+        for row in self._iter_data(table, project_id, flat=True,
+                                   info_only=info_only, last_id=last_id,
+                                   max_id=max_id):
+            for key in row:
+                columns[key] = None
+            spool.write(json.dumps(row))
+            spool.write('\n')
+        spool.seek(0)
+        return spool, list(columns)
 
-    def _make_zip(self, project, ty):
+    def _write_csv(self, out, spool, columns):
+        if not columns:
+            return
+        writer = csv.DictWriter(out, fieldnames=columns, lineterminator='\n')
+        writer.writeheader()
+        for line in spool:
+            writer.writerow(json.loads(line))
+
+    def _write_csv_files(self, _zip, project, ty, suffix='', last_id=None,
+                         max_id=None):
         name = self._project_name_latin_encoded(project)
-        dataframe = self._respond_csv(ty, project.id)
-        if dataframe is not None:
-            info_dataframe = self._respond_csv(ty, project.id, info_only=True)
-            datafile = tempfile.NamedTemporaryFile(mode='w')
-            info_datafile = tempfile.NamedTemporaryFile(mode='w')
+        for info_only, fname in ((False, '%s_%s%s.csv'),
+                                 (True, '%s_%s_info_only%s.csv')):
+            spool, columns = self._respond_csv(ty, project.id,
+                                               info_only=info_only,
+                                               last_id=last_id, max_id=max_id)
             try:
-                dataframe.to_csv(
-                    datafile, index=False, encoding='utf-8')
-                info_dataframe.to_csv(
-                    info_datafile, index=False, encoding='utf-8')
-                datafile.flush()
-                info_datafile.flush()
-                zipped_datafile = tempfile.NamedTemporaryFile()
-                try:
-                    _zip = self._zip_factory(zipped_datafile.name)
-                    _zip.write(
-                        datafile.name, secure_filename('%s_%s.csv' % (name, ty)))
-                    _zip.write(
-                        info_datafile.name, secure_filename('%s_%s_info_only.csv' % (name, ty)))
-                    _zip.close()
-                    container = "user_%d" % project.owner_id
-                    _file = FileStorage(
-                        filename=self.download_name(project, ty), stream=zipped_datafile)
-                    uploader.upload_file(_file, container=container)
-                finally:
-                    zipped_datafile.close()
+                with self._zip_member(_zip, fname % (name, ty, suffix)) as out:
+                    self._write_csv(out, spool, columns)
             finally:
-                datafile.close()
-                info_datafile.close()
+                spool.close()
+
+    def _make_zip(self, project, ty, max_id=None):
+        zipped_datafile = tempfile.NamedTemporaryFile()
+        try:
+            _zip = self._zip_factory(zipped_datafile.name)
+            try:
+                self._write_csv_files(_zip, project, ty, max_id=max_id)
+            finally:
+                _zip.close()
+            container = "user_%d" % project.owner_id
+            _file = FileStorage(
+                filename=self.download_name(project, ty), stream=zipped_datafile)
+            uploader.upload_file(_file, container=container)
+        finally:
+            zipped_datafile.close()
+
+    def _append_to_zip(self, _zip, project, ty, last_id, max_id):
+        self._write_csv_files(_zip, project, ty, '_since_%d' % last_id,
+                              last_id, max_id)
 
     def download_name(self, project, ty):
         return super(CsvExporter, self).download_name(project, ty, 'csv')
 
     def pregenerate_zip_files(self, project):
         print("%d (csv)" % project.id)
-        self._make_zip(project, "task")
-        self._make_zip(project, "task_run")
-        self._make_zip(project, "result")
+        self.update_zip(project, "task")
+        self.update_zip(project, "task_run")
+        self.update_zip(project, "result")
@@ -23,10 +23,10 @@ JSON Exporter module for exporting tasks and tasks results out of PYBOSSA
 import uuid
 import json
 import tempfile
+from collections.abc import Iterator
 from pybossa.exporter import Exporter
 from pybossa.core import uploader, task_repo, sentinel
 from werkzeug.datastructures import FileStorage
-from werkzeug.utils import secure_filename
 from rq_scheduler import Scheduler
 from datetime import timedelta
 from flask import current_app
@@ -45,39 +45,55 @@ class JsonExporter(Exporter):
         return self.gen_json(ty, id)
 
     def _make_zip(self, project, ty, name=None, data=None, user_id=None,
-                  zipname=None):
+                  zipname=None, max_id=None):
         if data:
             return self.handle_zip(name, data, ty,
                                    user_id, project,
                                    'json', zipname)
         else:
             name = self._project_name_latin_encoded(project)
-            json_task_generator = self._respond_json(ty, project.id)
+            json_task_generator = self._iter_data(ty, project.id,
+                                                  max_id=max_id)
             if json_task_generator is not None:
                 return self.handle_zip(name, json_task_generator,
                                        ty, user_id, project, 'json', zipname)
 
+    def _append_to_zip(self, _zip, project, ty, last_id, max_id):
+        name = self._project_name_latin_encoded(project)
+        fname = '%s_%s_since_%d.json' % (name, ty, last_id)
+        with self._zip_member(_zip, fname) as out:
+            self._write_json(out, self._iter_data(ty, project.id,
+                                                  last_id=last_id,
+                                                  max_id=max_id))
+
     def download_name(self, project, ty):
         return super(JsonExporter, self).download_name(project, ty, 'json')
 
     def pregenerate_zip_files(self, project):
         print("%d (json)" % project.id)
-        self._make_zip(project, "task")
-        self._make_zip(project, "task_run")
-        self._make_zip(project, "result")
+        self.update_zip(project, "task")
+        self.update_zip(project, "task_run")
+        self.update_zip(project, "result")
+
+    def _write_json(self, out, data):
+        """Write data as JSON, streaming it element by element when it is a
+        list or an iterator so that it never needs to be held in memory."""
+        if not isinstance(data, (list, Iterator)):
+            out.write(json.dumps(data))
+            return
+        out.write('[')
+        for i, item in enumerate(data):
+            if i:
+                out.write(', ')
+            out.write(json.dumps(item))
+        out.write(']')
 
     def handle_zip(self, name, data, ty, user_id, project, ext, zipname=None):
         zipped_datafile = tempfile.NamedTemporaryFile()
         _zip = self._zip_factory(zipped_datafile.name)
         try:
-            datafile = tempfile.NamedTemporaryFile(mode='w')
-            try:
-                datafile.write(json.dumps(data))
-                datafile.flush()
-                _zip.write(datafile.name,
-                           secure_filename('%s_%s.%s' % (name, ty, ext)))
-            finally:
-                datafile.close()
+            with self._zip_member(_zip, '%s_%s.%s' % (name, ty, ext)) as out:
+                self._write_json(out, data)
         finally:
             _zip.close()
             if user_id:
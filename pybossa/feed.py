@@ -18,10 +18,7 @@
 import json
 from time import time
 from pybossa.core import sentinel
-try:
-    import pickle as pickle
-except ImportError:  # pragma: no cover
-    import pickle
+from pybossa.cache import codec
 
 
 FEED_KEY = 'pybossa_feed'
@@ -30,7 +27,7 @@ FEED_KEY = 'pybossa_feed'
 def update_feed(obj):
     """Add domain object to update feed in Redis."""
     pipeline = sentinel.master.pipeline()
-    serialized_object = pickle.dumps(obj)
+    serialized_object = codec.dumps(obj)
     mapping = dict()
     mapping[serialized_object] = time()
     pipeline.zadd(FEED_KEY, mapping)
@@ -42,7 +39,7 @@ def get_update_feed():
     feed = []
     data = sentinel.slave.zrevrange(FEED_KEY, 0, 99, withscores=True)
     for u in data:
-        tmp = pickle.loads(u[0])
+        tmp = codec.loads(u[0])
         tmp['updated'] = u[1]
         if tmp.get('info') and type(tmp.get('info')) == str:
             tmp['info'] = json.loads(tmp['info'])
@@ -16,23 +16,50 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 """Hateoas module for PYBOSSA."""
-from flask import url_for
+from flask import url_for, request, has_request_context
 
 
 class Hateoas(object):
 
     """Hateoas class."""
 
+    # Stand-in id the link templates are built with.
+    placeholder = 2147483647
+
+    # Templates are kept per host, which is up to the client when
+    # SERVER_NAME is not set, so they are bounded.
+    max_templates = 1000
+
+    def __init__(self):
+        self._templates = {}
+
     def link(self, rel, title, href):
         """Return hateoas link."""
         return "<link rel='%s' title='%s' href='%s'/>" % (rel, title, href)
 
+    def _template(self, title, rel):
+        """Return the head and tail of the links to title with rel.
+
+        url_for is only called the first time for every host, then the
+        links are built by putting the id between the two."""
+        key = (title, rel)
+        if has_request_context():
+            key += (request.url_root, request.blueprint)
+        template = self._templates.get(key)
+        if template is None:
+            href = url_for(".api_%s" % title, oid=self.placeholder,
+                           _external=True)
+            template = self.link(rel, title, href).rsplit(
+                str(self.placeholder), 1)
+            if len(self._templates) >= self.max_templates:
+                self._templates.clear()
+            self._templates[key] = template
+        return template
+
     def create_link(self, item_id, title, rel='self'):
         """Create hateoas link."""
-        # title = item.__class__.__name__.lower()
-        method = ".api_%s" % title
-        href = url_for(method, oid=item_id, _external=True)
-        return self.link(rel, title, href)
+        head, tail = self._template(title, rel)
+        return head + str(item_id) + tail
 
     def create_links(self, item):
         """Create Hateoas links."""
@@ -17,13 +17,12 @@
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 
 import requests
-from io import StringIO
 from flask_babel import gettext
 import pandas as pd
 
 from .base import BulkTaskImport, BulkImportException
 from werkzeug.datastructures import FileStorage
-import io, time
+import io, time, shutil, tempfile
 
 class BulkTaskCSVImport(BulkTaskImport):
 
@@ -35,42 +34,97 @@ class BulkTaskCSVImport(BulkTaskImport):
         self.url = csv_url
         self.last_import_meta = last_import_meta
 
+    # Rows parsed at a time, so big files are imported in bounded memory.
+    chunk_size = 10000
+    # Bytes of a remote CSV kept in memory before it is spooled to disk.
+    spool_size = 8 * 1024 * 1024
+
+    malformed_msg = "The file you uploaded is a malformed CSV."
+
     def tasks(self):
         """Get tasks from a given URL."""
         dataurl = self._get_data_url()
-        r = requests.get(dataurl)
+        r = requests.get(dataurl, stream=True)
         return self._get_csv_data_from_request(r)
 
     def _get_data_url(self):
         """Get data from URL."""
         return self.url
 
-    def _import_csv_tasks(self, csv_df):
+    def _read_csv(self, csvcontent, dtype=None):
+        """Return an iterator over the CSV in DataFrames of chunk_size rows."""
+        return pd.read_csv(csvcontent, chunksize=self.chunk_size, dtype=dtype)
+
+    def _get_csv_dtypes(self, csvcontent):
+        """Check the whole CSV and return the dtype of each column.
+
+        Tasks are committed in batches as they are read, so the CSV is
+        checked before any of them is imported. The dtypes are the ones
+        pandas infers for the whole file, so that a value is not parsed as
+        7 in a chunk and as 7.0 in another one.
+        """
+        headers = None
+        dtypes = dict()
+        try:
+            for csv_df in self._read_csv(csvcontent):
+                if headers is None:
+                    headers = list(csv_df.columns)
+                    self._check_no_duplicated_headers(headers)
+                    self._check_no_empty_headers(headers)
+                self._check_valid_row_length(csv_df)
+                for column, dtype in csv_df.dtypes.items():
+                    dtypes.setdefault(column, set()).add(dtype)
+        except pd.errors.ParserError:
+            # Rows after the first one with more cells than the headers
+            raise BulkImportException(self.malformed_msg)
+        return dict((column, self._common_dtype(column_dtypes))
+                    for column, column_dtypes in dtypes.items())
+
+    def _common_dtype(self, dtypes):
+        if len(dtypes) == 1:
+            return dtypes.pop()
+        # Integer columns with empty cells are parsed as floats.
+        if all(dtype.kind in 'if' for dtype in dtypes):
+            return 'float64'
+        return object
+
+    def _import_csv_tasks(self, csvcontent):
         """Import CSV tasks."""
-        headers = []
         fields = set(['state', 'quorum', 'calibration', 'priority_0',
                       'n_answers'])
-        field_header_index = []
-        row_number = 0
-
-        headers = list(csv_df.columns)
-        self._check_no_duplicated_headers(headers)
-        self._check_no_empty_headers(headers)
-        field_headers = set(headers) & fields
-        for field in field_headers:
-            field_header_index.append(headers.index(field))
-
-        self._check_valid_row_length(csv_df)
-
-        for index, row in csv_df.iterrows():
-            row_number += 1
-            task_data = {"info": {}}
-            for idx, cell in enumerate(list(row)):
-                if idx in field_header_index:
-                    task_data[headers[idx]] = cell
-                else:
-                    task_data["info"][headers[idx]] = cell
-            yield task_data
+        integer_fields = set(['quorum', 'calibration', 'n_answers'])
+        dtypes = self._get_csv_dtypes(csvcontent)
+        csvcontent.seek(0)
+        headers = None
+
+        for csv_df in self._read_csv(csvcontent, dtype=dtypes):
+            if headers is None:
+                headers = list(csv_df.columns)
+                field_headers = [h for h in headers if h in fields]
+                info_headers = [h for h in headers if h not in fields]
+
+            # Empty cells are empty strings in info, and fall back to the
+            # column default for the task fields.
+            infos = (csv_df[info_headers].fillna('').astype(object)
+                     .to_dict('records'))
+            task_fields = (csv_df[field_headers].astype(object)
+                           .to_dict('records'))
+            for info, task_data in zip(infos, task_fields):
+                task_data = dict((k, v) for k, v in task_data.items()
+                                 if not pd.isnull(v))
+                # Columns with empty cells are parsed as floats.
+                for k in integer_fields & set(task_data):
+                    if isinstance(task_data[k], float):
+                        task_data[k] = int(task_data[k])
+                task_data['info'] = info
+                yield task_data
+
+    def _import_csv_file_tasks(self, stream):
+        try:
+            for task_data in self._import_csv_tasks(stream):
+                yield task_data
+        finally:
+            stream.close()
 
     def _check_no_duplicated_headers(self, headers):
         if len(headers) != len(set(headers)):
@@ -88,8 +142,7 @@ class BulkTaskCSVImport(BulkTaskImport):
 
     def _check_valid_row_length(self, df):
         if type(df.index) is not pd.RangeIndex:
-            msg = "The file you uploaded is a malformed CSV."
-            raise BulkImportException(msg)
+            raise BulkImportException(self.malformed_msg)
 
     def _get_csv_data_from_request(self, r):
         """Get CSV data from a request."""
@@ -103,10 +156,13 @@ class BulkTaskCSVImport(BulkTaskImport):
             raise BulkImportException(msg, 'error')
 
         r.encoding = 'utf-8'
-        csvcontent = StringIO(r.text)
-        csv_df = pd.read_csv(csvcontent)
-        csv_df.fillna('')
-        return self._import_csv_tasks(csv_df)
+        # The CSV is read twice, first to check it and then to import it.
+        csvcontent = tempfile.SpooledTemporaryFile(max_size=self.spool_size,
+                                                   mode='w+', newline='',
+                                                   encoding='utf-8')
+        shutil.copyfileobj(ResponseStream(r), csvcontent)
+        csvcontent.seek(0)
+        return self._import_csv_file_tasks(csvcontent)
 
 
 class BulkTaskGDImport(BulkTaskCSVImport):
@@ -166,12 +222,46 @@ class BulkTaskLocalCSVImport(BulkTaskCSVImport):
             raise BulkImportException(gettext(msg), 'error')
 
         csv_file.stream.seek(0)
-        csvcontent = io.StringIO(csv_file.stream.read())
-        csv_df = pd.read_csv(csvcontent)
-        csv_df.fillna('')
-        return list(self._import_csv_tasks(csv_df))
+        return self._import_csv_file_tasks(csv_file.stream)
 
     def tasks(self):
         """Get tasks from a given URL."""
         csv_filename = self._get_data()
         return self._get_csv_data_from_request(csv_filename)
+
+
+class ResponseStream(object):
+
+    """Read only file object over the decoded body of a streamed response."""
+
+    def __init__(self, response, chunk_size=64 * 1024):
+        self._chunks = response.iter_content(chunk_size=chunk_size,
+                                             decode_unicode=True)
+        self._buffer = ''
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def __iter__(self):
+        line = self.readline()
+        while line:
+            yield line
+            line = self.readline()
+
+    def readline(self):
+        while '\n' not in self._buffer:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        end = self._buffer.find('\n') + 1 or len(self._buffer)
+        data, self._buffer = self._buffer[:end], self._buffer[end:]
+        return data
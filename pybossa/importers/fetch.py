@@ -0,0 +1,89 @@
+# -*- coding: utf8 -*-
+# This file is part of PYBOSSA.
+#
+# Copyright (C) 2015 Scifabric LTD.
+#
+# PYBOSSA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PYBOSSA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Concurrent HTTP fetching for the importers.
+
+Requests share a pooled session that retries failed GETs with exponential
+backoff, and run in a bounded thread pool with a limit on the requests in
+flight to the same host.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class Fetcher(object):
+
+    """Fetch URLs concurrently with a pooled session."""
+
+    max_workers = 8
+    per_host = 4
+    retries = 3
+    backoff_factor = 0.5
+    retry_statuses = (429, 500, 502, 503, 504)
+    timeout = 30
+
+    def __init__(self, max_workers=None, per_host=None, retries=None):
+        self.max_workers = max_workers or self.max_workers
+        self.per_host = per_host or self.per_host
+        if retries is not None:
+            self.retries = retries
+        self.session = requests.Session()
+        retry = Retry(total=self.retries, backoff_factor=self.backoff_factor,
+                      status_forcelist=self.retry_statuses,
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_maxsize=self.max_workers,
+                              max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._hosts = dict()
+        self._lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        """GET url, waiting for a free slot of its host."""
+        kwargs.setdefault('timeout', self.timeout)
+        with self._host_slots(url):
+            return self.session.get(url, **kwargs)
+
+    def get_all(self, calls):
+        """GET every (url, kwargs) in calls concurrently and return the
+        responses in the same order."""
+        return self.map(lambda call: self.get(call[0], **call[1]), calls)
+
+    def map(self, fn, items):
+        """Return fn applied to every item, run in the thread pool."""
+        items = list(items)
+        if len(items) < 2:
+            return [fn(item) for item in items]
+        workers = min(self.max_workers, len(items))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(fn, items))
+
+    def close(self):
+        self.session.close()
+
+    def _host_slots(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = threading.BoundedSemaphore(self.per_host)
+            return self._hosts[host]
@@ -17,9 +17,9 @@
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 
 import json
-import requests
 
 from .base import BulkTaskImport, BulkImportException
+from .fetch import Fetcher
 
 
 class BulkTaskFlickrImport(BulkTaskImport):
@@ -52,13 +52,18 @@ class BulkTaskFlickrImport(BulkTaskImport):
                    'photoset_id': self.album_id,
                    'format': 'json',
                    'nojsoncallback': '1'}
-        res = requests.get(url, params=payload)
-        if self._is_valid_response(res):
-            content = json.loads(res.text)['photoset']
-            total_pages = content.get('pages')
-            rest_photos = self._remaining_photos(url, payload, total_pages)
-            content['photo'] += rest_photos
-            return content
+        fetcher = Fetcher()
+        try:
+            res = fetcher.get(url, params=payload)
+            if self._is_valid_response(res):
+                content = json.loads(res.text)['photoset']
+                total_pages = content.get('pages')
+                rest_photos = self._remaining_photos(fetcher, url, payload,
+                                                     total_pages)
+                content['photo'] += rest_photos
+                return content
+        finally:
+            fetcher.close()
 
     def _is_valid_response(self, response):
         """Check if it's a valid response."""
@@ -72,16 +77,16 @@ class BulkTaskFlickrImport(BulkTaskImport):
             raise BulkImportException(error_message)
         return valid
 
-    def _remaining_photos(self, url, payload, total_pages):
-        """Return the remainin photos."""
-        photo_lists = [self._photos_from_page(url, payload, page)
-                       for page in range(2, total_pages+1)]
+    def _remaining_photos(self, fetcher, url, payload, total_pages):
+        """Return the remaining photos, fetching their pages concurrently."""
+        calls = [(url, dict(params=dict(payload, page=page)))
+                 for page in range(2, total_pages+1)]
+        photo_lists = [self._photos_from_response(res)
+                       for res in fetcher.get_all(calls)]
         return [item for sublist in photo_lists for item in sublist]
 
-    def _photos_from_page(self, url, payload, page):
-        """Return photos from page."""
-        payload['page'] = page
-        res = requests.get(url, params=payload)
+    def _photos_from_response(self, res):
+        """Return photos from a page response."""
         if self._is_valid_response(res):
             return json.loads(res.text)['photoset']['photo']
         return []
@@ -58,22 +58,21 @@ class Importer(object):
         self._importers['youtube'] = BulkTaskYoutubeImport
         self._importer_constructor_params['youtube'] = youtube_params
 
-    def create_tasks(self, task_repo, project_id, **form_data):
-        """Create tasks."""
-        from pybossa.model.task import Task
+    def create_tasks(self, task_repo, project_id, progress=None, **form_data):
         """Create tasks from a remote source using an importer object and
-        avoiding the creation of repeated tasks"""
-        empty = True
-        n = 0
+        avoiding the creation of repeated tasks. progress is passed on to
+        task_repo.import_tasks."""
+        from pybossa.model.task import Task
         importer = self._create_importer_for(**form_data)
-        for task_data in importer.tasks():
-            task = Task(project_id=project_id)
-            [setattr(task, k, v) for k, v in six.iteritems(task_data)]
-            found = task_repo.get_task_by(project_id=project_id, info=task.info)
-            if found is None:
-                task_repo.save(task)
-                n += 1
-                empty = False
+
+        def tasks():
+            for task_data in importer.tasks():
+                task = Task(project_id=project_id)
+                [setattr(task, k, v) for k, v in six.iteritems(task_data)]
+                yield task
+
+        n = task_repo.import_tasks(tasks(), progress=progress)
+        empty = n == 0
         if empty:
             msg = gettext('It looks like there were no new records to import')
             return ImportReport(message=msg, metadata=None, total=n)
@@ -21,6 +21,7 @@ import math
 import requests
 from flask import current_app, render_template
 from flask_mail import Message
+from rq import get_current_job
 from pybossa.core import mail, task_repo, importer, create_app
 from pybossa.model.webhook import Webhook
 from pybossa.util import with_cache_disabled, publish_channel
@@ -225,10 +226,10 @@ def get_inactive_users_jobs(queue='quaterly'):
     # First users that have participated once but more than 3 months ago
     sql = text('''SELECT user_id FROM task_run
                WHERE user_id IS NOT NULL
-               AND to_date(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-               >= NOW() - '12 month'::INTERVAL
-               AND to_date(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-               < NOW() - '3 month'::INTERVAL
+               AND pybossa_timestamp(task_run.finish_time)
+               >= NOW() AT TIME ZONE 'utc' - '12 month'::INTERVAL
+               AND pybossa_timestamp(task_run.finish_time)
+               < NOW() AT TIME ZONE 'utc' - '3 month'::INTERVAL
                GROUP BY user_id ORDER BY user_id;''')
     results = db.slave_session.execute(sql)
 
@@ -451,8 +452,8 @@ def get_non_updated_projects():
     from sqlalchemy.sql import text
     from pybossa.model.project import Project
     from pybossa.core import db
-    sql = text('''SELECT id FROM project WHERE TO_DATE(updated,
-                'YYYY-MM-DD\THH24:MI:SS.US') <= NOW() - '3 month':: INTERVAL
+    sql = text('''SELECT id FROM project WHERE pybossa_timestamp(updated)
+               <= NOW() AT TIME ZONE 'utc' - '3 month'::INTERVAL
                AND contacted != True AND published = True
                AND project.id NOT IN
                (SELECT task.project_id FROM task
@@ -521,11 +522,20 @@ def send_mail(message_dict, user_id=None):
             db.session.commit()
 
 
+def import_progress(read, imported):
+    """Report the progress of the running import job in its meta."""
+    job = get_current_job()
+    if job is not None:
+        job.meta['progress'] = dict(read=read, imported=imported)
+        job.save_meta()
+
+
 def import_tasks(project_id, from_auto=False, **form_data):
     """Import tasks for a project."""
     from pybossa.core import project_repo
     project = project_repo.get(project_id)
-    report = importer.create_tasks(task_repo, project_id, **form_data)
+    report = importer.create_tasks(task_repo, project_id,
+                                   progress=import_progress, **form_data)
     if from_auto:
         form_data['last_import_meta'] = report.metadata
         project.set_autoimporter(form_data)
@@ -914,8 +924,8 @@ def get_notify_inactive_accounts(queue='monthly'):
                WHERE "user".id = task_run.user_id AND "user".id NOT IN
                (SELECT user_id FROM task_run
                WHERE user_id IS NOT NULL
-               AND to_date(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-               >= NOW() - '{} month'::INTERVAL
+               AND pybossa_timestamp(task_run.finish_time)
+               >= NOW() AT TIME ZONE 'utc' - '{} month'::INTERVAL
                GROUP BY user_id
                ORDER BY user_id) AND
                "user".admin=false
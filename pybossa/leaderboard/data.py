@@ -17,59 +17,43 @@
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 """Leaderboard queries in leaderboard view."""
 from sqlalchemy import text
-from pybossa.core import db
+from pybossa.core import db, sentinel
 from pybossa.model.user import User
+from pybossa.leaderboard.ranking import Leaderboard
 
 u = User()
 
 
 def get_leaderboard(top_users=20, user_id=None, window=0, info=None):
     """Return a list of top_users and if user_id return its position."""
-    materialized_view = "users_rank_%s" % info
-    sql = text('''SELECT * from users_rank WHERE rank <= :top_users 
-               ORDER BY rank;''')
-    if info:
-        sql = text('''SELECT * from "{}" WHERE rank <= :top_users 
-                    ORDER BY rank;'''.format(materialized_view))
+    board = Leaderboard(sentinel.master, info)
+    ranked = board.top(top_users)
+    if user_id:
+        rank, score = board.rank(user_id)
+        if rank is not None and window != 0:
+            ranked += board.around(rank, window)
+        elif rank is not None:
+            ranked.append((rank, user_id, score))
+    return format_users(ranked)
 
-    results = db.session.execute(sql, dict(top_users=top_users))
-    top_users = [format_user(user) for user in results]
 
-    if user_id:
-        sql = text('''SELECT * from users_rank where id=:user_id;''')
-        if info:
-            sql = text('''SELECT * from "{}" where
-                       id=:user_id;'''.format(materialized_view))
-        results = db.session.execute(sql, dict(user_id=user_id))
-        user = None
-        for row in results:
-            user = format_user(row)
-        if user and window != 0:
-            sql = text('''SELECT * from users_rank
-                       WHERE rank >= :low AND rank <= :top order by rank;
-                       ''')
-            if info:
-                sql = text('''SELECT * from "{}" 
-                           WHERE rank >= :low AND rank <= :top order by rank;
-                           '''.format(materialized_view))
-            low = user['rank'] - window
-            top = user['rank'] + window
-            results = db.session.execute(sql, dict(user_id=user_id,
-                                         top=top,
-                                         low=low))
-            for row in results:
-                top_users.append(format_user(row))
-        else:
-            if user:
-                top_users.append(user)
-        return top_users
-    return top_users
+def format_users(ranked):
+    """Return the users of a list of (rank, user_id, score)."""
+    if not ranked:
+        return []
+    sql = text('''SELECT * FROM "user" WHERE id = ANY(:user_ids)
+               AND restrict=false;''')
+    user_ids = list(set(user_id for _, user_id, _ in ranked))
+    results = db.session.execute(sql, dict(user_ids=user_ids))
+    users = dict((row.id, row) for row in results)
+    return [format_user(users[user_id], rank, score)
+            for rank, user_id, score in ranked if user_id in users]
 
 
-def format_user(user):
+def format_user(user, rank, score):
     """Return an User object."""
     user = dict(
-        rank=user.rank,
+        rank=rank,
         id=user.id,
         name=user.name,
         fullname=user.fullname,
@@ -77,6 +61,6 @@ def format_user(user):
         info=user.info,
         created=user.created,
         restrict=user.restrict,
-        score=user.score)
+        score=score)
     tmp = u.to_public_json(data=user)
     return tmp
@@ -17,41 +17,27 @@
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 """Leaderboard Jobs module for running background tasks in PYBOSSA server."""
 from sqlalchemy import text
-from pybossa.core import db
-from pybossa.util import exists_materialized_view, refresh_materialized_view
+from pybossa.core import db, sentinel
+from pybossa.leaderboard.ranking import Leaderboard
 
 
 def leaderboard(info=None):
-    """Create or update leaderboard materialized view."""
-    materialized_view = 'users_rank'
-    materialized_view_idx = 'users_rank_idx'
+    """Load the leaderboard in Redis or reconcile it with the DB."""
     if info:
-        materialized_view = 'users_rank_%s' % info
-        materialized_view_idx = 'users_rank_%s_idx' % info
-
-    if exists_materialized_view(db, materialized_view):
-        return refresh_materialized_view(db, materialized_view)
+        sql = text('''SELECT id, COALESCE(CAST(info->>:info AS INTEGER), 0)
+                   AS score FROM "user" WHERE restrict=false''')
     else:
-        sql = '''
-                   CREATE MATERIALIZED VIEW "{}" AS WITH scores AS (
-                        SELECT "user".*, COUNT(task_run.user_id) AS score
-                        FROM "user" LEFT JOIN task_run
-                        ON task_run.user_id="user".id where
-                        "user".restrict=false GROUP BY "user".id
-                    ) SELECT *, row_number() OVER (ORDER BY score DESC) as rank FROM scores;
-              '''.format(materialized_view)
-        if info:
-            sql = '''
-                       CREATE MATERIALIZED VIEW "{}" AS WITH scores AS (
-                            SELECT "user".*, COALESCE(CAST("user".info->>'{}' AS INTEGER), 0) AS score
-                            FROM "user" where "user".restrict=false ORDER BY score DESC) SELECT *, row_number() OVER (ORDER BY score DESC) as rank FROM scores;
-                  '''.format(materialized_view, info)
-        db.session.execute(sql)
-        db.session.commit()
-        sql = '''
-              CREATE UNIQUE INDEX "{}"
-               on "{}"(id, rank);
-              '''.format(materialized_view_idx, materialized_view)
-        db.session.execute(sql)
-        db.session.commit()
-        return "Materialized view created"
+        sql = text('''SELECT "user".id, COUNT(task_run.id) AS score
+                   FROM "user" LEFT JOIN task_run
+                   ON task_run.user_id="user".id
+                   WHERE "user".restrict=false GROUP BY "user".id''')
+    sql = sql.execution_options(stream=True)
+
+    def read_scores():
+        results = db.session.execute(sql, dict(info=info))
+        return ((row.id, row.score) for row in results)
+
+    board = Leaderboard(sentinel.master, info)
+    board.load(read_scores)
+    db.session.commit()
+    return "Leaderboard loaded"
@@ -0,0 +1,180 @@
+# -*- coding: utf8 -*-
+# This file is part of PYBOSSA.
+#
+# Copyright (C) 2018 Scifabric LTD.
+#
+# PYBOSSA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PYBOSSA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Redis backed leaderboards.
+
+Every leaderboard is a sorted set with the ids of the non restricted users,
+scored by their number of task runs or, for the custom leaderboards, by an
+integer stored in their info. The sets are loaded from the DB by the
+leaderboard job, which reconciles them periodically, and are maintained in
+between from the model event listeners.
+"""
+
+
+ADD_IF_LOADED = """
+if redis.call('sismember', KEYS[1], ARGV[1]) == 1 then
+    return redis.call('zadd', KEYS[2], ARGV[2], ARGV[3])
+end
+return 0
+"""
+
+# Only users already in the set are scored, so restricted users and
+# leaderboards not loaded yet are left untouched. While the leaderboard is
+# loaded again the increment is also recorded in the pending hash.
+INCR_IF_MEMBER = """
+if redis.call('zscore', KEYS[1], ARGV[1]) then
+    if redis.call('exists', KEYS[2]) == 1 then
+        redis.call('hincrby', KEYS[2], ARGV[1], ARGV[2])
+    end
+    return redis.call('zincrby', KEYS[1], ARGV[2], ARGV[1])
+end
+return false
+"""
+
+# Apply the increments recorded while loading to the new set, and replace
+# the leaderboard with it.
+SWAP = """
+local pending = redis.call('hgetall', KEYS[3])
+for i = 1, #pending, 2 do
+    if pending[i] ~= ARGV[2] then
+        redis.call('zincrby', KEYS[1], pending[i + 1], pending[i])
+    end
+end
+if redis.call('exists', KEYS[1]) == 1 then
+    redis.call('rename', KEYS[1], KEYS[2])
+else
+    redis.call('del', KEYS[2])
+end
+redis.call('del', KEYS[3])
+redis.call('sadd', KEYS[4], ARGV[1])
+"""
+
+
+class Leaderboard(object):
+
+    BOARDS_KEY = 'pybossa:leaderboard:boards'
+    BOARD_KEY = 'pybossa:leaderboard:%s'
+    LOADING_KEY = 'pybossa:leaderboard:%s:loading'
+    PENDING_KEY = 'pybossa:leaderboard:%s:pending'
+    CHUNK_SIZE = 1000
+    # Pending hashes always hold this field, so they exist while loading.
+    PLACEHOLDER = '0'
+    # Seconds a load can take before increments stop being recorded
+    PENDING_TTL = 60 * 60
+
+    def __init__(self, redis_conn, info=None):
+        self.conn = redis_conn
+        self.info = info
+        self.name = 'info:%s' % info if info else 'task_runs'
+        self.key = self.BOARD_KEY % self.name
+        self.pending_key = self.PENDING_KEY % self.name
+        self._add_if_loaded = redis_conn.register_script(ADD_IF_LOADED)
+        self._incr_if_member = redis_conn.register_script(INCR_IF_MEMBER)
+        self._swap = redis_conn.register_script(SWAP)
+
+    @classmethod
+    def loaded(cls, redis_conn):
+        """Return every leaderboard loaded in Redis."""
+        boards = []
+        for name in sorted(redis_conn.smembers(cls.BOARDS_KEY)):
+            name = name.decode()
+            info = name[len('info:'):] if name.startswith('info:') else None
+            boards.append(cls(redis_conn, info))
+        return boards
+
+    def is_loaded(self):
+        return bool(self.conn.sismember(self.BOARDS_KEY, self.name))
+
+    def load(self, read_scores):
+        """Replace the leaderboard with the (user_id, score) pairs returned
+        by read_scores.
+
+        Increments made while the scores are read and loaded are recorded
+        and added to the new scores before the swap, as they may be missing
+        from them."""
+        loading_key = self.LOADING_KEY % self.name
+        pipeline = self.conn.pipeline(transaction=True)
+        pipeline.delete(loading_key, self.pending_key)
+        pipeline.hset(self.pending_key, self.PLACEHOLDER, 0)
+        pipeline.expire(self.pending_key, self.PENDING_TTL)
+        pipeline.execute()
+        chunk = dict()
+        for user_id, score in read_scores():
+            chunk[user_id] = score
+            if len(chunk) == self.CHUNK_SIZE:
+                self.conn.zadd(loading_key, chunk)
+                chunk = dict()
+        if chunk:
+            self.conn.zadd(loading_key, chunk)
+        self._swap(keys=[loading_key, self.key, self.pending_key,
+                         self.BOARDS_KEY],
+                   args=[self.name, self.PLACEHOLDER])
+
+    def drop(self):
+        pipeline = self.conn.pipeline(transaction=True)
+        pipeline.srem(self.BOARDS_KEY, self.name)
+        pipeline.delete(self.key)
+        pipeline.execute()
+
+    def add(self, user_id, score):
+        """Set the score of user_id if the leaderboard is loaded."""
+        return bool(self._add_if_loaded(keys=[self.BOARDS_KEY, self.key],
+                                        args=[self.name, score, user_id]))
+
+    def remove(self, user_id):
+        self.conn.zrem(self.key, user_id)
+
+    def incr(self, user_id, amount=1):
+        score = self._incr_if_member(keys=[self.key, self.pending_key],
+                                     args=[user_id, amount])
+        return score is not None
+
+    def rank(self, user_id):
+        """Return the (rank, score) of user_id, or (None, None)."""
+        pipeline = self.conn.pipeline(transaction=False)
+        pipeline.zrevrank(self.key, user_id)
+        pipeline.zscore(self.key, user_id)
+        rank, score = pipeline.execute()
+        if rank is None:
+            return None, None
+        return rank + 1, int(score)
+
+    def top(self, n):
+        """Return the (rank, user_id, score) of the n first users."""
+        return self._range(1, n)
+
+    def around(self, rank, window):
+        """Return the (rank, user_id, score) of the users within window
+        positions of rank."""
+        return self._range(max(rank - window, 1), rank + window)
+
+    def _range(self, first, last):
+        if last < first:
+            return []
+        members = self.conn.zrevrange(self.key, first - 1, last - 1,
+                                      withscores=True)
+        return [(first + i, int(user_id), int(score))
+                for i, (user_id, score) in enumerate(members)]
+
+
+def get_info_score(info, key):
+    """Return the custom leaderboard score stored under key in info."""
+    try:
+        return int((info or dict()).get(key) or 0)
+    except (TypeError, ValueError):
+        return 0
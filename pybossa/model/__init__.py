@@ -19,6 +19,7 @@
 import datetime
 import uuid
 
+from sqlalchemy import DDL, func
 from sqlalchemy.orm import class_mapper
 
 import logging
@@ -94,6 +95,31 @@ def make_timestamp():
     return now.isoformat()
 
 
+# Timestamps are stored as ISO 8601 text. Time range queries compare them
+# through this function, on which the timestamp indexes are built, so that
+# they can use the indexes instead of parsing every row. Values with a UTC
+# offset are converted to UTC, like the ones stored by make_timestamp.
+timestamp_function = DDL(r'''
+CREATE OR REPLACE FUNCTION pybossa_timestamp(value text)
+RETURNS timestamp AS $$
+    SELECT CASE
+        WHEN value ~ '^\d{4}-\d{2}-\d{2}([T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?$'
+        THEN value::timestamp
+        -- The offset is explicit, so the result does not depend on the
+        -- TimeZone setting and the function stays immutable.
+        WHEN value ~ ('^\d{4}-\d{2}-\d{2}([T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?'
+                      '([+-]\d{2}(:?\d{2})?|Z)$')
+        THEN value::timestamptz AT TIME ZONE 'UTC'
+    END
+$$ LANGUAGE sql IMMUTABLE;
+''')
+
+
+def timestamp(column):
+    """Return the SQL expression of a text timestamp column as timestamp."""
+    return func.pybossa_timestamp(column)
+
+
 def make_uuid():
     return str(uuid.uuid4())
 
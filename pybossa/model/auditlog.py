@@ -17,10 +17,10 @@
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 
 from sqlalchemy import Integer, Text
-from sqlalchemy.schema import Column, ForeignKey
+from sqlalchemy.schema import Column, ForeignKey, Index
 
 from pybossa.core import db
-from pybossa.model import DomainObject, make_timestamp
+from pybossa.model import DomainObject, make_timestamp, timestamp
 
 
 class Auditlog(db.Model, DomainObject):
@@ -50,3 +50,6 @@ class Auditlog(db.Model, DomainObject):
     old_value = Column(Text)
     #: New_value
     new_value = Column(Text)
+
+
+Index('auditlog_created_idx', timestamp(Auditlog.created))
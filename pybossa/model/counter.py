@@ -17,16 +17,18 @@
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 
 from sqlalchemy import Integer
-from sqlalchemy.schema import Column, ForeignKey
+from sqlalchemy.schema import Column, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import TIMESTAMP
 from pybossa.core import db
 from pybossa.model import DomainObject, make_timestamp
 
 
 class Counter(db.Model, DomainObject):
-    '''A Counter lists the number of task runs for a given Task.'''
+    '''A Counter keeps the number of task runs for a given Task.'''
 
     __tablename__ = 'counter'
+    __table_args__ = (Index('counter_project_id_n_task_runs_idx',
+                            'project_id', 'n_task_runs', 'task_id'),)
 
     #: Counter.ID
     id = Column(Integer, primary_key=True)
@@ -39,6 +41,6 @@ class Counter(db.Model, DomainObject):
     #: Task.ID that this counter is associated with.
     task_id = Column(Integer, ForeignKey('task.id',
                                          ondelete='CASCADE'),
-                     nullable=False)
+                     nullable=False, unique=True)
     #: Number of task_runs for this task.
     n_task_runs = Column(Integer, default=0, nullable=False)
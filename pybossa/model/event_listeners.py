@@ -15,11 +15,13 @@
 #
 # You should have received a copy of the GNU Affero General Public License
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+import collections
 from datetime import datetime
 from flask import current_app
 
 from rq import Queue
-from sqlalchemy import event
+from sqlalchemy import event, inspect, text
+from sqlalchemy.exc import IntegrityError
 
 from flask import url_for
 
@@ -38,6 +40,8 @@ from pybossa.core import result_repo, db
 from pybossa.jobs import webhook, notify_blog_users
 from pybossa.jobs import push_notification
 from pybossa import sched
+from pybossa.task_queue import TaskQueue, get_user_param
+from pybossa.leaderboard.ranking import Leaderboard, get_info_score
 
 from pybossa.core import sentinel
 
@@ -242,9 +246,15 @@ def on_taskrun_submit(mapper, conn, target):
     project_public['action_updated'] = 'TaskCompleted'
 
     sched.after_save(target, conn)
+    task_queue = TaskQueue(sentinel.master)
+    task_queue.mark_seen(target.project_id,
+                         get_user_param(target.user_id, target.user_ip,
+                                        target.external_uid),
+                         target.task_id)
     add_user_contributed_to_feed(conn, target.user_id, project_public)
     if is_task_completed(conn, target.task_id, target.project_id):
         update_task_state(conn, target.task_id)
+        task_queue.remove_task(target.project_id, target.task_id)
         update_feed(project_public)
         result_id = create_result(conn, target.project_id, target.task_id)
         project_private = dict()
@@ -259,6 +269,105 @@ def on_taskrun_submit(mapper, conn, target):
         conn.execute(sql)
 
 
+def on_taskruns_bulk_submit(conn, task_runs):
+    """Run the on_taskrun_submit bookkeeping for task runs inserted in bulk.
+
+    Multi-row inserts do not trigger mapper events, so counters, task states,
+    results, feeds and timestamps are updated here with set based queries
+    over all the affected tasks at once.
+    """
+    now = make_timestamp()
+    task_run_ids = [tr.id for tr in task_runs]
+    task_ids = list(set(tr.task_id for tr in task_runs))
+    project_ids = list(set(tr.project_id for tr in task_runs))
+
+    sql = text('''SELECT id, name, short_name, published, webhook, info,
+                    category_id FROM project WHERE id = ANY(:project_ids)''')
+    projects = dict()
+    for r in conn.execute(sql, dict(project_ids=project_ids)):
+        tmp = dict(id=r.id, name=r.name, short_name=r.short_name,
+                   info=r.info, category_id=r.category_id)
+        project_public = Project().to_public_json(tmp)
+        project_public['action_updated'] = 'TaskCompleted'
+        projects[r.id] = (project_public, r.webhook, r.info or dict())
+
+    sql = text('''INSERT INTO counter(created, project_id, task_id, n_task_runs)
+                 SELECT :created, project_id, task_id, COUNT(id) FROM task_run
+                 WHERE id = ANY(:task_run_ids) GROUP BY project_id, task_id
+                 ON CONFLICT (task_id) DO UPDATE
+                 SET n_task_runs=counter.n_task_runs + EXCLUDED.n_task_runs''')
+    conn.execute(sql, dict(created=now, task_run_ids=task_run_ids))
+    add_task_runs_to_contribution_stats(conn, 'id = ANY(:task_run_ids)',
+                                        dict(task_run_ids=task_run_ids))
+
+    locked = [tr for tr in task_runs
+              if projects[tr.project_id][2].get('sched') == 'locked']
+    if locked:
+        pipeline = sentinel.master.pipeline(transaction=True)
+        for tr in locked:
+            uid = tr.user_id or tr.external_uid or tr.user_ip or '127.0.0.1'
+            sched.release_lock(tr.task_id, uid, sched.TIMEOUT,
+                               pipeline=pipeline, execute=False)
+        pipeline.execute()
+
+    board = Leaderboard(sentinel.master)
+    for user_id, amount in collections.Counter(tr.user_id for tr in task_runs
+                                               if tr.user_id).items():
+        board.incr(user_id, amount)
+
+    task_queue = TaskQueue(sentinel.master)
+    task_queue.mark_seen_many(
+        (tr.project_id,
+         get_user_param(tr.user_id, tr.user_ip, tr.external_uid),
+         tr.task_id) for tr in task_runs)
+
+    contributed = set((tr.project_id, tr.user_id) for tr in task_runs)
+    for project_id, user_id in contributed:
+        add_user_contributed_to_feed(conn, user_id, projects[project_id][0])
+
+    sql = text('''WITH answers AS (
+                 SELECT task_id, COUNT(id) AS n_task_runs FROM task_run
+                 WHERE task_id = ANY(:task_ids) GROUP BY task_id)
+                 UPDATE task SET state='completed' FROM answers
+                 WHERE task.id = answers.task_id
+                 AND answers.n_task_runs >= task.n_answers
+                 RETURNING task.id''')
+    completed = [r.id for r in conn.execute(sql, dict(task_ids=task_ids))]
+    if completed:
+        sql = text('''UPDATE result SET last_version=false
+                     WHERE task_id = ANY(:completed)''')
+        conn.execute(sql, dict(completed=completed))
+        sql = text('''INSERT INTO result
+                     (created, project_id, task_id, task_run_ids, last_version)
+                     SELECT :created, project_id, task_id,
+                     ARRAY_AGG(id ORDER BY id), true FROM task_run
+                     WHERE task_id = ANY(:completed)
+                     GROUP BY project_id, task_id
+                     RETURNING id, project_id, task_id''')
+        results = conn.execute(sql, dict(created=now, completed=completed))
+        feeds = set()
+        for r in results:
+            task_queue.remove_task(r.project_id, r.task_id)
+            project_public, _webhook, _ = projects[r.project_id]
+            if r.project_id not in feeds:
+                update_feed(project_public)
+                feeds.add(r.project_id)
+            project_private = dict()
+            project_private.update(project_public)
+            project_private['webhook'] = _webhook
+            push_webhook(project_private, r.task_id, r.id)
+
+    sql = text('''UPDATE project SET updated=:updated
+                 WHERE id = ANY(:project_ids)''')
+    conn.execute(sql, dict(updated=now, project_ids=project_ids))
+
+    user_ids = list(set(tr.user_id for tr in task_runs if tr.user_id))
+    if user_ids:
+        sql = text('''UPDATE "user" SET notified_at=null
+                     WHERE id = ANY(:user_ids)''')
+        conn.execute(sql, dict(user_ids=user_ids))
+
+
 @event.listens_for(Blogpost, 'after_insert')
 @event.listens_for(Blogpost, 'after_update')
 @event.listens_for(Task, 'after_insert')
@@ -280,6 +389,27 @@ def update_timestamp(mapper, conn, target):
     update_target_timestamp(mapper, conn, target)
 
 
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def delete_cached_api_key_user(mapper, conn, target):
+    """Forget the cached user of the current and the previous API key once
+    the transaction is committed.
+
+    Deleting them now would let a concurrent request cache the row again
+    before the change is visible to it."""
+    state = inspect(target)
+    api_keys = set(state.attrs.api_key.history.deleted or ())
+    api_keys.add(target.api_key)
+    state.session.info.setdefault('api_keys', set()).update(
+        api_key for api_key in api_keys if api_key)
+
+
+@event.listens_for(db.session, 'after_commit')
+def delete_committed_api_key_users(session):
+    from pybossa.cache.users import delete_api_key_user
+    for api_key in session.info.pop('api_keys', ()):
+        delete_api_key_user(api_key)
+
 @event.listens_for(User, 'before_insert')
 def make_admin(mapper, conn, target):
     users = conn.scalar('select count(*) from "user" where restrict=false')
@@ -295,6 +425,63 @@ def create_zero_counter(mapper, conn, target):
     conn.execute(sql_query)
 
 
+@event.listens_for(Task, 'after_insert')
+@event.listens_for(Task, 'after_update')
+def update_task_info_hash(mapper, conn, target):
+    """Hash the info of the task unless another task of the project has the
+    same one, so the bulk importer skips it."""
+    if not inspect(target).attrs.info.history.has_changes():
+        return
+    sql = text('''UPDATE task SET info_hash=(
+                 SELECT task_info_hash(task.info) WHERE NOT EXISTS (
+                 SELECT 1 FROM task AS other
+                 WHERE other.project_id=task.project_id AND other.id<>task.id
+                 AND other.info_hash=task_info_hash(task.info)))
+                 WHERE id=:id''')
+    savepoint = conn.begin_nested()
+    try:
+        conn.execute(sql, dict(id=target.id))
+        savepoint.commit()
+    except IntegrityError:
+        # A concurrent transaction hashed the same info first, so this task
+        # is a repeated one and keeps NULL.
+        savepoint.rollback()
+
+
+def on_tasks_bulk_import(conn, task_ids):
+    """Run the Task after_insert bookkeeping for tasks inserted in bulk.
+
+    Counters, candidate queues, project timestamps and feeds are updated
+    with set based queries over all the tasks at once.
+    """
+    now = make_timestamp()
+    sql = text('''INSERT INTO counter(created, project_id, task_id, n_task_runs)
+                 SELECT :created, project_id, id, 0 FROM task
+                 WHERE id = ANY(:task_ids)''')
+    conn.execute(sql, dict(created=now, task_ids=task_ids))
+
+    sql = text('''SELECT id, project_id, priority_0 FROM task
+                 WHERE id = ANY(:task_ids) AND state<>'completed'
+                 ORDER BY project_id, id''')
+    candidates = dict()
+    for r in conn.execute(sql, dict(task_ids=task_ids)):
+        candidates.setdefault(r.project_id, []).append((r.id, r.priority_0))
+    task_queue = TaskQueue(sentinel.master)
+    for project_id, tasks in candidates.items():
+        task_queue.add_tasks(project_id, tasks)
+
+    sql = text('''UPDATE project SET updated=:updated
+                 WHERE id IN (SELECT project_id FROM task
+                              WHERE id = ANY(:task_ids))
+                 RETURNING id, name, short_name, info''')
+    for r in conn.execute(sql, dict(updated=now, task_ids=task_ids)):
+        tmp = dict(id=r.id, name=r.name, short_name=r.short_name,
+                   info=r.info)
+        obj = dict(action_updated='Task')
+        obj.update(Project().to_public_json(tmp))
+        update_feed(obj)
+
+
 @event.listens_for(Task, 'after_delete')
 def delete_task_counter(mapper, conn, target):
     sql_query = ("delete from counter where project_id=%s and task_id=%s"
@@ -302,17 +489,216 @@ def delete_task_counter(mapper, conn, target):
     conn.execute(sql_query)
 
 
-@event.listens_for(TaskRun, 'after_insert')
-def increase_task_counter(mapper, conn, target):
+def update_task_counter(conn, target, delta):
+    """Add delta to the single counter row of the task run's task."""
     sql_query = ("insert into counter(created, project_id, task_id, n_task_runs) \
-                 VALUES (TIMESTAMP '%s', %s, %s, 1)"
-                 % (make_timestamp(), target.project_id, target.task_id))
+                 VALUES (TIMESTAMP '%s', %s, %s, %s) \
+                 ON CONFLICT (task_id) DO UPDATE \
+                 SET n_task_runs=counter.n_task_runs + EXCLUDED.n_task_runs"
+                 % (make_timestamp(), target.project_id, target.task_id, delta))
     conn.execute(sql_query)
 
 
+@event.listens_for(TaskRun, 'after_insert')
+def increase_task_counter(mapper, conn, target):
+    update_task_counter(conn, target, 1)
+
+
 @event.listens_for(TaskRun, 'after_delete')
 def decrease_task_counter(mapper, conn, target):
-    sql_query = ("insert into counter(created, project_id, task_id, n_task_runs) \
-                 VALUES (TIMESTAMP '%s', %s, %s, -1)"
-                 % (make_timestamp(), target.project_id, target.task_id))
-    conn.execute(sql_query)
+    update_task_counter(conn, target, -1)
+
+
+def update_contribution_stats(conn, target, delta, completion=False):
+    """Add delta to the hourly and daily contributor stats of the task run's
+    project. If completion is True, the task is counted as completed in
+    that hour when an added task run reaches its n_answers, and the
+    completion is taken back when a deleted one brings it below."""
+    params = dict(project_id=target.project_id, task_id=target.task_id,
+                  task_run_id=target.id,
+                  finish_time=target.finish_time, user_id=target.user_id,
+                  user_ip=target.user_ip, delta=delta,
+                  n_auth=delta if target.user_ip is None else 0,
+                  n_anon=delta if target.user_id is None else 0,
+                  completion=completion and delta > 0)
+    sql = text('''WITH run AS (SELECT
+                 pybossa_timestamp(CAST(:finish_time AS TEXT)) AS finish_time)
+                 INSERT INTO project_hourly_stats
+                 (project_id, hour, n_task_runs, n_auth, n_anon, n_completed)
+                 SELECT :project_id, DATE_TRUNC('hour', run.finish_time),
+                 :delta, :n_auth, :n_anon,
+                 CASE WHEN :completion AND
+                 (SELECT COUNT(id) FROM task_run WHERE task_id=:task_id
+                  AND project_id=:project_id) =
+                 (SELECT n_answers FROM task WHERE id=:task_id)
+                 THEN 1 ELSE 0 END
+                 FROM run WHERE run.finish_time IS NOT NULL
+                 ON CONFLICT (project_id, hour) DO UPDATE
+                 SET n_task_runs=project_hourly_stats.n_task_runs
+                     + EXCLUDED.n_task_runs,
+                 n_auth=project_hourly_stats.n_auth + EXCLUDED.n_auth,
+                 n_anon=project_hourly_stats.n_anon + EXCLUDED.n_anon,
+                 n_completed=project_hourly_stats.n_completed
+                     + EXCLUDED.n_completed''')
+    conn.execute(sql, params)
+    sql = text('''WITH run AS (SELECT
+                 pybossa_timestamp(CAST(:finish_time AS TEXT)) AS finish_time)
+                 INSERT INTO project_daily_contributor
+                 (project_id, day, user_id, user_ip, n_task_runs)
+                 SELECT :project_id, run.finish_time::date,
+                 CAST(:user_id AS INTEGER), CAST(:user_ip AS TEXT), :delta
+                 FROM run WHERE run.finish_time IS NOT NULL
+                 ON CONFLICT (project_id, day, COALESCE(user_id, 0),
+                              COALESCE(user_ip, ''))
+                 DO UPDATE SET n_task_runs=project_daily_contributor.n_task_runs
+                     + EXCLUDED.n_task_runs''')
+    conn.execute(sql, params)
+    if completion and delta < 0:
+        remove_completion_stats(conn, params)
+
+
+def remove_completion_stats(conn, params):
+    """Take back the completion of the task of a deleted task run, if the
+    task had exactly n_answers task runs before. It was counted in the hour
+    of the last of them, which may be the deleted one."""
+    sql = text('''WITH runs AS (
+                 SELECT id, finish_time FROM task_run
+                 WHERE task_id=:task_id AND project_id=:project_id
+                 UNION ALL
+                 SELECT CAST(:task_run_id AS INTEGER),
+                 CAST(:finish_time AS TEXT)),
+                 completer AS (
+                 SELECT pybossa_timestamp(finish_time) AS finish_time
+                 FROM runs ORDER BY id DESC LIMIT 1)
+                 UPDATE project_hourly_stats
+                 SET n_completed=project_hourly_stats.n_completed - 1
+                 FROM completer
+                 WHERE project_hourly_stats.project_id=:project_id
+                 AND project_hourly_stats.hour=
+                     DATE_TRUNC('hour', completer.finish_time)
+                 AND project_hourly_stats.n_completed > 0
+                 AND (SELECT COUNT(id) FROM runs) =
+                     (SELECT n_answers FROM task WHERE id=:task_id)''')
+    conn.execute(sql, params)
+
+
+def add_task_runs_to_contribution_stats(conn, task_runs_filter, params):
+    """Add the task runs matching the SQL filter to the hourly and daily
+    contributor stats of their projects."""
+    sql = text('''WITH selected AS (
+                 SELECT id, task_id FROM task_run WHERE {}),
+                 runs AS (
+                 SELECT task_run.id, task_run.project_id, task_run.user_id,
+                 task_run.user_ip,
+                 pybossa_timestamp(task_run.finish_time) AS finish_time,
+                 ROW_NUMBER() OVER (
+                     PARTITION BY task_run.task_id, task_run.project_id
+                     ORDER BY task_run.id) = task.n_answers AS completes
+                 FROM task_run JOIN task ON task.id=task_run.task_id
+                 WHERE task_run.task_id IN (SELECT task_id FROM selected))
+                 INSERT INTO project_hourly_stats
+                 (project_id, hour, n_task_runs, n_auth, n_anon, n_completed)
+                 SELECT project_id, DATE_TRUNC('hour', finish_time), COUNT(id),
+                 COUNT(id) FILTER (WHERE user_ip IS NULL),
+                 COUNT(id) FILTER (WHERE user_id IS NULL),
+                 COUNT(id) FILTER (WHERE completes)
+                 FROM runs WHERE id IN (SELECT id FROM selected)
+                 AND finish_time IS NOT NULL
+                 GROUP BY 1, 2
+                 ON CONFLICT (project_id, hour) DO UPDATE
+                 SET n_task_runs=project_hourly_stats.n_task_runs
+                     + EXCLUDED.n_task_runs,
+                 n_auth=project_hourly_stats.n_auth + EXCLUDED.n_auth,
+                 n_anon=project_hourly_stats.n_anon + EXCLUDED.n_anon,
+                 n_completed=project_hourly_stats.n_completed
+                     + EXCLUDED.n_completed'''.format(task_runs_filter))
+    conn.execute(sql, params)
+    sql = text('''INSERT INTO project_daily_contributor
+                 (project_id, day, user_id, user_ip, n_task_runs)
+                 SELECT project_id, pybossa_timestamp(finish_time)::date,
+                 user_id, user_ip, COUNT(id) FROM task_run
+                 WHERE {} AND pybossa_timestamp(finish_time) IS NOT NULL
+                 GROUP BY 1, 2, 3, 4
+                 ON CONFLICT (project_id, day, COALESCE(user_id, 0),
+                              COALESCE(user_ip, ''))
+                 DO UPDATE SET n_task_runs=project_daily_contributor.n_task_runs
+                     + EXCLUDED.n_task_runs'''.format(task_runs_filter))
+    conn.execute(sql, params)
+
+
+def rebuild_contribution_stats(conn, project_id):
+    """Compute again the contribution stats of a project from its task runs,
+    after they were changed in bulk."""
+    params = dict(project_id=project_id)
+    for table in ('project_hourly_stats', 'project_daily_contributor'):
+        sql = text('DELETE FROM {} WHERE project_id=:project_id'.format(table))
+        conn.execute(sql, params)
+    add_task_runs_to_contribution_stats(conn, 'project_id=:project_id', params)
+
+
+@event.listens_for(TaskRun, 'after_insert')
+def add_contribution_stats(mapper, conn, target):
+    update_contribution_stats(conn, target, 1, completion=True)
+
+
+@event.listens_for(TaskRun, 'after_delete')
+def remove_contribution_stats(mapper, conn, target):
+    update_contribution_stats(conn, target, -1, completion=True)
+
+
+@event.listens_for(Task, 'after_insert')
+@event.listens_for(Task, 'after_update')
+def update_task_queue(mapper, conn, target):
+    """Keep the Redis candidate queue of the project up to date."""
+    task_queue = TaskQueue(sentinel.master)
+    if target.state == 'completed':
+        task_queue.remove_task(target.project_id, target.id)
+    else:
+        task_queue.add_task(target.project_id, target.id, target.priority_0)
+
+
+@event.listens_for(Task, 'after_delete')
+def delete_from_task_queue(mapper, conn, target):
+    TaskQueue(sentinel.master).remove_task(target.project_id, target.id)
+
+
+@event.listens_for(TaskRun, 'after_delete')
+def unmark_seen_in_task_queue(mapper, conn, target):
+    TaskQueue(sentinel.master).unmark_seen(
+        target.project_id,
+        get_user_param(target.user_id, target.user_ip, target.external_uid),
+        target.task_id)
+
+
+@event.listens_for(TaskRun, 'after_insert')
+def increase_leaderboard_score(mapper, conn, target):
+    if target.user_id:
+        Leaderboard(sentinel.master).incr(target.user_id, 1)
+
+
+@event.listens_for(TaskRun, 'after_delete')
+def decrease_leaderboard_score(mapper, conn, target):
+    if target.user_id:
+        Leaderboard(sentinel.master).incr(target.user_id, -1)
+
+
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_update')
+def update_leaderboards(mapper, conn, target):
+    """Keep the user in the loaded Redis leaderboards, unless restricted."""
+    for board in Leaderboard.loaded(sentinel.master):
+        if target.restrict:
+            board.remove(target.id)
+        elif board.info:
+            board.add(target.id, get_info_score(target.info, board.info))
+        elif board.rank(target.id)[0] is None:
+            sql = text('''SELECT COUNT(id) FROM task_run
+                       WHERE user_id=:user_id''')
+            score = conn.scalar(sql, dict(user_id=target.id))
+            board.add(target.id, score)
+
+
+@event.listens_for(User, 'after_delete')
+def delete_from_leaderboards(mapper, conn, target):
+    for board in Leaderboard.loaded(sentinel.master):
+        board.remove(target.id)
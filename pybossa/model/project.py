@@ -17,7 +17,7 @@
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 
 from sqlalchemy import Integer, Boolean, Unicode, Float, UnicodeText, Text
-from sqlalchemy.schema import Column, ForeignKey
+from sqlalchemy.schema import Column, ForeignKey, Index
 from sqlalchemy.orm import relationship, backref
 from sqlalchemy.dialects.postgresql import JSONB, ARRAY
 from sqlalchemy.ext.mutable import MutableDict, MutableList
@@ -25,6 +25,7 @@ from flask import current_app
 
 from pybossa.core import db, signer
 from pybossa.model import DomainObject, make_timestamp, make_uuid
+from pybossa.model import timestamp
 from pybossa.model.task import Task
 from pybossa.model.task_run import TaskRun
 from pybossa.model.category import Category
@@ -140,3 +141,7 @@ class Project(db.Model, DomainObject):
             return list(set(default).union(set(extra)))
         else:
             return default
+
+
+Index('project_created_idx', timestamp(Project.created))
+Index('project_updated_idx', timestamp(Project.updated))
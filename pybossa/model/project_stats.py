@@ -16,12 +16,12 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 
-from sqlalchemy import Integer, Text, Float
-from sqlalchemy.schema import Column, ForeignKey
+from sqlalchemy import Integer, Text, Float, Date, func
+from sqlalchemy.schema import Column, ForeignKey, Index
 
 from pybossa.core import db
 from pybossa.model import DomainObject, make_timestamp
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import JSONB, TIMESTAMP
 from sqlalchemy.ext.mutable import MutableDict
 
 
@@ -55,3 +55,51 @@ class ProjectStats(db.Model, DomainObject):
     last_activity = Column(Text, default=make_timestamp)
     #: Stats payload
     info = Column(MutableDict.as_mutable(JSONB), default=dict())
+
+
+class ProjectHourlyStats(db.Model, DomainObject):
+    '''Number of task runs of a project finished in a given hour, kept up
+    to date as task runs are saved.'''
+
+    __tablename__ = 'project_hourly_stats'
+
+    #: Project ID
+    project_id = Column(Integer, ForeignKey('project.id', ondelete='CASCADE'),
+                        primary_key=True)
+    #: UTC hour the task runs were finished in
+    hour = Column(TIMESTAMP, primary_key=True)
+    #: Number of task runs
+    n_task_runs = Column(Integer, default=0, nullable=False)
+    #: Number of task runs of authenticated users
+    n_auth = Column(Integer, default=0, nullable=False)
+    #: Number of task runs of anonymous users
+    n_anon = Column(Integer, default=0, nullable=False)
+    #: Number of tasks completed by one of the task runs
+    n_completed = Column(Integer, default=0, nullable=False)
+
+
+class ProjectDailyContributor(db.Model, DomainObject):
+    '''Number of task runs of a contributor to a project in a given day, kept
+    up to date as task runs are saved.'''
+
+    __tablename__ = 'project_daily_contributor'
+
+    #: ID
+    id = Column(Integer, primary_key=True)
+    #: Project ID
+    project_id = Column(Integer, ForeignKey('project.id', ondelete='CASCADE'),
+                        nullable=False)
+    #: UTC day the task runs were finished in
+    day = Column(Date, nullable=False)
+    #: User ID of the contributor, if authenticated
+    user_id = Column(Integer)
+    #: User IP of the contributor, if anonymous
+    user_ip = Column(Text)
+    #: Number of task runs
+    n_task_runs = Column(Integer, default=0, nullable=False)
+
+
+Index('project_daily_contributor_key', ProjectDailyContributor.project_id,
+      ProjectDailyContributor.day,
+      func.coalesce(ProjectDailyContributor.user_id, 0),
+      func.coalesce(ProjectDailyContributor.user_ip, ''), unique=True)
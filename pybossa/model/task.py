@@ -16,13 +16,13 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 
-from sqlalchemy import Integer, Boolean, Float, UnicodeText, Text
-from sqlalchemy.schema import Column, ForeignKey
+from sqlalchemy import Integer, Boolean, Float, UnicodeText, Text, DDL, event
+from sqlalchemy.schema import Column, ForeignKey, Index
 from sqlalchemy.orm import relationship, backref
 from sqlalchemy.dialects.postgresql import JSONB, ARRAY
 from sqlalchemy.ext.mutable import MutableList
 from pybossa.core import db
-from pybossa.model import DomainObject, make_timestamp
+from pybossa.model import DomainObject, make_timestamp, timestamp
 from pybossa.model.task_run import TaskRun
 
 
@@ -48,6 +48,9 @@ class Task(db.Model, DomainObject):
     priority_0 = Column(Float, default=0)
     #: Task.info field in JSON with the data for the task.
     info = Column(JSONB)
+    #: MD5 of Task.info as hashed by task_info_hash, unique within the
+    #: project. Repeated tasks created through the API keep it NULL.
+    info_hash = Column(Text)
     #: Number of answers to collect for this task.
     n_answers = Column(Integer, default=30)
     #: Array of User IDs that favorited this task
@@ -62,3 +65,47 @@ class Task(db.Model, DomainObject):
             return float(len(self.task_runs)) / self.n_answers
         else:  # pragma: no cover
             return float(0)
+
+
+# JSONB equality compares numbers by value, so {"n": 1} equals {"n": 1.0}.
+# Their text differs, so numbers are written without trailing zeros before
+# the info is hashed, for tasks to be repeated exactly when their info is.
+info_hash_function = DDL(r'''
+CREATE OR REPLACE FUNCTION jsonb_normalize_numbers(value jsonb)
+RETURNS jsonb AS $$
+DECLARE
+    number numeric;
+BEGIN
+    CASE jsonb_typeof(value)
+    WHEN 'object' THEN
+        RETURN (SELECT COALESCE(jsonb_object_agg(
+                    key, jsonb_normalize_numbers(item)), '{}')
+                FROM jsonb_each(value) AS element(key, item));
+    WHEN 'array' THEN
+        RETURN (SELECT COALESCE(jsonb_agg(
+                    jsonb_normalize_numbers(item) ORDER BY position), '[]')
+                FROM jsonb_array_elements(value)
+                WITH ORDINALITY AS element(item, position));
+    WHEN 'number' THEN
+        number := value::text::numeric;
+        IF number = trunc(number) THEN
+            RETURN to_jsonb(trunc(number));
+        END IF;
+        RETURN to_jsonb(rtrim(number::text, '0')::numeric);
+    ELSE
+        RETURN value;
+    END CASE;
+END
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION task_info_hash(info jsonb)
+RETURNS text AS $$
+    SELECT md5(jsonb_normalize_numbers(info)::text)
+$$ LANGUAGE sql IMMUTABLE;
+''')
+
+event.listen(db.metadata, 'before_create', info_hash_function)
+
+Index('task_created_idx', timestamp(Task.created))
+Index('task_project_id_info_hash_key', Task.project_id, Task.info_hash,
+      unique=True)
@@ -16,12 +16,13 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 
-from sqlalchemy import Integer, Text
-from sqlalchemy.schema import Column, ForeignKey
+from sqlalchemy import Integer, Text, event
+from sqlalchemy.schema import Column, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import JSONB
 
 from pybossa.core import db
 from pybossa.model import DomainObject, make_timestamp
+from pybossa.model import timestamp, timestamp_function
 
 
 
@@ -60,3 +61,10 @@ class TaskRun(db.Model, DomainObject):
             whatever information should be recorded -- up to task presenter
         }
     '''
+
+
+event.listen(db.metadata, 'before_create', timestamp_function)
+
+Index('task_run_project_id_finish_time_idx',
+      TaskRun.project_id, timestamp(TaskRun.finish_time))
+Index('task_run_finish_time_idx', timestamp(TaskRun.finish_time))
@@ -17,12 +17,44 @@
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 
 from time import time
-from datetime import timedelta
 from six import iteritems
 
 
 ACTIVE_USER_KEY = 'pybossa:active_users_in_project:{}'
 
+# Prunes the expired holders of KEYS[i] and grants ARGV[1] a lock on it when
+# it already holds one or fewer than its limit are held. ARGV holds the
+# client id, now, expiration, duration, number of granted locks to skip and
+# then one limit per key. Returns the 1-based index of the granted key, or 0.
+ACQUIRE_LOCK = """
+local client_id = ARGV[1]
+local now = tonumber(ARGV[2])
+local expiration = ARGV[3]
+local duration = tonumber(ARGV[4])
+local skip = tonumber(ARGV[5])
+for i, key in ipairs(KEYS) do
+    local locks = redis.call('hgetall', key)
+    for j = 1, #locks, 2 do
+        if now > tonumber(locks[j + 1]) then
+            redis.call('hdel', key, locks[j])
+        end
+    end
+    local granted = redis.call('hexists', key, client_id) == 1
+    if not granted and redis.call('hlen', key) < tonumber(ARGV[5 + i]) then
+        redis.call('hset', key, client_id, expiration)
+        redis.call('expire', key, duration)
+        granted = true
+    end
+    if granted then
+        if skip == 0 then
+            return i
+        end
+        skip = skip - 1
+    end
+end
+return 0
+"""
+
 
 def get_active_user_key(project_id):
     return ACTIVE_USER_KEY.format(project_id)
@@ -55,27 +87,37 @@ class LockManager(object):
     def __init__(self, cache, duration):
         self._redis = cache
         self._duration = duration
+        self._acquire_lock = cache.register_script(ACQUIRE_LOCK)
 
-    def acquire_lock(self, resource_id, client_id, limit, pipeline=None):
+    def acquire_lock(self, resource_id, client_id, limit):
         """
-        Acquire a lock on a resource.
+        Acquire a lock on a resource. Expired locks are pruned, the limit is
+        checked and the lock is granted atomically in a single script call.
         :param resource_id: resource on which lock is needed
         :param client_id: id of client needing the lock
         :param limit: how many clients can access the resource concurrently
         :return: True if lock was successfully acquired, else False
         """
+        return self.acquire_any_lock([resource_id], client_id, [limit]) == 0
+
+    def acquire_any_lock(self, resource_ids, client_id, limits, skip=0):
+        """
+        Try to acquire a lock on each resource in order, in a single script
+        call, stopping at the first one granted after skipping skip grants.
+        :param resource_ids: resources on which a lock is needed
+        :param client_id: id of client needing the lock
+        :param limits: how many clients can access each resource concurrently
+        :param skip: number of granted locks to pass over
+        :return: index in resource_ids of the granted lock, or None
+        """
+        if not resource_ids:
+            return None
         timestamp = time()
         expiration = timestamp + self._duration
-        self._release_expired_locks(resource_id, timestamp)
-        if self._redis.hexists(resource_id, client_id):
-            return True
-        num_acquired = self._redis.hlen(resource_id)
-        if num_acquired < limit:
-            cache = pipeline or self._redis
-            cache.hset(resource_id, client_id, expiration)
-            cache.expire(resource_id, timedelta(seconds=self._duration))
-            return True
-        return False
+        args = [client_id, timestamp, expiration, int(self._duration),
+                skip] + limits
+        index = self._acquire_lock(keys=resource_ids, args=args)
+        return index - 1 if index else None
 
     def has_lock(self, resource_id, client_id):
         """
@@ -111,13 +153,3 @@ class LockManager(object):
         :param resource_id: resource on which lock is being held
         """
         return self._redis.hgetall(resource_id)
-
-    def _release_expired_locks(self, resource_id, now):
-        locks = self.get_locks(resource_id)
-        to_delete = []
-        for key, expiration in iteritems(locks):
-            expiration = float(expiration)
-            if now > expiration:
-                to_delete.append(key)
-        if to_delete:
-            self._redis.hdel(resource_id, *to_delete)
@@ -45,10 +45,10 @@ import re
 from pybossa.model.project import Project, TaskRun, Task
 from pybossa.model.announcement import Announcement
 from pybossa.model.project_stats import ProjectStats
-from sqlalchemy import text
+from sqlalchemy import text, literal_column
 from sqlalchemy.sql import and_, or_
 from sqlalchemy import cast, func, desc
-from sqlalchemy.types import TIMESTAMP
+from sqlalchemy.types import TIMESTAMP, Text
 from sqlalchemy.orm.base import _entity_descriptor
 
 
@@ -191,52 +191,111 @@ class Repository(object):
             query = query.order_by(text('rank DESC'))
         return query
 
-    def _set_orderby_desc(self, query, model, limit,
-                          last_id, offset, descending, orderby):
-        """Return an updated query with the proper orderby and desc."""
+    def _orderby_column(self, model, orderby):
+        """Return the expression the items are sorted by for orderby."""
         if orderby == 'fav_user_ids':
-            n_favs = func.coalesce(func.array_length(model.fav_user_ids, 1), 0).label('n_favs')
-            query = query.add_column(n_favs)
+            return func.coalesce(func.array_length(model.fav_user_ids, 1), 0)
         if orderby in ['created', 'updated', 'finish_time']:
-            if descending:
-                query = query.order_by(desc(
-                                            cast(getattr(model,
-                                                         orderby),
-                                                 TIMESTAMP)))
-            else:
-                query = query.order_by(cast(getattr(model, orderby), TIMESTAMP))
+            return cast(getattr(model, orderby), TIMESTAMP)
+        return getattr(model, orderby)
+
+    def _set_orderby_desc(self, query, model, limit,
+                          last_id, offset, descending, orderby,
+                          cursor=None):
+        """Return an updated query with the proper orderby and desc.
+
+        The id breaks the ties, so the order is stable across pages."""
+        column = self._orderby_column(model, orderby)
+        if orderby == 'fav_user_ids':
+            query = query.add_column(column.label('n_favs'))
+        if descending:
+            query = query.order_by(desc(column))
+            if orderby != 'id':
+                query = query.order_by(desc(model.id))
         else:
-            if orderby != 'fav_user_ids':
-                if descending:
-                    query = query.order_by(desc(getattr(model, orderby)))
-                else:
-                    query = query.order_by(getattr(model, orderby))
-            else:
-                if descending:
-                    query = query.order_by(desc(text("n_favs")))
-                else:
-                    query = query.order_by(text("n_favs"))
-        if last_id:
+            query = query.order_by(column)
+            if orderby != 'id':
+                query = query.order_by(model.id)
+        if last_id or cursor:
             query = query.limit(limit)
         else:
             query = query.limit(limit).offset(offset)
         return query
 
+    def _after_cursor(self, query, model, orderby, descending, cursor):
+        """Return the query filtered to the items after cursor.
+
+        The cursor is the (value, id) of the last item already seen. NULL
+        values are sorted as Postgres does: last when ascending and first
+        when descending."""
+        value, last_id = cursor
+        column = self._orderby_column(model, orderby)
+        if orderby in ['created', 'updated', 'finish_time'] and value:
+            value = cast(value, TIMESTAMP)
+        if orderby == 'id':
+            clause = model.id < last_id if descending else model.id > last_id
+        elif value is None:
+            if descending:
+                clause = or_(column.isnot(None),
+                             and_(column.is_(None), model.id < last_id))
+            else:
+                clause = and_(column.is_(None), model.id > last_id)
+        elif descending:
+            clause = or_(column < value,
+                         and_(column == value, model.id < last_id))
+        else:
+            clause = or_(column > value, column.is_(None),
+                         and_(column == value, model.id > last_id))
+        return query.filter(clause)
+
+    def _row_hash(self, model):
+        """Return the SQL expression of the hash of the rows of model."""
+        row = literal_column('"%s"' % model.__tablename__)
+        return func.md5(cast(row, Text))
+
+    def _fingerprint(self, query, model):
+        """Return the hashes of the rows of query, computed by the DB
+        without loading them."""
+        query = query.with_entities(self._row_hash(model))
+        return [fingerprint for (fingerprint,) in query]
+
+    def get_fingerprint(self, model, oid):
+        """Return the hash of the row of model with oid, or None."""
+        query = self.db.session.query(model).filter(model.id == oid)
+        fingerprints = self._fingerprint(query, model)
+        return fingerprints[0] if fingerprints else None
+
+    def get_with_fingerprint(self, model, oid):
+        """Return the (item, hash) of model with oid, or (None, None)."""
+        query = self.db.session.query(model, self._row_hash(model))
+        return query.filter(model.id == oid).first() or (None, None)
+
     def _filter_by(self, model, limit=None, offset=0, yielded=False,
                    last_id=None, fulltextsearch=None, desc=False,
-                   orderby='id', **filters):
-        """Filter by using several arguments and ordering items."""
+                   orderby='id', cursor=None, fingerprint=False,
+                   with_fingerprint=False, **filters):
+        """Filter by using several arguments and ordering items.
+
+        Pass cursor, the (value, id) of the last item of the previous page,
+        to get the next page without scanning the skipped rows. With
+        fingerprint, the hashes of the rows are returned instead. With
+        with_fingerprint, the items and the hashes are returned, loaded by
+        the same query."""
         query = self.create_context(filters, fulltextsearch, model)
         if last_id:
             query = query.filter(model.id > last_id)
-            query = self._set_orderby_desc(query, model, limit,
-                                           last_id, offset, desc, orderby)
-        else:
-            query = self._set_orderby_desc(query, model, limit,
-                                           last_id, offset, desc, orderby)
+        if cursor:
+            query = self._after_cursor(query, model, orderby, desc, cursor)
+        query = self._set_orderby_desc(query, model, limit,
+                                       last_id, offset, desc, orderby,
+                                       cursor)
+        if fingerprint:
+            return self._fingerprint(query, model)
+        if with_fingerprint:
+            rows = query.add_columns(self._row_hash(model)).all()
+            return [row[0] for row in rows], [row[-1] for row in rows]
         if yielded:
-            limit = limit or 1
-            return query.yield_per(limit)
+            return query.yield_per(min(limit or 1000, 1000))
         return query.all()
 
 
@@ -38,3 +38,11 @@ class ProjectStatsRepository(Repository):
         return self._filter_by(ProjectStats, limit, offset, yielded,
                                last_id, fulltextsearch, desc, orderby,
                                **filters)
+
+    def filter_by_project_ids(self, project_ids):
+        """Return the stats of the given projects in a single query."""
+        if not project_ids:
+            return []
+        return self.db.session.query(ProjectStats)\
+                   .filter(ProjectStats.project_id.in_(project_ids))\
+                   .order_by(ProjectStats.id).all()
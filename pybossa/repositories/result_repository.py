@@ -45,6 +45,15 @@ class ResultRepository(Repository):
                               fulltextsearch,
                               desc, **filters)
 
+    def filter_by_task_ids(self, task_ids, last_version=True):
+        """Return the results of the given tasks in a single query."""
+        if not task_ids:
+            return []
+        return self.db.session.query(Result)\
+                   .filter(Result.task_id.in_(task_ids),
+                           Result.last_version == last_version)\
+                   .order_by(Result.id).all()
+
     def update(self, result):
         self._validate_can_be('updated', result)
         try:
@@ -16,15 +16,19 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 
+import json
+
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import cast, Date
 
 from pybossa.repositories import Repository
 from pybossa.model.task import Task
 from pybossa.model.task_run import TaskRun
+from pybossa.model import make_timestamp
 from pybossa.exc import WrongObjectError, DBIntegrityError
 from pybossa.cache import projects as cached_projects
-from pybossa.core import uploader
+from pybossa.core import uploader, sentinel
+from pybossa.task_queue import TaskQueue
 from sqlalchemy import text
 
 
@@ -34,6 +38,12 @@ class TaskRepository(Repository):
     def get_task(self, id):
         return self.db.session.query(Task).get(id)
 
+    def get_tasks(self, ids):
+        """Return the tasks with the given ids in a single query."""
+        if not ids:
+            return []
+        return self.db.session.query(Task).filter(Task.id.in_(ids)).all()
+
     def get_task_by(self, **attributes):
         filters, _, _, _ = self.generate_query_from_keywords(Task, **attributes)
         print(self.db.session.query(Task).filter(*filters))
@@ -58,11 +68,14 @@ class TaskRepository(Repository):
         last_id = filters.get('last_id', None)
         desc = filters.get('desc', False)
         orderby = filters.get('orderby', 'id')
+        cursor = filters.get('cursor')
         if last_id:
             query = query.filter(Task.id > last_id)
+        if cursor:
+            query = self._after_cursor(query, Task, orderby, desc, cursor)
         query = self._set_orderby_desc(query, Task, limit,
                                        last_id, offset,
-                                       desc, orderby)
+                                       desc, orderby, cursor)
         return query.all()
 
     def get_task_favorited(self, uid, task_id):
@@ -90,6 +103,14 @@ class TaskRepository(Repository):
                               fulltextsearch, desc, **filters)
 
 
+    def filter_task_runs_by_task_ids(self, task_ids):
+        """Return the task runs of the given tasks in a single query."""
+        if not task_ids:
+            return []
+        return self.db.session.query(TaskRun)\
+                   .filter(TaskRun.task_id.in_(task_ids))\
+                   .order_by(TaskRun.id).all()
+
     def count_task_runs_with(self, **filters):
         query_args, _, _, _ = self.generate_query_from_keywords(TaskRun, **filters)
         return self.db.session.query(TaskRun).filter(*query_args).count()
@@ -106,6 +127,118 @@ class TaskRepository(Repository):
             self.db.session.rollback()
             raise DBIntegrityError(e)
 
+    def import_tasks(self, tasks, batch_size=1000, progress=None):
+        """Insert tasks in batches with multi-row INSERTs, skipping the ones
+        whose info is already in the project. Return how many were inserted.
+
+        Every batch is committed with the bookkeeping of the Task listeners
+        done in bulk, and the project caches are cleaned once at the end.
+        If given, progress is called after every batch with the number of
+        tasks read and inserted so far.
+        """
+        n = 0
+        read = 0
+        project_ids = set()
+        batch = []
+        for element in tasks:
+            if not isinstance(element, Task):
+                name = element.__class__.__name__
+                msg = '%s cannot be imported by %s' % (name,
+                                                       self.__class__.__name__)
+                raise WrongObjectError(msg)
+            batch.append(element)
+            project_ids.add(element.project_id)
+            if len(batch) == batch_size:
+                n += self._insert_tasks(batch)
+                read += len(batch)
+                batch = []
+                if progress is not None:
+                    progress(read, n)
+        if batch:
+            n += self._insert_tasks(batch)
+            read += len(batch)
+            if progress is not None:
+                progress(read, n)
+        for project_id in project_ids:
+            cached_projects.clean_project(project_id)
+        return n
+
+    def _insert_tasks(self, tasks):
+        from pybossa.model.event_listeners import on_tasks_bulk_import
+        columns = [column for column in Task.__table__.c
+                   if column.name not in ('id', 'info_hash')]
+        values = []
+        for element in tasks:
+            row = dict()
+            for column in columns:
+                value = getattr(element, column.name)
+                if value is None and column.default is not None:
+                    value = column.default.arg
+                    if column.default.is_callable:
+                        value = value(None)
+                row[column.name] = value
+            values.append(row)
+        names = ', '.join(column.name for column in columns)
+        sql = text('''INSERT INTO task ({0}, info_hash)
+                   SELECT {0}, task_info_hash(info)
+                   FROM json_populate_recordset(NULL::task, :tasks)
+                   ON CONFLICT (project_id, info_hash) DO NOTHING
+                   RETURNING id'''.format(names))
+        try:
+            conn = self.db.session.connection()
+            rows = conn.execute(sql, dict(tasks=json.dumps(values)))
+            task_ids = [row.id for row in rows]
+            if task_ids:
+                on_tasks_bulk_import(conn, task_ids)
+            self.db.session.commit()
+        except IntegrityError as e:
+            self.db.session.rollback()
+            raise DBIntegrityError(e)
+        return len(task_ids)
+
+    def save_task_runs(self, task_runs):
+        """Save several task runs with a single multi-row INSERT.
+
+        Mapper events are not fired for them, so the bookkeeping done by the
+        task run listeners is run in bulk within the same transaction.
+        """
+        from pybossa.model.event_listeners import on_taskruns_bulk_submit
+        for element in task_runs:
+            if not isinstance(element, TaskRun):
+                name = element.__class__.__name__
+                msg = '%s cannot be bulk saved by %s' % (name,
+                                                         self.__class__.__name__)
+                raise WrongObjectError(msg)
+        if not task_runs:
+            return
+        now = make_timestamp()
+        columns = ['project_id', 'task_id', 'user_id', 'user_ip',
+                   'external_uid', 'timeout', 'calibration', 'media_url',
+                   'info']
+        values = []
+        for element in task_runs:
+            row = dict((column, getattr(element, column)) for column in columns)
+            row['created'] = element.created or now
+            row['finish_time'] = element.finish_time or now
+            values.append(row)
+        table = TaskRun.__table__
+        try:
+            conn = self.db.session.connection()
+            rows = conn.execute(table.insert().values(values)
+                                .returning(table.c.id, table.c.task_id))
+            pending = dict()
+            for element in task_runs:
+                pending.setdefault(element.task_id, []).append(element)
+            for row in rows:
+                pending[row.task_id].pop(0).id = row.id
+            on_taskruns_bulk_submit(conn, task_runs)
+            self.db.session.commit()
+        except IntegrityError as e:
+            self.db.session.rollback()
+            raise DBIntegrityError(e)
+        for project_id in set(element.project_id for element in task_runs):
+            cached_projects.clean_project(project_id)
+
     def update(self, element):
         self._validate_can_be('updated', element)
         try:
@@ -132,8 +265,10 @@ class TaskRepository(Repository):
                    WHERE result.project_id=:project_id GROUP BY result.task_id);
                    ''')
         self.db.session.execute(sql, dict(project_id=project.id))
+        self._rebuild_contribution_stats(project.id)
         self.db.session.commit()
         cached_projects.clean_project(project.id)
+        TaskQueue(sentinel.master).drop(project.id)
         self._delete_zip_files_from_store(project)
 
     def delete_taskruns_from_project(self, project):
@@ -141,8 +276,10 @@ class TaskRepository(Repository):
                    DELETE FROM task_run WHERE project_id=:project_id;
                    ''')
         self.db.session.execute(sql, dict(project_id=project.id))
+        self._rebuild_contribution_stats(project.id)
         self.db.session.commit()
         cached_projects.clean_project(project.id)
+        TaskQueue(sentinel.master).drop(project.id)
         self._delete_zip_files_from_store(project)
 
     def update_tasks_redundancy(self, project, n_answer):
@@ -166,8 +303,10 @@ class TaskRepository(Repository):
                    and project_tasks.id=task.id
                    ''')
         self.db.session.execute(sql, dict(n_answers=n_answer, project_id=project.id))
+        self._rebuild_contribution_stats(project.id)
         self.db.session.commit()
         cached_projects.clean_project(project.id)
+        TaskQueue(sentinel.master).drop(project.id)
 
     def _validate_can_be(self, action, element):
         if not isinstance(element, Task) and not isinstance(element, TaskRun):
@@ -181,6 +320,10 @@ class TaskRepository(Repository):
         inst = self.db.session.query(table).filter(table.id==element.id).first()
         self.db.session.delete(inst)
 
+    def _rebuild_contribution_stats(self, project_id):
+        from pybossa.model.event_listeners import rebuild_contribution_stats
+        rebuild_contribution_stats(self.db.session, project_id)
+
     def _delete_zip_files_from_store(self, project):
         from pybossa.core import json_exporter, csv_exporter
         global uploader
@@ -26,6 +26,7 @@ from pybossa.model.task_run import TaskRun
 from pybossa.model.counter import Counter
 from pybossa.core import db, sentinel, project_repo
 from pybossa.contributions_guard import ContributionsGuard
+from pybossa.task_queue import TaskQueue, get_user_param
 from pybossa.redis_lock import (LockManager, get_active_user_count,
     register_active_user)
 import random
@@ -48,13 +49,14 @@ def new_task(project_id, sched, user_id=None, user_ip=None,
         'depth_first': get_depth_first_task,
         'incremental': get_incremental_task,
         'depth_first_all': get_depth_first_all_task,
+        'depth_first_cached': get_depth_first_cached_task,
         'locked': get_locked_task}
     scheduler = sched_map.get(sched, sched_map['default'])
     return scheduler(project_id, user_id, user_ip, external_uid, offset=offset, limit=limit, orderby=orderby, desc=desc)
 
 
-def can_post(project_id, task_id, user_id_or_ip):
-    scheduler = get_project_scheduler(project_id, session)
+def can_post(project_id, task_id, user_id_or_ip, scheduler=None):
+    scheduler = scheduler or get_project_scheduler(project_id, session)
     if scheduler == 'locked':
         user_id = user_id_or_ip['user_id'] or \
                 user_id_or_ip['external_uid'] or \
@@ -95,10 +97,12 @@ def get_breadth_first_task(project_id, user_id=None, user_ip=None,
                                                                 external_uid=external_uid)
 
     tmp = project_query.except_(subquery)
-    query = session.query(Task, func.sum(Counter.n_task_runs).label('n_task_runs'))\
+    # Counters hold one row per task, so the least answered tasks come
+    # straight from the (project_id, n_task_runs) index.
+    query = session.query(Task, Counter.n_task_runs.label('n_task_runs'))\
                    .filter(Task.id==Counter.task_id)\
+                   .filter(Counter.project_id==project_id)\
                    .filter(Counter.task_id.in_(tmp))\
-                   .group_by(Task.id)\
                    .order_by(text('n_task_runs ASC'))\
 
     query = _set_orderby_desc(query, orderby, desc)
@@ -116,6 +120,77 @@ def get_depth_first_task(project_id, user_id=None, user_ip=None,
     return tasks
 
 
+def get_depth_first_cached_task(project_id, user_id=None, user_ip=None,
+                                external_uid=None, offset=0, limit=1,
+                                orderby='priority_0', desc=True):
+    """Get a new task for a given project from its Redis candidate queue.
+
+    Falls back to the DB query of the depth first scheduler when the queue
+    is not loaded yet or when the requested order is not kept in Redis.
+    """
+    queue = TaskQueue(sentinel.master)
+    generation = queue.generation(project_id)
+    if generation is None or not queue.supports(orderby):
+        if generation is None and queue.acquire_loading(project_id):
+            load_task_queue(project_id, queue)
+        return get_candidate_task_ids(project_id, user_id, user_ip,
+                                      external_uid, limit, offset,
+                                      orderby=orderby, desc=desc)
+    user = get_user_param(user_id, user_ip, external_uid)
+    seen = queue.get_seen(project_id, generation, user)
+    if seen is None:
+        user_param, uid = user
+        query = session.query(TaskRun.task_id)\
+                       .filter_by(project_id=project_id, **{user_param: uid})
+        seen = set(row.task_id for row in query)
+        queue.set_seen(project_id, generation, user, seen)
+
+    wanted = offset + limit
+    task_ids = []
+    start = 0
+    step = max(wanted * 2, 10)
+    while len(task_ids) < wanted:
+        page = queue.candidates(project_id, orderby, desc,
+                                start, start + step - 1)
+        task_ids += [task_id for task_id in page if task_id not in seen]
+        if len(page) < step:
+            break
+        start += step
+        step *= 2
+    task_ids = task_ids[offset:wanted]
+    if not task_ids:
+        return []
+
+    tasks = dict((task.id, task) for task in
+                 session.query(Task).filter(Task.id.in_(task_ids)))
+    # Tasks missing or completed in the DB are stale queue entries
+    stale = [task_id for task_id in task_ids
+             if task_id not in tasks or tasks[task_id].state == 'completed']
+    for task_id in stale:
+        queue.remove_task(project_id, task_id)
+    if stale:
+        return get_candidate_task_ids(project_id, user_id, user_ip,
+                                      external_uid, limit, offset,
+                                      orderby=orderby, desc=desc)
+    return [tasks[task_id] for task_id in task_ids]
+
+
+def load_task_queue(project_id, queue=None):
+    """Load the non completed tasks of a project into its Redis queue."""
+    queue = queue or TaskQueue(sentinel.master)
+    watermark = session.query(func.max(Task.id))\
+                       .filter(Task.project_id == project_id).scalar() or 0
+    query = session.query(Task.id, Task.priority_0)\
+                   .filter(Task.project_id == project_id,
+                           Task.state != 'completed')
+
+    def late_tasks():
+        return query.filter(Task.id > watermark).all()
+
+    return queue.load(project_id, query.yield_per(TaskQueue.CHUNK_SIZE),
+                      late_tasks)
+
+
 def get_depth_first_all_task(project_id, user_id=None, user_ip=None,
                              external_uid=None, offset=0, limit=1,
                              orderby='priority_0', desc=True):
@@ -218,17 +293,19 @@ def get_locked_task(project_id, user_id=None, user_ip=None,
     rows = session.execute(sql, dict(project_id=project_id,
                                      uid=uid, limit=limit + 5))
 
+    task_ids, limits = [], []
     for task_id, taskcount, n_answers in rows:
-        remaining = n_answers - taskcount
-        if acquire_lock(task_id, uid, remaining, TIMEOUT):
-            if offset == 1:
-                offset = 0
-                continue
-            rows.close()
-            register_active_user(project_id, uid, sentinel.master, ttl=TIMEOUT)
-            return [session.query(Task).get(task_id)]
-
-    return []
+        task_ids.append(task_id)
+        limits.append(n_answers - taskcount)
+
+    # Try every candidate in a single script call, skipping offset grants
+    lock_manager = LockManager(sentinel.master, TIMEOUT)
+    keys = [get_task_users_key(task_id) for task_id in task_ids]
+    index = lock_manager.acquire_any_lock(keys, uid, limits, skip=offset)
+    if index is None:
+        return []
+    register_active_user(project_id, uid, sentinel.master, ttl=TIMEOUT)
+    return [session.query(Task).get(task_ids[index])]
 
 
 TASK_USERS_KEY_PREFIX = 'pybossa:project:task_requested:timestamps:{0}'
@@ -241,16 +318,10 @@ def has_lock(task_id, user_id, timeout):
     return lock_manager.has_lock(task_users_key, user_id)
 
 
-def acquire_lock(task_id, user_id, limit, timeout, pipeline=None, execute=True):
-    redis_conn = sentinel.master
-    pipeline = pipeline or redis_conn.pipeline(transaction=True)
-    lock_manager = LockManager(redis_conn, timeout)
+def acquire_lock(task_id, user_id, limit, timeout):
+    lock_manager = LockManager(sentinel.master, timeout)
     task_users_key = get_task_users_key(task_id)
-    if lock_manager.acquire_lock(task_users_key, user_id, limit, pipeline=pipeline):
-        if execute:
-            return all(not isinstance(r, Exception) for r in pipeline.execute())
-        return True
-    return False
+    return lock_manager.acquire_lock(task_users_key, user_id, limit)
 
 
 def release_lock(task_id, user_id, timeout, pipeline=None, execute=True):
@@ -281,6 +352,7 @@ def sched_variants():
     return [('default', 'Default'), ('breadth_first', 'Breadth First'),
             ('depth_first', 'Depth First'),
             ('depth_first_all', 'Depth First All'),
+            ('depth_first_cached', 'Depth First Cached'),
             ('locked', 'Locked')
             ]
 
@@ -0,0 +1,218 @@
+# -*- coding: utf8 -*-
+# This file is part of PYBOSSA.
+#
+# Copyright (C) 2018 Scifabric LTD.
+#
+# PYBOSSA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PYBOSSA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Redis backed candidate task queue for the depth first scheduler.
+
+For every project two sorted sets keep the ids of its non completed tasks,
+one scored by priority_0 and one by id, and for every contributor a set keeps
+the ids of the tasks already answered. Both are loaded lazily from the DB and
+maintained afterwards from the model event listeners.
+"""
+
+
+ADD_IF_LOADED = """
+if redis.call('exists', KEYS[1]) == 1 then
+    redis.call('zadd', KEYS[2], ARGV[1], ARGV[3])
+    redis.call('zadd', KEYS[3], ARGV[2], ARGV[3])
+    return 1
+end
+return 0
+"""
+
+# Mark (ARGV[1] 'add') or unmark a task as seen in the seen set of the
+# loaded generation, in a single round trip. The key is built here from its
+# head and tail, as the generation is only known once KEYS[1] is read.
+UPDATE_SEEN = """
+local generation = redis.call('get', KEYS[1])
+if not generation then
+    return 0
+end
+local key = ARGV[2] .. generation .. ARGV[3]
+if ARGV[1] == 'add' then
+    if redis.call('exists', key) == 1 then
+        return redis.call('sadd', key, ARGV[4])
+    end
+    return 0
+end
+return redis.call('srem', key, ARGV[4])
+"""
+
+
+class TaskQueue(object):
+
+    LOADED_KEY = 'pybossa:sched:project:%s:loaded'
+    LOADING_KEY = 'pybossa:sched:project:%s:loading'
+    GENERATION_KEY = 'pybossa:sched:project:%s:generation'
+    CANDIDATES_KEY = 'pybossa:sched:project:%s:candidates:%s'
+    SEEN_KEY_HEAD = 'pybossa:sched:project:%s:'
+    SEEN_KEY_TAIL = ':seen:%s:%s'
+    ORDERINGS = ('priority_0', 'id')
+    SEEN_TTL = 2 * 60 * 60
+    LOADING_TTL = 60
+    CHUNK_SIZE = 1000
+    # Seen sets always hold this member, so empty histories are cached too.
+    PLACEHOLDER = '0'
+
+    def __init__(self, redis_conn):
+        self.conn = redis_conn
+        self._add_if_loaded = redis_conn.register_script(ADD_IF_LOADED)
+        self._update_seen = redis_conn.register_script(UPDATE_SEEN)
+
+    def supports(self, orderby):
+        return orderby in self.ORDERINGS
+
+    def generation(self, project_id):
+        """Return the generation of the loaded queue, or None."""
+        generation = self.conn.get(self.LOADED_KEY % project_id)
+        return generation and generation.decode()
+
+    def acquire_loading(self, project_id):
+        """Return True if the caller must load the project queue."""
+        key = self.LOADING_KEY % project_id
+        return bool(self.conn.set(key, 1, nx=True, ex=self.LOADING_TTL))
+
+    def load(self, project_id, tasks, late_tasks=None):
+        """Load (task_id, priority_0) pairs as the project candidates.
+
+        Tasks created while loading are missed by tasks and, as the queue is
+        not loaded yet, by add_task. late_tasks is called once the queue is
+        loaded to return them, so they are added too."""
+        generation = self.conn.incr(self.GENERATION_KEY % project_id)
+        pipeline = self.conn.pipeline(transaction=True)
+        for orderby in self.ORDERINGS:
+            pipeline.delete(self.CANDIDATES_KEY % (project_id, orderby))
+        by_priority, by_id = dict(), dict()
+        for task_id, priority_0 in tasks:
+            by_priority[task_id] = priority_0 or 0
+            by_id[task_id] = task_id
+            if len(by_id) == self.CHUNK_SIZE:
+                self._zadd_chunk(pipeline, project_id, by_priority, by_id)
+                by_priority, by_id = dict(), dict()
+        self._zadd_chunk(pipeline, project_id, by_priority, by_id)
+        pipeline.set(self.LOADED_KEY % project_id, generation)
+        pipeline.delete(self.LOADING_KEY % project_id)
+        pipeline.execute()
+        if late_tasks is not None:
+            self.add_tasks(project_id, late_tasks())
+        return str(generation)
+
+    def drop(self, project_id):
+        """Drop the project queue and every seen set associated to it."""
+        pipeline = self.conn.pipeline(transaction=True)
+        pipeline.delete(self.LOADED_KEY % project_id)
+        for orderby in self.ORDERINGS:
+            pipeline.delete(self.CANDIDATES_KEY % (project_id, orderby))
+        # Seen sets include the generation in their key, so they are left
+        # to expire instead of being scanned for.
+        pipeline.incr(self.GENERATION_KEY % project_id)
+        pipeline.execute()
+
+    def add_task(self, project_id, task_id, priority_0):
+        keys = [self.LOADED_KEY % project_id]
+        keys += [self.CANDIDATES_KEY % (project_id, orderby)
+                 for orderby in self.ORDERINGS]
+        return bool(self._add_if_loaded(keys=keys,
+                                        args=[priority_0 or 0, task_id,
+                                              task_id]))
+
+    def add_tasks(self, project_id, tasks):
+        """Add (task_id, priority_0) pairs if the project queue is loaded."""
+        keys = [self.LOADED_KEY % project_id]
+        keys += [self.CANDIDATES_KEY % (project_id, orderby)
+                 for orderby in self.ORDERINGS]
+        pipeline = self.conn.pipeline(transaction=False)
+        for task_id, priority_0 in tasks:
+            self._add_if_loaded(keys=keys,
+                                args=[priority_0 or 0, task_id, task_id],
+                                client=pipeline)
+        pipeline.execute()
+
+    def remove_task(self, project_id, task_id):
+        pipeline = self.conn.pipeline(transaction=False)
+        for orderby in self.ORDERINGS:
+            pipeline.zrem(self.CANDIDATES_KEY % (project_id, orderby), task_id)
+        pipeline.execute()
+
+    def candidates(self, project_id, orderby, desc, start, stop):
+        key = self.CANDIDATES_KEY % (project_id, orderby)
+        if desc:
+            ids = self.conn.zrevrange(key, start, stop)
+        else:
+            ids = self.conn.zrange(key, start, stop)
+        return [int(task_id) for task_id in ids]
+
+    def get_seen(self, project_id, generation, user):
+        """Return the set of task ids answered by user, or None if unknown."""
+        key = self._seen_key(project_id, generation, user)
+        pipeline = self.conn.pipeline(transaction=False)
+        pipeline.smembers(key)
+        pipeline.expire(key, self.SEEN_TTL)
+        members, _ = pipeline.execute()
+        if not members:
+            return None
+        return set(int(task_id) for task_id in members) - set([0])
+
+    def set_seen(self, project_id, generation, user, task_ids):
+        key = self._seen_key(project_id, generation, user)
+        pipeline = self.conn.pipeline(transaction=True)
+        pipeline.delete(key)
+        pipeline.sadd(key, self.PLACEHOLDER, *task_ids)
+        pipeline.expire(key, self.SEEN_TTL)
+        pipeline.execute()
+
+    def mark_seen(self, project_id, user, task_id):
+        return bool(self._update_seen(
+            keys=[self.LOADED_KEY % project_id],
+            args=['add', self.SEEN_KEY_HEAD % project_id,
+                  self.SEEN_KEY_TAIL % user, task_id]))
+
+    def mark_seen_many(self, seen):
+        """Mark (project_id, user, task_id) triples with one pipeline."""
+        pipeline = self.conn.pipeline(transaction=False)
+        for project_id, user, task_id in seen:
+            self._update_seen(keys=[self.LOADED_KEY % project_id],
+                              args=['add', self.SEEN_KEY_HEAD % project_id,
+                                    self.SEEN_KEY_TAIL % user, task_id],
+                              client=pipeline)
+        pipeline.execute()
+
+    def unmark_seen(self, project_id, user, task_id):
+        self._update_seen(keys=[self.LOADED_KEY % project_id],
+                          args=['remove', self.SEEN_KEY_HEAD % project_id,
+                                self.SEEN_KEY_TAIL % user, task_id])
+
+    def _seen_key(self, project_id, generation, user):
+        return (self.SEEN_KEY_HEAD % project_id + generation +
+                self.SEEN_KEY_TAIL % user)
+
+    def _zadd_chunk(self, pipeline, project_id, by_priority, by_id):
+        if by_id:
+            pipeline.zadd(self.CANDIDATES_KEY % (project_id, 'priority_0'),
+                          by_priority)
+            pipeline.zadd(self.CANDIDATES_KEY % (project_id, 'id'), by_id)
+
+
+def get_user_param(user_id=None, user_ip=None, external_uid=None):
+    """Return the (column, value) pair identifying a contributor."""
+    if user_id and not user_ip and not external_uid:
+        return 'user_id', user_id
+    if not user_ip:
+        user_ip = '127.0.0.1'
+    if user_ip and not external_uid:
+        return 'user_ip', user_ip
+    return 'external_uid', external_uid
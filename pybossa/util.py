@@ -18,7 +18,6 @@
 """Module with PYBOSSA utils."""
 import os
 
-from yacryptopan import CryptoPAn
 from datetime import timedelta, datetime
 from functools import update_wrapper
 from flask_wtf import Form
@@ -27,6 +26,7 @@ import codecs
 import io
 from flask import abort, request, make_response, current_app, url_for
 from flask import redirect, render_template, jsonify, get_flashed_messages
+from flask import session
 from flask_wtf.csrf import generate_csrf
 from functools import wraps
 from flask_login import current_user
@@ -39,7 +39,7 @@ import hashlib
 import hmac
 import simplejson
 import time
-from flask_babel import lazy_gettext
+from flask_babel import lazy_gettext, get_locale
 import re
 import pycountry
 
@@ -173,6 +173,52 @@ def jsonpify(f):
     return decorated_function
 
 
+def get_etag(*parts, csrf=False):
+    """Return a weak ETag for the response to the current request, built
+    out of parts.
+
+    The response also depends on the user, the URL, the content type and
+    the language, so they are part of the ETag too. With csrf, the ETag
+    changes at half the lifetime of the CSRF token embedded in the page.
+    Returns None when the response cannot be revalidated: JSONP responses
+    and pages showing a flash message.
+    """
+    if request.args.get('callback') or session.get('_flashes'):
+        return None
+    user_id = current_user.id if current_user.is_authenticated else None
+    data = [user_id, request.full_path, request.headers.get('Content-Type'),
+            str(get_locale()), parts]
+    time_limit = current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    if csrf and time_limit:
+        data.append(int(time.time() // (time_limit / 2)))
+    data = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.md5(data.encode('utf-8')).hexdigest()
+
+
+def set_etag(response, etag, public=False):
+    """Add the weak etag and the Cache-Control header to response.
+
+    Shared caches can store public responses of anonymous users only;
+    either way they have to be revalidated before being used.
+    """
+    response = make_response(response)
+    if etag is None:
+        return response
+    response.set_etag(etag, weak=True)
+    if public and not current_user.is_authenticated:
+        response.headers['Cache-Control'] = 'public, no-cache'
+    else:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def not_modified(etag, public=False):
+    """Return a 304 response if the client already has etag, else None."""
+    if etag is None or not request.if_none_match.contains_weak(etag):
+        return None
+    return set_etag(current_app.response_class(status=304), etag, public)
+
+
 def admin_required(f):  # pragma: no cover
     """Check if the user is and admin or not."""
     @wraps(f)
@@ -330,9 +376,9 @@ def get_user_id_or_ip():
     """Return the id of the current user if is authenticated.
     Otherwise returns its IP address (defaults to 127.0.0.1).
     """
-    cp = CryptoPAn(str.encode(current_app.config.get('CRYPTOPAN_KEY')))
+    from pybossa.core import anonymizer
     user_id = current_user.id if current_user.is_authenticated else None
-    user_ip = cp.anonymize(request.remote_addr or "127.0.0.1") \
+    user_ip = anonymizer.ip(request.remote_addr or "127.0.0.1") \
         if current_user.is_anonymous else None
     external_uid = request.args.get('external_uid')
     return dict(user_id=user_id, user_ip=user_ip, external_uid=external_uid)
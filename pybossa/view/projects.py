@@ -47,7 +47,8 @@ from pybossa.model.webhook import Webhook
 from pybossa.model.blogpost import Blogpost
 from pybossa.util import (Pagination, admin_required, get_user_id_or_ip, rank,
                           handle_content_type, redirect_content_type,
-                          get_avatar_url, fuzzyboolean)
+                          get_avatar_url, fuzzyboolean, get_etag, set_etag,
+                          not_modified)
 from pybossa.auth import ensure_authorized_to
 from pybossa.cache import projects as cached_projects
 from pybossa.cache import users as cached_users
@@ -144,6 +145,16 @@ def project_by_shortname(short_name):
         return abort(404)
 
 
+def project_etag(project, owner, ps):
+    """Return the ETag of the pages built from a project, its owner and
+    its stats.
+
+    Contributing updates the project, so the ETag also changes when the
+    contribute button of the user might."""
+    return get_etag(project.dictize(), owner.dictize(),
+                    ps.dictize() if ps else None, csrf=True)
+
+
 def pro_features(owner=None):
     feature_handler = ProFeatureHandler(current_app.config.get('PRO_FEATURES'))
     pro = {
@@ -583,6 +594,11 @@ def details(short_name):
     else:
         ensure_authorized_to('read', project)
 
+    etag = project_etag(project, owner, ps)
+    response = not_modified(etag)
+    if response is not None:
+        return response
+
     template = '/projects/project.html'
     pro = pro_features()
 
@@ -606,7 +622,7 @@ def details(short_name):
         template_args['ckan_url'] = current_app.config.get('CKAN_URL')
         template_args['ckan_pkg_name'] = short_name
     response = dict(template=template, **template_args)
-    return handle_content_type(response)
+    return set_etag(handle_content_type(response), etag)
 
 
 @blueprint.route('/<short_name>/settings')
@@ -1236,6 +1252,11 @@ def show_stats(short_name):
     else:
         ensure_authorized_to('read', project)
 
+    etag = project_etag(project, owner, ps)
+    response = not_modified(etag)
+    if response is not None:
+        return response
+
     project_sanitized, owner_sanitized = sanitize_project_owner(project,
                                                                 owner,
                                                                 current_user,
@@ -1253,7 +1274,7 @@ def show_stats(short_name):
                         n_volunteers=ps.n_volunteers,
                         n_completed_tasks=ps.n_completed_tasks,
                         pro_features=pro)
-        return handle_content_type(response)
+        return set_etag(handle_content_type(response), etag)
 
     dates_stats = ps.info['dates_stats']
     hours_stats = ps.info['hours_stats']
@@ -1314,7 +1335,7 @@ def show_stats(short_name):
                     avg_contrib_time=formatted_contrib_time,
                     pro_features=pro)
 
-    return handle_content_type(response)
+    return set_etag(handle_content_type(response), etag)
 
 
 @blueprint.route('/<short_name>/tasks/settings')
@@ -0,0 +1,67 @@
+# -*- coding: utf8 -*-
+# This file is part of PYBOSSA.
+#
+# Copyright (C) 2015 Scifabric LTD.
+#
+# PYBOSSA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PYBOSSA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+from default import flask_app, with_request_context
+from mock import patch, MagicMock
+from yacryptopan import CryptoPAn
+from pybossa.anonymizer import Anonymizer
+from pybossa.util import get_user_id_or_ip
+
+
+class TestAnonymizer(object):
+
+    @patch('pybossa.anonymizer.CryptoPAn')
+    def test_key_is_expanded_once(self, cryptopan):
+        """Test anonymizer expands the key once and anonymizes an IP once."""
+        cryptopan.return_value.anonymize.side_effect = lambda ip: 'anon' + ip
+        app = MagicMock()
+        app.config = dict(CRYPTOPAN_KEY='32-char-str-for-AES-key-and-pad.',
+                          ANONYMIZER_CACHE_SIZE=2)
+        ip_anonymizer = Anonymizer()
+        ip_anonymizer.init_app(app)
+
+        for ip in ['10.0.0.1', '10.0.0.1', '10.0.0.2', '10.0.0.1']:
+            assert ip_anonymizer.ip(ip) == 'anon' + ip
+
+        assert cryptopan.call_count == 1, cryptopan.call_count
+        anonymize = cryptopan.return_value.anonymize
+        assert anonymize.call_count == 2, anonymize.call_count
+
+    def test_anonymized_ips_are_bounded(self):
+        """Test anonymizer only remembers ANONYMIZER_CACHE_SIZE IPs."""
+        app = MagicMock()
+        app.config = dict(CRYPTOPAN_KEY='32-char-str-for-AES-key-and-pad.',
+                          ANONYMIZER_CACHE_SIZE=2)
+        ip_anonymizer = Anonymizer()
+        ip_anonymizer.init_app(app)
+
+        for i in range(10):
+            ip_anonymizer.ip('10.0.0.%d' % i)
+
+        assert ip_anonymizer.ip.cache_info().currsize == 2
+
+    @with_request_context
+    def test_get_user_id_or_ip_anonymous(self):
+        """Test get_user_id_or_ip anonymizes the IP with the app key."""
+        cp = CryptoPAn(str.encode(flask_app.config['CRYPTOPAN_KEY']))
+
+        with patch('pybossa.anonymizer.CryptoPAn') as cryptopan:
+            data = get_user_id_or_ip()
+
+        assert not cryptopan.called
+        assert data['user_id'] is None, data
+        assert data['user_ip'] == cp.anonymize('127.0.0.1'), data
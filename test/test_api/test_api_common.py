@@ -17,8 +17,9 @@
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 import json
 import datetime
-from default import with_context
+from default import db, with_context
 from nose.tools import assert_equal, assert_raises
+from sqlalchemy import event
 from test_api import TestAPI
 from pybossa.core import project_repo
 
@@ -31,6 +32,20 @@ class TestApiCommon(TestAPI):
     def setUp(self):
         super(TestApiCommon, self).setUp()
 
+    def get_counting_queries(self, url):
+        """Return the response to GET url and the number of queries run."""
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            res = self.app.get(url)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+        return res, len(statements)
+
     @with_context
     def test_limits_query(self):
         """Test API GET limits works"""
@@ -364,3 +379,35 @@ class TestApiCommon(TestAPI):
                      'Access-Control-Request-Headers': header}
             res = self.app.options('/api/project/1', headers=headers)
             assert res.headers['Access-Control-Allow-Headers'] == header, err_msg
+
+    @with_context
+    def test_related_queries_do_not_grow_with_the_page(self):
+        """Test API related and stats run the same queries for any page size"""
+        projects = ProjectFactory.create_batch(10)
+        for project in projects:
+            task = TaskFactory.create(project=project, n_answers=1)
+            TaskRunFactory.create(task=task, project=project)
+
+        for endpoint in ['task', 'taskrun', 'result', 'project']:
+            url = '/api/%s?related=True&stats=True&limit=%s'
+            res, few = self.get_counting_queries(url % (endpoint, 2))
+            assert len(json.loads(res.data)) == 2, res.data
+            res, many = self.get_counting_queries(url % (endpoint, 10))
+            data = json.loads(res.data)
+            assert len(data) == 10, data
+            assert few == many, (endpoint, few, many)
+
+            for item in data:
+                if endpoint == 'task':
+                    assert len(item['task_runs']) == 1, item
+                    assert item['task_runs'][0]['task_id'] == item['id']
+                    assert item['result']['task_id'] == item['id'], item
+                if endpoint == 'taskrun':
+                    assert item['task']['id'] == item['task_id'], item
+                    assert item['result']['task_id'] == item['task_id']
+                if endpoint == 'result':
+                    assert item['task']['id'] == item['task_id'], item
+                    assert [tr['id'] for tr in item['task_runs']] == \
+                        item['task_run_ids'], item
+                if endpoint == 'project':
+                    assert item['stats']['project_id'] == item['id'], item
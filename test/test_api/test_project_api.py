@@ -266,6 +266,62 @@ class TestProjectAPI(TestAPI):
         assert data[0]['short_name'] == 'test-app', data
         assert data[0]['name'] == 'My New Project', data
 
+    @with_context
+    def test_project_get_etag(self):
+        """Test API project GET answers If-None-Match with 304"""
+        owner = UserFactory.create()
+        project = ProjectFactory.create(owner=owner)
+        url = '/api/project/%s' % project.id
+
+        res = self.app.get(url)
+        etag = res.headers.get('ETag')
+        assert res.status_code == 200, res.status_code
+        assert etag.startswith('W/"'), etag
+        assert res.headers['Cache-Control'] == 'public, no-cache', res.headers
+
+        res = self.app.get(url, headers=[('If-None-Match', etag)])
+        assert res.status_code == 304, res.status_code
+        assert res.data == b'', res.data
+        assert res.headers.get('ETag') == etag, res.headers
+
+        # The owner gets another representation
+        res = self.app.get(url + '?api_key=' + owner.api_key,
+                           headers=[('If-None-Match', etag)])
+        assert res.status_code == 200, res.status_code
+        assert res.headers['Cache-Control'] == 'private, no-cache', res.headers
+
+        project.name = 'A new name'
+        project_repo.update(project)
+        res = self.app.get(url, headers=[('If-None-Match', etag)])
+        assert res.status_code == 200, res.status_code
+        assert res.headers.get('ETag') != etag, res.headers
+        assert json.loads(res.data)['name'] == 'A new name', res.data
+
+        # Lists of items too
+        url = '/api/project?id=%s' % project.id
+        etag = self.app.get(url).headers.get('ETag')
+        res = self.app.get(url, headers=[('If-None-Match', etag)])
+        assert res.status_code == 304, res.status_code
+        res = self.app.get(url + '&stats=1', headers=[('If-None-Match', etag)])
+        assert res.status_code == 200, res.status_code
+        assert 'ETag' not in res.headers, res.headers
+
+    @with_context
+    @patch('pybossa.repositories.Repository._fingerprint')
+    def test_project_get_hashes_rows_once(self, fingerprint):
+        """Test API project GET only runs the hash query for If-None-Match"""
+        ProjectFactory.create_batch(2)
+        url = '/api/project'
+
+        res = self.app.get(url)
+        assert res.status_code == 200, res.status_code
+        assert not fingerprint.called
+
+        fingerprint.return_value = []
+        res = self.app.get(url, headers=[('If-None-Match', 'W/"etag"')])
+        assert res.status_code == 200, res.status_code
+        assert fingerprint.call_count == 1, fingerprint.call_count
+
     @with_context
     def test_query_project_with_context(self):
         """Test API query for project endpoint with context works"""
@@ -990,6 +1046,74 @@ class TestProjectAPI(TestAPI):
         res = self.app.get(url)
         assert res.data == b'{}', res.data
 
+    @ with_context
+    def test_prefetch(self):
+        """Test API project prefetch returns a batch of leased tasks"""
+        project = ProjectFactory.create()
+        tasks = TaskFactory.create_batch(3, project=project)
+        user = UserFactory.create()
+
+        url = '/api/project/%s/prefetch?limit=2&api_key=%s' % (project.id,
+                                                                user.api_key)
+        res = self.app.get(url)
+        data = json.loads(res.data)
+
+        assert res.mimetype == 'application/json', res
+        assert len(data['tasks']) == 2, data
+        for task in data['tasks']:
+            assert task['project_id'] == project.id, task
+            assert str(task['id']) in data['lease_expires'], data
+
+        # Every prefetched task can be answered
+        for task in data['tasks']:
+            taskrun = dict(project_id=project.id, task_id=task['id'],
+                           info='answer')
+            url = '/api/taskrun?api_key=%s' % user.api_key
+            res = self.app.post(url, data=json.dumps(taskrun))
+            assert res.status_code == 200, res.data
+
+    @ with_context
+    def test_prefetch_default_limit(self):
+        """Test API project prefetch returns PREFETCH_LIMIT tasks by default"""
+        project = ProjectFactory.create()
+        TaskFactory.create_batch(60, project=project)
+
+        res = self.app.get('/api/project/%s/prefetch' % project.id)
+        data = json.loads(res.data)
+
+        assert len(data['tasks']) == 50, len(data['tasks'])
+
+    @ with_context
+    def test_prefetch_non_existing_project(self):
+        """Test API project prefetch returns 404 for a missing project"""
+        res = self.app.get('/api/project/5000/prefetch')
+        err = json.loads(res.data)
+
+        assert err['status_code'] == 404, err
+        assert err['target'] == 'project', err
+
+    @ with_context
+    def test_release_unused_leases(self):
+        """Test API project release removes the leases of prefetched tasks"""
+        project = ProjectFactory.create()
+        TaskFactory.create_batch(3, project=project)
+        user = UserFactory.create()
+        url = '/api/project/%s/prefetch?limit=3&api_key=%s' % (project.id,
+                                                                user.api_key)
+        tasks = json.loads(self.app.get(url).data)['tasks']
+        task_ids = [task['id'] for task in tasks[1:]]
+
+        url = '/api/project/%s/release?api_key=%s' % (project.id,
+                                                      user.api_key)
+        res = self.app.post(url, data=json.dumps(dict(task_ids=task_ids)))
+
+        assert json.loads(res.data) == dict(released=2), res.data
+        taskrun = dict(project_id=project.id, task_id=task_ids[0],
+                       info='answer')
+        url = '/api/taskrun?api_key=%s' % user.api_key
+        res = self.app.post(url, data=json.dumps(taskrun))
+        assert res.status_code == 403, res.data
+
     @ with_context
     @ patch('pybossa.repositories.project_repository.uploader')
     def test_project_delete_deletes_zip_files(self, uploader):
@@ -132,6 +132,37 @@ class TestResultAPI(TestAPI):
         # The output should have a mime-type: application/json
         assert res.mimetype == 'application/json', res
 
+    @with_context
+    def test_result_query_ndjson(self):
+        """ Test API Result query streams NDJSON"""
+        self.create_result(n_results=3, n_answers=1)
+        res = self.app.get('/api/result?related=True',
+                           headers=[('Accept', 'application/x-ndjson')])
+        assert res.mimetype == 'application/x-ndjson', res
+        results = [json.loads(line) for line in
+                   res.data.decode('utf-8').splitlines()]
+        assert [r['task_id'] for r in results] == [1, 2, 3], results
+        for result in results:
+            assert result['task']['id'] == result['task_id'], result
+            assert len(result['task_runs']) == 1, result
+
+    @with_context
+    def test_result_query_etag(self):
+        """ Test API Result query answers If-None-Match with 304"""
+        result = self.create_result(n_results=2, n_answers=1)
+        url = '/api/result?project_id=%s' % result.project_id
+        etag = self.app.get(url).headers.get('ETag')
+
+        res = self.app.get(url, headers=[('If-None-Match', etag)])
+        assert res.status_code == 304, res.status_code
+
+        result.info = dict(answer='yes')
+        self.result_repo.update(result)
+        res = self.app.get(url, headers=[('If-None-Match', etag)])
+        assert res.status_code == 200, res.status_code
+        assert res.headers.get('ETag') != etag, res.headers
+        assert len(json.loads(res.data)) == 2, res.data
+
     @with_context
     def test_result_query_without_params_with_context(self):
         """ Test API Result query with context."""
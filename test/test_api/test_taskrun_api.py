@@ -1510,3 +1510,163 @@ class TestTaskrunAPI(TestAPI):
         data = json.loads(res.data)
         assert res.status_code == 400, data
         assert data['exception_msg'] == 'Reserved keys in payload', data
+
+    @with_context
+    def test_taskrun_bulk_post(self):
+        """Test API TaskRun bulk POST stores every task run"""
+        project = ProjectFactory.create()
+        tasks = TaskFactory.create_batch(3, project=project, n_answers=1)
+        user = UserFactory.create()
+        url = '/api/project/%s/prefetch?limit=3&api_key=%s' % (project.id,
+                                                                user.api_key)
+        self.app.get(url)
+        data = [dict(project_id=project.id, task_id=task.id, info=task.id)
+                for task in tasks]
+
+        url = '/api/taskrun/bulk?api_key=%s' % user.api_key
+        res = self.app.post(url, data=json.dumps(data))
+        taskruns = json.loads(res.data)
+
+        assert res.status_code == 200, res.data
+        assert [tr['task_id'] for tr in taskruns] == [t.id for t in tasks]
+        for taskrun in taskruns:
+            assert taskrun['id'] is not None, taskrun
+            assert taskrun['user_id'] == user.id, taskrun
+            assert taskrun['info'] == taskrun['task_id'], taskrun
+        assert task_repo.count_task_runs_with(project_id=project.id) == 3
+
+    @with_context
+    def test_taskrun_bulk_post_completes_tasks_and_creates_results(self):
+        """Test API TaskRun bulk POST runs the completion bookkeeping"""
+        project = ProjectFactory.create()
+        done, pending = TaskFactory.create_batch(2, project=project,
+                                                 n_answers=1)
+        pending.n_answers = 2
+        task_repo.update(pending)
+        user = UserFactory.create()
+        url = '/api/project/%s/prefetch?limit=2&api_key=%s' % (project.id,
+                                                                user.api_key)
+        self.app.get(url)
+        data = [dict(project_id=project.id, task_id=task.id, info='answer')
+                for task in (done, pending)]
+
+        url = '/api/taskrun/bulk?api_key=%s' % user.api_key
+        res = self.app.post(url, data=json.dumps(data))
+        taskruns = json.loads(res.data)
+
+        assert res.status_code == 200, res.data
+        assert task_repo.get_task(done.id).state == 'completed'
+        assert task_repo.get_task(pending.id).state == 'ongoing'
+        result = result_repo.get_by(task_id=done.id, last_version=True)
+        assert result.task_run_ids == [taskruns[0]['id']], result
+        assert result_repo.get_by(task_id=pending.id) is None
+        assert user.notified_at is None
+
+    @with_context
+    def test_taskrun_bulk_post_requires_newtask_first(self):
+        """Test API TaskRun bulk POST fails if a task was not requested"""
+        project = ProjectFactory.create()
+        task1, task2 = TaskFactory.create_batch(2, project=project)
+        user = UserFactory.create()
+        url = '/api/project/%s/newtask?api_key=%s' % (project.id,
+                                                      user.api_key)
+        self.app.get(url)
+        data = [dict(project_id=project.id, task_id=task.id, info='answer')
+                for task in (task1, task2)]
+
+        url = '/api/taskrun/bulk?api_key=%s' % user.api_key
+        res = self.app.post(url, data=json.dumps(data))
+        err = json.loads(res.data)
+
+        assert res.status_code == 403, res.data
+        assert err['exception_msg'] == 'You must request a task first!', err
+        assert err['target'] == 'taskrun', err
+        assert task_repo.count_task_runs_with(project_id=project.id) == 0
+
+    @with_context
+    def test_taskrun_bulk_post_with_bad_payloads(self):
+        """Test API TaskRun bulk POST rejects invalid payloads"""
+        project = ProjectFactory.create()
+        task = TaskFactory.create(project=project)
+        url = '/api/taskrun/bulk'
+
+        res = self.app.post(url, data=json.dumps(dict(task_id=task.id)))
+        assert res.status_code == 400, res.data
+
+        res = self.app.post(url, data=json.dumps([]))
+        assert res.status_code == 400, res.data
+
+        data = [dict(project_id=project.id, task_id=task.id)] * 2
+        res = self.app.post(url, data=json.dumps(data))
+        assert res.status_code == 400, res.data
+
+        data = [dict(project_id=project.id, task_id=task.id, id=3)]
+        res = self.app.post(url, data=json.dumps(data))
+        err = json.loads(res.data)
+        assert res.status_code == 400, res.data
+        assert err['exception_msg'] == 'Reserved keys in payload', err
+
+    @with_context
+    def test_taskrun_query_with_cursor(self):
+        """Test API TaskRun query follows the next cursor for any orderby"""
+        date = '2014-01-01T14:37:30.642119'
+        TaskRunFactory.create_batch(4, created=date)
+        TaskRunFactory.create_batch(3)
+
+        for orderby, desc in [('id', False), ('created', False),
+                              ('created', True)]:
+            url = '/api/taskrun?all=1&limit=2&orderby=%s&desc=%s' % (
+                orderby, desc)
+            res = self.app.get(url)
+            taskruns = json.loads(res.data)
+            expected = [tr['id'] for tr in json.loads(self.app.get(
+                url.replace('limit=2', 'limit=100')).data)]
+            ids = [tr['id'] for tr in taskruns]
+            pages = 1
+            while 'next' in res.headers.get('Link', ''):
+                next_url = res.headers['Link'].split(';')[0][1:-1]
+                assert 'cursor=' in next_url, next_url
+                res = self.app.get(next_url)
+                ids += [tr['id'] for tr in json.loads(res.data)]
+                pages += 1
+            assert len(expected) == 7, expected
+            assert ids == expected, (orderby, desc, ids, expected)
+            assert pages == 4, pages
+
+    @with_context
+    def test_taskrun_query_with_invalid_cursor(self):
+        """Test API TaskRun query with an invalid or foreign cursor fails"""
+        TaskRunFactory.create_batch(3)
+        res = self.app.get('/api/taskrun?cursor=notacursor')
+        err = json.loads(res.data)
+        assert res.status_code == 400, res.data
+        assert err['exception_msg'] == 'Invalid cursor', err
+
+        res = self.app.get('/api/taskrun?limit=1&orderby=created')
+        cursor = res.headers['Link'].split('cursor=')[1].split('>')[0]
+        res = self.app.get('/api/taskrun?orderby=id&cursor=%s' % cursor)
+        assert res.status_code == 400, res.data
+
+    @with_context
+    def test_taskrun_query_ndjson(self):
+        """Test API TaskRun query streams NDJSON without the limit cap"""
+        project = ProjectFactory.create()
+        TaskRunFactory.create_batch(110, project=project)
+
+        headers = [('Accept', 'application/x-ndjson')]
+        res = self.app.get('/api/taskrun?project_id=%s' % project.id,
+                           headers=headers)
+        assert res.mimetype == 'application/x-ndjson', res
+        lines = res.data.decode('utf-8').splitlines()
+        taskruns = [json.loads(line) for line in lines]
+        assert len(taskruns) == 110, len(taskruns)
+        assert [tr['id'] for tr in taskruns] == sorted(
+            tr.id for tr in project.task_runs), taskruns
+        assert taskruns[0]['links'], taskruns[0]
+
+        res = self.app.get('/api/taskrun?limit=5', headers=headers)
+        assert len(res.data.decode('utf-8').splitlines()) == 5, res.data
+
+        # JSON is still the default
+        res = self.app.get('/api/taskrun')
+        assert res.mimetype == 'application/json', res
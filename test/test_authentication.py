@@ -17,8 +17,10 @@
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 
 import jwt
+import time
 from default import Test, with_context
 from pybossa.auth import jwt_authorize_project
+from pybossa.core import user_repo
 from pybossa.auth import handle_error as handle_error_upstream
 from pybossa.auth.errcodes import *
 from factories import ProjectFactory
@@ -35,6 +37,19 @@ class TestAuthentication(Test):
         assert '<a href="/account/signout"' in str(res.data), res.data
         assert 'checkpoint::logged-in::tester' in str(res.data), res.data
 
+    @with_context
+    def test_api_authenticate_reset_api_key(self):
+        """Test AUTHENTICATION does not accept an API key after it is reset"""
+        self.create()
+        user = user_repo.get_by(api_key=self.api_key)
+        user.api_key = 'new-api-key'
+        user_repo.update(user)
+
+        res = self.app.get('/?api_key=%s' % self.api_key)
+        assert 'checkpoint::logged-in::tester' not in str(res.data), res.data
+        res = self.app.get('/?api_key=new-api-key')
+        assert 'checkpoint::logged-in::tester' in str(res.data), res.data
+
 
 def handle_error(error):
     return error
@@ -129,3 +144,43 @@ class TestJwtAuthorization(Test):
         bearer = 'Bearer {}'.format(token.decode('utf-8'))
         res = jwt_authorize_project(project, bearer)
         assert res is True, res
+
+    @with_context
+    @patch('pybossa.auth.jwt.decode', wraps=jwt.decode)
+    def test_jwt_authorize_verifies_token_once(self, mydecode):
+        """Test JWT verified tokens are trusted until the secret changes."""
+        project = ProjectFactory.create()
+        token = jwt.encode({'short_name': project.short_name,
+                            'project_id': project.id},
+                            project.secret_key, algorithm='HS256')
+        bearer = 'Bearer {}'.format(token.decode('utf-8'))
+
+        assert jwt_authorize_project(project, bearer) is True
+        assert jwt_authorize_project(project, bearer) is True
+        assert mydecode.call_count == 1, mydecode.call_count
+
+        project.secret_key = 'new-secret'
+        with patch('pybossa.auth.handle_error') as mymock:
+            mymock.side_effect = handle_error
+            res = jwt_authorize_project(project, bearer)
+        assert res == DECODE_ERROR_SIGNATURE, res
+        assert mydecode.call_count == 2, mydecode.call_count
+
+    @with_context
+    @patch('pybossa.auth.jwt.decode', wraps=jwt.decode)
+    def test_jwt_authorize_verifies_token_again_once_expired(self, mydecode):
+        """Test JWT verified tokens are not trusted after their exp."""
+        project = ProjectFactory.create()
+        exp = int(time.time()) + 60
+        token = jwt.encode({'short_name': project.short_name,
+                            'project_id': project.id, 'exp': exp},
+                            project.secret_key, algorithm='HS256')
+        bearer = 'Bearer {}'.format(token.decode('utf-8'))
+
+        assert jwt_authorize_project(project, bearer) is True
+        assert jwt_authorize_project(project, bearer) is True
+        assert mydecode.call_count == 1, mydecode.call_count
+
+        with patch('pybossa.cache.local.time.time', return_value=exp + 1):
+            assert jwt_authorize_project(project, bearer) is True
+        assert mydecode.call_count == 2, mydecode.call_count
@@ -18,10 +18,11 @@
 
 from default import assert_not_raises
 from mock import Mock, patch, PropertyMock
-from pybossa.auth import ensure_authorized_to, is_authorized
+from pybossa.auth import ensure_authorized_to, is_authorized, authorize_many
 from nose.tools import assert_raises
 from werkzeug.exceptions import Forbidden, Unauthorized
 from pybossa.model.user import User
+from pybossa.model.task_run import TaskRun
 
 
 def mock_current_user(anonymous=True, admin=None, id=None, pro=False):
@@ -120,3 +121,31 @@ class TestAuthorizationFunctions(object):
 
         auth_factory.assert_called_with('token')
         authorizer.can.assert_called_with(user, 'read', 'token')
+
+    @patch('pybossa.auth.current_user', new=mock_authenticated)
+    @patch('pybossa.auth._authorizer_for')
+    def test_authorize_many_decides_once_per_project(self, auth_factory):
+        authorizer = Mock()
+        authorizer.specific_actions = []
+        authorizer.project_scoped_actions = ['read']
+        authorizer.can.side_effect = lambda user, action, taskrun: (
+            taskrun.project_id == 1)
+        auth_factory.return_value = authorizer
+        taskruns = [TaskRun(project_id=1), TaskRun(project_id=2),
+                    TaskRun(project_id=1), TaskRun(project_id=2)]
+
+        assert authorize_many('read', taskruns) == [True, False, True, False]
+        assert authorizer.can.call_count == 2, authorizer.can.call_args_list
+
+    @patch('pybossa.auth.current_user', new=mock_authenticated)
+    @patch('pybossa.auth._authorizer_for')
+    def test_authorize_many_decides_each_other_action(self, auth_factory):
+        authorizer = Mock()
+        authorizer.specific_actions = []
+        authorizer.project_scoped_actions = ['read']
+        authorizer.can.return_value = True
+        auth_factory.return_value = authorizer
+        taskruns = [TaskRun(project_id=1), TaskRun(project_id=1)]
+
+        assert authorize_many('update', taskruns) == [True, True]
+        assert authorizer.can.call_count == 2, authorizer.can.call_args_list
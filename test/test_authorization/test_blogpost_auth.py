@@ -17,13 +17,15 @@
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 
 from default import Test, assert_not_raises, with_context
-from pybossa.auth import ensure_authorized_to
+from default import with_request_context
+from pybossa.auth import ensure_authorized_to, is_authorized, authorize_many
 from nose.tools import assert_raises
 from werkzeug.exceptions import Forbidden, Unauthorized
 from mock import patch
 from test_authorization import mock_current_user
 from factories import ProjectFactory, BlogpostFactory, UserFactory
 from pybossa.model.blogpost import Blogpost
+from pybossa.core import project_repo
 
 
 
@@ -379,3 +381,23 @@ class TestBlogpostAuthorization(Test):
 
         assert self.mock_admin.id != blogpost.owner.id
         assert_not_raises(Exception, ensure_authorized_to, 'delete', blogpost)
+
+    @with_request_context
+    @patch('pybossa.auth.current_user', new=mock_anonymous)
+    def test_read_blogposts_looks_up_each_project_once(self):
+        """Test reading blogposts of a project looks the project up once
+        per request"""
+
+        published = ProjectFactory.create(published=True)
+        draft = ProjectFactory.create(published=False)
+        blogposts = (BlogpostFactory.create_batch(3, project=published) +
+                     BlogpostFactory.create_batch(2, project=draft))
+
+        with patch('pybossa.auth.project_repo.get',
+                   wraps=project_repo.get) as get:
+            authorized = authorize_many('read', blogposts)
+            assert authorized == [True] * 3 + [False] * 2, authorized
+            assert get.call_count == 2, get.call_args_list
+
+            assert is_authorized(self.mock_anonymous, 'read', blogposts[0])
+            assert get.call_count == 2, get.call_args_list
@@ -17,9 +17,11 @@
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 
 import hashlib
+import time
 from mock import patch
 from pybossa.cache import (get_key_to_hash, get_hash_key, cache, memoize,
-                           delete_cached, delete_memoized)
+                           delete_cached, delete_memoized,
+                           delete_memoized_project)
 from pybossa.sentinel import Sentinel
 from settings_test import REDIS_SENTINEL, REDIS_KEYPREFIX
 
@@ -246,7 +248,7 @@ class TestCacheMemoizeFunctions(object):
         def my_func(*args, **kwargs):
             return [args, kwargs]
         my_func('arg', kwarg='kwarg')
-        assert len(list(test_sentinel.master.keys())) == 1
+        assert len(list(test_sentinel.master.keys())) == 2
 
         delete_succedeed = delete_memoized(my_func, 'arg', kwarg='kwarg')
         assert delete_succedeed is True, delete_succedeed
@@ -260,11 +262,11 @@ class TestCacheMemoizeFunctions(object):
         def my_func(*args, **kwargs):
             return [args, kwargs]
         my_func('arg', kwarg='kwarg')
-        assert len(list(test_sentinel.master.keys())) == 1
+        assert len(list(test_sentinel.master.keys())) == 2
 
         delete_succedeed = delete_memoized(my_func, 'badarg', kwarg='barkwarg')
         assert delete_succedeed is False, delete_succedeed
-        assert len(list(test_sentinel.master.keys())) == 1, 'Key was unexpectedly deleted'
+        assert len(list(test_sentinel.master.keys())) == 2, 'Key was unexpectedly deleted'
 
 
     def test_delete_memoized_deletes_only_requested(self):
@@ -276,11 +278,11 @@ class TestCacheMemoizeFunctions(object):
             return [args, kwargs]
         my_func('arg', kwarg='kwarg')
         my_func('other', kwarg='other')
-        assert len(list(test_sentinel.master.keys())) == 2
+        assert len(list(test_sentinel.master.keys())) == 3
 
         delete_succedeed = delete_memoized(my_func, 'arg', kwarg='kwarg')
         assert delete_succedeed is True, delete_succedeed
-        assert len(list(test_sentinel.master.keys())) == 1, 'Everything was deleted!'
+        assert len(list(test_sentinel.master.keys())) == 2, 'Everything was deleted!'
 
 
     def test_delete_memoized_deletes_all_function_calls(self):
@@ -296,8 +298,215 @@ class TestCacheMemoizeFunctions(object):
         my_func('arg', kwarg='kwarg')
         my_func('other', kwarg='other')
         my_other_func('arg', kwarg='kwarg')
-        assert len(list(test_sentinel.master.keys())) == 3
+        assert len(list(test_sentinel.master.keys())) == 5
 
         delete_succedeed = delete_memoized(my_func)
         assert delete_succedeed is True, delete_succedeed
-        assert len(list(test_sentinel.master.keys())) == 1
+        assert len(list(test_sentinel.master.keys())) == 2
+        assert not test_sentinel.master.keys('*my_func*'), \
+            test_sentinel.master.keys()
+
+
+    def test_memoize_many_stores_every_value_in_the_cache(self):
+        """Test CACHE memoize many stores a key per argument, the same one a
+        single call uses"""
+
+        calls = []
+
+        @memoize()
+        def my_func(arg):
+            calls.append(arg)
+            return arg * 2
+        values = my_func.many([1, 2, 2])
+
+        assert values == {1: 2, 2: 4}, values
+        assert len(test_sentinel.master.keys()) == 3
+        assert my_func(2) == 4
+        assert calls == [1, 2], calls
+
+    def test_memoize_many_computes_only_misses_with_batch_loader(self):
+        """Test CACHE memoize many calls the batch loader only for the
+        arguments missing in the cache"""
+        calls = []
+
+        @memoize()
+        def my_func(arg):
+            return arg * 2
+
+        @my_func.batch
+        def my_func_many(args):
+            calls.append(args)
+            return dict((arg, arg * 2) for arg in args)
+        my_func(1)
+        values = my_func.many([1, 2, 3])
+
+        assert values == {1: 2, 2: 4, 3: 6}, values
+        assert calls == [[2, 3]], calls
+        assert my_func.many([1, 2, 3]) == values
+        assert calls == [[2, 3]], calls
+
+    def test_memoize_stale_value_is_refreshed_by_one_caller(self):
+        """Test CACHE memoize with stale recomputes an expired value once and
+        returns the stale value while the refresh lock is held"""
+        calls = []
+
+        @memoize(timeout=10, stale=60)
+        def my_func(arg):
+            calls.append(arg)
+            return len(calls)
+        now = time.time()
+        assert my_func('arg') == 1
+
+        with patch('pybossa.cache.time') as fake_time:
+            fake_time.time.return_value = now + 20
+            key = test_sentinel.master.keys('*my_func_args*')[0]
+            test_sentinel.master.set(key + b':refresh', 1)
+            assert my_func('arg') == 1
+            test_sentinel.master.delete(key + b':refresh')
+            assert my_func('arg') == 2
+        assert my_func('arg') == 2
+        assert test_sentinel.master.ttl(key) > 10
+
+    def test_memoize_stale_ignores_values_cached_without_stale(self):
+        """Test CACHE memoize with stale computes again the values cached
+        before stale was set on the function"""
+        @memoize(timeout=10)
+        def my_func(arg):
+            return ({}, [], [])
+        my_func('arg')
+
+        @memoize(timeout=10, stale=60)
+        def my_func(arg):
+            return ({'n_auth': 1}, [], [[1, 1]])
+
+        assert my_func.many(['arg']) == {'arg': my_func('arg')}
+        assert my_func('arg') == ({'n_auth': 1}, [], [[1, 1]])
+
+    def test_memoize_stale_ignores_old_pairs(self):
+        """Test CACHE memoize with stale does not take an old two elements
+        value for a value with its soft expiration"""
+        @memoize(timeout=10)
+        def my_func(arg):
+            return ['a', 'b']
+        my_func('arg')
+
+        @memoize(timeout=10, stale=60)
+        def my_func(arg):
+            return ['c', 'd']
+
+        assert my_func('arg') == ['c', 'd'], my_func('arg')
+
+    @patch('pybossa.cache._enqueue_refresh')
+    def test_memoize_stale_value_is_refreshed_in_background(self, enqueue):
+        """Test CACHE memoize with background enqueues the refresh and returns
+        the stale value"""
+        @memoize(timeout=10, stale=60, background=True)
+        def my_func(arg, calls=[]):
+            calls.append(arg)
+            return len(calls)
+        now = time.time()
+        my_func('arg')
+
+        with patch('pybossa.cache.time') as fake_time:
+            fake_time.time.return_value = now + 20
+            assert my_func('arg') == 1
+            assert my_func('arg') == 1
+
+        enqueue.assert_called_once_with(my_func, ('arg',), {})
+        assert my_func.refresh('arg') == 2
+        assert my_func('arg') == 2
+
+
+    def test_memoize_tags_keys_with_function_and_project(self):
+        """Test CACHE memoize adds every key to its function tag, and to its
+        project tag with project=True"""
+
+        @memoize(project=True)
+        def my_func(project_id, page=1):
+            return [project_id, page]
+        my_func(1)
+        my_func(1, page=2)
+        my_func(2)
+
+        function_tag = '%s:tags:function:my_func' % REDIS_KEYPREFIX
+        project_tag = '%s:tags:project:1' % REDIS_KEYPREFIX
+        assert test_sentinel.master.zcard(function_tag) == 3
+        assert test_sentinel.master.zcard(project_tag) == 2
+        assert test_sentinel.master.ttl(project_tag) > 0
+
+    def test_memoize_prunes_expired_keys_from_tags(self):
+        """Test CACHE memoize removes the expired keys from the tags when it
+        adds a new one"""
+
+        @memoize(timeout=10)
+        def my_func(arg):
+            return arg
+        now = time.time()
+        my_func(1)
+        my_func(2)
+
+        with patch('pybossa.cache.time') as fake_time:
+            fake_time.time.return_value = now + 20
+            my_func(3)
+
+        function_tag = '%s:tags:function:my_func' % REDIS_KEYPREFIX
+        assert test_sentinel.master.zcard(function_tag) == 1
+
+    @patch('pybossa.cache.TAG_BATCH_SIZE', 2)
+    def test_delete_memoized_deletes_tags_in_batches(self):
+        """Test CACHE delete_memoized deletes the keys of a tag in batches,
+        along with the keys of the set the tag was kept in before"""
+
+        @memoize()
+        def my_func(arg):
+            return arg
+        for arg in range(5):
+            my_func(arg)
+        legacy_tag = '%s:tag:function:my_func' % REDIS_KEYPREFIX
+        test_sentinel.master.set('legacy_key', 1)
+        test_sentinel.master.sadd(legacy_tag, 'legacy_key')
+
+        with patch.object(test_sentinel.master, 'unlink',
+                          wraps=test_sentinel.master.unlink) as unlink:
+            assert delete_memoized(my_func) is True
+
+        # Three batches and the tag, then the legacy key and set
+        assert unlink.call_count == 6, unlink.call_args_list
+        assert test_sentinel.master.keys() == [], test_sentinel.master.keys()
+
+    def test_delete_memoized_project_deletes_only_project_keys(self):
+        """Test CACHE delete_memoized_project deletes every key tagged with
+        the project, and only those"""
+
+        @memoize(project=True)
+        def my_func(project_id):
+            return project_id
+
+        @memoize(project=True)
+        def my_other_func(project_id):
+            return project_id
+        my_func(1)
+        my_other_func(1)
+        my_func(2)
+
+        delete_succedeed = delete_memoized_project(1)
+
+        assert delete_succedeed is True, delete_succedeed
+        assert my_func.many([1, 2]) == {1: 1, 2: 2}
+        keys = test_sentinel.master.keys('*_args:*')
+        assert len(keys) == 2, keys
+        assert delete_memoized_project(3) is False
+
+    def test_delete_memoized_does_not_scan_keys(self):
+        """Test CACHE delete_memoized without arguments uses the function tag
+        instead of KEYS"""
+
+        @memoize()
+        def my_func(arg):
+            return arg
+        my_func(1)
+
+        with patch.object(test_sentinel.slave, 'keys') as keys:
+            assert delete_memoized(my_func) is True
+        assert not keys.called
+        assert test_sentinel.master.keys() == []
@@ -0,0 +1,104 @@
+# -*- coding: utf8 -*-
+# This file is part of PYBOSSA.
+#
+# Copyright (C) 2015 Scifabric LTD.
+#
+# PYBOSSA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PYBOSSA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import pickle
+from datetime import datetime
+from mock import patch
+from nose.tools import assert_raises
+from pybossa.cache import memoize
+from pybossa.cache.serialization import get_codec, PickleCodec, MsgpackCodec
+from pybossa.cache.serialization import RAW, ZLIB
+from pybossa.sentinel import Sentinel
+from settings_test import REDIS_SENTINEL
+
+
+class FakeApp(object):
+    def __init__(self):
+        self.config = { 'REDIS_SENTINEL': REDIS_SENTINEL }
+
+test_sentinel = Sentinel(app=FakeApp())
+
+
+class TestCodec(object):
+
+    value = dict(id=1, name='project', info=dict(tags=['a', 'b']),
+                 created=datetime(2019, 1, 1), pair=(1, 2), ids=set([1, 2]),
+                 by_id={1: 'one'}, n_tasks=None, ratio=0.5)
+
+    def test_get_codec(self):
+        """Test get_codec returns the codec selected in the settings"""
+        assert isinstance(get_codec(), PickleCodec)
+        assert isinstance(get_codec('msgpack'), MsgpackCodec)
+        assert_raises(ValueError, get_codec, 'json')
+        assert_raises(ValueError, get_codec, 'msgpack', 'bz2')
+
+    def test_msgpack_round_trip(self):
+        """Test MsgpackCodec loads values exactly as they were dumped"""
+        codec = MsgpackCodec()
+        data = codec.dumps(self.value)
+
+        assert data[:1] == RAW
+        assert codec.loads(data) == self.value
+
+    def test_msgpack_compresses_above_threshold(self):
+        """Test MsgpackCodec only compresses values bigger than threshold"""
+        codec = MsgpackCodec('zlib', threshold=100)
+        small = codec.dumps(dict(id=1))
+        big = codec.dumps(['project'] * 100)
+
+        assert small[:1] == RAW
+        assert big[:1] == ZLIB
+        assert len(big) < len(MsgpackCodec().dumps(['project'] * 100))
+        assert codec.loads(small) == dict(id=1)
+        assert codec.loads(big) == ['project'] * 100
+
+    def test_msgpack_loads_pickles(self):
+        """Test MsgpackCodec still loads the values written with pickle"""
+        codec = MsgpackCodec('zlib')
+
+        assert codec.loads(pickle.dumps(self.value)) == self.value
+
+
+class TestCachedCodec(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.cache = os.environ.pop('PYBOSSA_REDIS_CACHE_DISABLED', None)
+
+    @classmethod
+    def teardown_class(cls):
+        if cls.cache:
+            os.environ['PYBOSSA_REDIS_CACHE_DISABLED'] = cls.cache
+
+    def setUp(self):
+        test_sentinel.master.flushall()
+
+    @patch('pybossa.cache.codec', MsgpackCodec('zlib', threshold=10))
+    @patch('pybossa.cache.sentinel', new=test_sentinel)
+    def test_memoize_stores_with_configured_codec(self):
+        """Test memoize stores values with the configured codec"""
+        @memoize(stale=60)
+        def my_func(*args, **kwargs):
+            return dict(args=args, value='cached' * 10)
+
+        first = my_func('a')
+        second = my_func('a')
+        key = test_sentinel.master.keys('*my_func_args:*')[0]
+
+        assert first == second == dict(args=('a',), value='cached' * 10)
+        assert test_sentinel.master.get(key)[:1] == ZLIB
@@ -0,0 +1,137 @@
+# -*- coding: utf8 -*-
+# This file is part of PYBOSSA.
+#
+# Copyright (C) 2015 Scifabric LTD.
+#
+# PYBOSSA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PYBOSSA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+from mock import patch
+from pybossa.cache import memoize, delete_memoized
+from pybossa.cache.local import LocalCache
+from pybossa.sentinel import Sentinel
+from settings_test import REDIS_SENTINEL
+
+
+class FakeApp(object):
+    def __init__(self):
+        self.config = { 'REDIS_SENTINEL': REDIS_SENTINEL }
+
+test_sentinel = Sentinel(app=FakeApp())
+
+
+class TestLocalCache(object):
+
+    def test_get_returns_stored_value(self):
+        """Test LocalCache get returns the stored value or None"""
+        local = LocalCache(10, 60, 'channel')
+        local.set('key', b'value')
+
+        assert local.get('key') == b'value'
+        assert local.get('other') is None
+
+    def test_get_drops_expired_values(self):
+        """Test LocalCache get does not return values older than timeout"""
+        local = LocalCache(10, 60, 'channel')
+        local.set('key', b'value')
+
+        with patch('pybossa.cache.local.time.time',
+                   return_value=time.time() + 61):
+            assert local.get('key') is None
+
+    def test_set_evicts_least_recently_used(self):
+        """Test LocalCache keeps at most maxsize entries, dropping the least
+        recently used"""
+        local = LocalCache(2, 60, 'channel')
+        local.set('a', b'a')
+        local.set('b', b'b')
+        local.get('a')
+        local.set('c', b'c')
+
+        assert local.get('a') == b'a'
+        assert local.get('b') is None
+        assert local.get('c') == b'c'
+
+    def test_delete_with_wildcard_deletes_prefix(self):
+        """Test LocalCache delete of a key ending in * deletes every key with
+        that prefix"""
+        local = LocalCache(10, 60, 'channel')
+        local.set('func_args:1', b'1')
+        local.set('func_args:2', b'2')
+        local.set('other_args:1', b'3')
+
+        local.delete('func_args:*')
+
+        assert local.get('func_args:1') is None
+        assert local.get('func_args:2') is None
+        assert local.get('other_args:1') == b'3'
+
+    def test_disabled_without_timeout(self):
+        """Test LocalCache is disabled when timeout is 0"""
+        assert LocalCache(10, 0, 'channel').enabled is False
+        assert LocalCache(10, 5, 'channel').enabled is True
+
+
+@patch('pybossa.cache.sentinel', new=test_sentinel)
+class TestLocalCacheTier(object):
+
+    @classmethod
+    def setup_class(cls):
+        import os
+        cls.cache = os.environ.pop('PYBOSSA_REDIS_CACHE_DISABLED', None)
+
+    @classmethod
+    def teardown_class(cls):
+        if cls.cache:
+            import os
+            os.environ['PYBOSSA_REDIS_CACHE_DISABLED'] = cls.cache
+
+    def setUp(self):
+        test_sentinel.master.flushall()
+        self.local = LocalCache(10, 60, 'test:invalidate')
+        # Keep the subscriber thread from clearing the entries under test.
+        self.local.listen = lambda conn: None
+
+    def test_memoize_serves_hot_keys_from_memory(self):
+        """Test memoize reads values from the local tier before Redis"""
+        @memoize()
+        def my_func(arg, call_count=[]):
+            call_count.append(1)
+            return len(call_count)
+
+        with patch('pybossa.cache.local_cache', new=self.local):
+            my_func('arg')
+            with patch.object(test_sentinel.slave, 'get') as get:
+                assert my_func('arg') == 1
+                assert not get.called
+
+    def test_delete_memoized_invalidates_local_tier(self):
+        """Test delete_memoized drops the value from the local tier and
+        publishes the invalidation for other processes"""
+        @memoize()
+        def my_func(arg, call_count=[]):
+            call_count.append(1)
+            return len(call_count)
+        pubsub = test_sentinel.master.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe('test:invalidate')
+
+        with patch('pybossa.cache.local_cache', new=self.local):
+            my_func('arg')
+            delete_memoized(my_func, 'arg')
+            assert my_func('arg') == 2
+
+        message = None
+        for i in range(10):
+            message = message or pubsub.get_message(timeout=0.1)
+        assert b'my_func_args:' in message['data'], message
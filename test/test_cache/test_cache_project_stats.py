@@ -16,10 +16,13 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 
-from default import Test, with_context
+from default import Test, db, with_context
 from pybossa.cache.project_stats import *
 from factories import UserFactory, ProjectFactory, TaskFactory, \
     TaskRunFactory, AnonymousTaskRunFactory
+from pybossa.core import task_repo
+from pybossa.model.project_stats import ProjectHourlyStats, \
+    ProjectDailyContributor
 import pytz
 from datetime import date, datetime, timedelta
 
@@ -146,3 +149,63 @@ class TestProjectsStatsCache(Test):
         assert max_hours == 1
         assert max_hours_anon is None
         assert max_hours_auth == 1
+
+    @with_context
+    def test_contribution_rollups_follow_task_runs(self):
+        """Test CACHE PROJECT STATS rollups are updated as task runs are
+        saved and deleted."""
+        pr = ProjectFactory.create()
+        task = TaskFactory.create(project=pr, n_answers=2)
+        user = UserFactory.create()
+        TaskRunFactory.create(project=pr, task=task, user=user)
+        TaskRunFactory.create(project=pr, task=task, user=user)
+        extra = TaskRunFactory.create(project=pr, task=task)
+        AnonymousTaskRunFactory.create(project=pr)
+
+        hourly = db.session.query(ProjectHourlyStats).filter_by(
+            project_id=pr.id).all()
+        assert len(hourly) == 1, hourly
+        assert hourly[0].n_task_runs == 4, hourly[0].n_task_runs
+        assert hourly[0].n_auth == 3, hourly[0].n_auth
+        assert hourly[0].n_anon == 1, hourly[0].n_anon
+        assert hourly[0].n_completed == 1, hourly[0].n_completed
+        contributors = db.session.query(ProjectDailyContributor).filter_by(
+            project_id=pr.id, user_id=user.id).all()
+        assert len(contributors) == 1, contributors
+        assert contributors[0].n_task_runs == 2, contributors[0].n_task_runs
+
+        task_repo.delete(extra)
+        users, anon_users, auth_users = stats_users(pr.id)
+        assert users['n_auth'] == 1, users
+        assert auth_users == [[user.id, 2]], auth_users
+
+    @with_context
+    def test_contribution_rollups_forget_undone_completions(self):
+        """Test CACHE PROJECT STATS rollups stop counting a task as completed
+        when one of the task runs completing it is deleted."""
+        pr = ProjectFactory.create()
+        task = TaskFactory.create(project=pr, n_answers=2)
+        first = TaskRunFactory.create(project=pr, task=task)
+        TaskRunFactory.create(project=pr, task=task)
+
+        task_repo.delete(first)
+
+        hourly = db.session.query(ProjectHourlyStats).filter_by(
+            project_id=pr.id).one()
+        assert hourly.n_task_runs == 1, hourly.n_task_runs
+        assert hourly.n_completed == 0, hourly.n_completed
+
+    @with_context
+    def test_contribution_rollups_rebuilt_after_bulk_delete(self):
+        """Test CACHE PROJECT STATS rollups are emptied when the task runs of
+        a project are deleted in bulk."""
+        pr = ProjectFactory.create()
+        TaskRunFactory.create_batch(2, project=pr)
+
+        task_repo.delete_taskruns_from_project(pr)
+
+        hours = stats_hours(pr.id)
+        assert hours[3] is None, hours
+        users, anon_users, auth_users = stats_users(pr.id)
+        assert users['n_auth'] == 0, users
+
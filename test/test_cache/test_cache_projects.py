@@ -448,24 +448,24 @@ class TestProjectsCache(Test):
 
 
     @with_context
-    @patch('pybossa.cache.pickle')
+    @patch('pybossa.cache.codec')
     @patch('pybossa.cache.projects._n_draft')
-    def test_n_count_calls_n_draft(self, _n_draft, pickle):
+    def test_n_count_calls_n_draft(self, _n_draft, codec):
         """Test CACHE PROJECTS n_count calls _n_draft when called with argument
         'draft'"""
-        pickle.dumps.return_value = 'str'
+        codec.dumps.return_value = b'str'
         cached_projects.n_count('draft')
 
         _n_draft.assert_called_with()
 
 
     @with_context
-    @patch('pybossa.cache.pickle')
+    @patch('pybossa.cache.codec')
     @patch('pybossa.cache.projects._n_featured')
-    def test_n_count_calls_n_featuredt(self, _n_featured, pickle):
+    def test_n_count_calls_n_featuredt(self, _n_featured, codec):
         """Test CACHE PROJECTS n_count calls _n_featured when called with
         argument 'featured'"""
-        pickle.dumps.return_value = 'str'
+        codec.dumps.return_value = b'str'
         cached_projects.n_count('featured')
 
         _n_featured.assert_called_with()
@@ -588,6 +588,26 @@ class TestProjectsCache(Test):
         assert activity == last_task_run.finish_time, last_task_run
 
 
+    @with_context
+    def test_stats_many_return_the_same_as_single_calls(self):
+        """Test many returns the value of every project in one go"""
+        project = self.create_project_with_contributors(anonymous=2,
+                                                        registered=1)
+        TaskFactory.create(project=project, state='completed')
+        empty = ProjectFactory.create()
+        project_ids = [project.id, empty.id]
+
+        for stat in [cached_projects.n_tasks,
+                     cached_projects.n_completed_tasks,
+                     cached_projects.n_volunteers,
+                     cached_projects.overall_progress,
+                     cached_projects.last_activity]:
+            values = stat.many(project_ids)
+            expected = dict((project_id, stat(project_id))
+                            for project_id in project_ids)
+            assert values == expected, (stat, values, expected)
+
+
     @with_context
     def test_n_published_counts_published_projects(self):
         published_project = ProjectFactory.create_batch(2, published=True)
@@ -16,7 +16,8 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 
-from default import Test, with_context
+from default import Test, db, with_context
+from mock import patch
 from pybossa.cache import users as cached_users
 from pybossa.model.user import User
 from pybossa.leaderboard.jobs import leaderboard as update_leaderboard
@@ -522,3 +523,38 @@ class TestUsersCache(Test):
         for field in fields:
             assert field in list(users[0].keys()), field
         assert len(list(users[0].keys())) == len(fields)
+
+    @with_context
+    def test_get_user_by_api_key(self):
+        """Test CACHE USERS get_user_by_api_key returns the user attached to
+        the session, or None for unknown keys"""
+        user = UserFactory.create()
+        db.session.expunge_all()
+
+        found = cached_users.get_user_by_api_key(user.api_key)
+
+        assert found.id == user.id, found
+        assert found.name == user.name, found
+        assert found.info == user.info, found
+        assert found in db.session, found
+        assert cached_users.get_user_by_api_key('nokey') is None
+
+    @with_context
+    def test_get_user_by_api_key_rebuilds_cached_user(self):
+        """Test CACHE USERS get_user_by_api_key does not query the user when
+        its columns are cached"""
+        user = UserFactory.create()
+        data = cached_users.get_api_key_user(user.api_key)
+        db.session.expunge_all()
+
+        with patch('pybossa.cache.users.get_api_key_user') as cached:
+            cached.return_value = data
+            with patch.object(db.session, 'execute') as execute:
+                found = cached_users.get_user_by_api_key(user.api_key)
+
+        assert not execute.called
+        assert found.id == user.id, found
+        assert found.api_key == user.api_key, found
+        assert 'passwd_hash' not in data, data
+        assert 'email_addr' not in data, data
+        assert found.email_addr == user.email_addr, found
@@ -88,3 +88,34 @@ class TestContributionsGuard(object):
         self.guard.stamp(self.task, self.auth_user)
 
         assert self.guard.retrieve_timestamp(self.task, self.auth_user) == 'now'
+
+    @patch('pybossa.contributions_guard.make_timestamp')
+    def test_stamp_many_stamps_every_task(self, make_timestamp):
+        make_timestamp.return_value = 'now'
+        tasks = [Task(id=22), Task(id=23)]
+
+        expiration = self.guard.stamp_many(tasks, self.auth_user)
+
+        assert expiration is not None
+        for task in tasks:
+            assert self.guard.retrieve_timestamp(task, self.auth_user) == 'now'
+
+    def test_stamp_many_uses_given_ttl(self):
+        key = 'pybossa:task_requested:user:33:task:22'
+
+        self.guard.stamp_many([self.task], self.auth_user, ttl=120)
+
+        assert self.connection.ttl(key) == 120, self.connection.ttl(key)
+
+    def test_release_many_removes_stamps(self):
+        tasks = [Task(id=22), Task(id=23)]
+        self.guard.stamp_many(tasks, self.anon_user)
+
+        released = self.guard.release_many([22, 23, 24], self.anon_user)
+
+        assert released == 2, released
+        for task in tasks:
+            assert self.guard.check_task_stamped(task, self.anon_user) is False
+
+    def test_release_many_without_tasks(self):
+        assert self.guard.release_many([], self.auth_user) == 0
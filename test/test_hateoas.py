@@ -218,3 +218,40 @@ class TestHateoas(Test):
         # # when the links specification of a user will be set, modify the following
         # err_msg = "The list of links should be empty for now"
         # assert output.get('links') == None, err_msg
+
+    @with_context
+    def test_02_links_of_a_list(self):
+        """Test HATEOAS links of a list are built for every item"""
+        project = ProjectFactory.create()
+        TaskFactory.create_batch(3, project=project)
+
+        res = self.app.get("/api/task?project_id=%s" % project.id)
+        output = json.loads(res.data)
+        assert len(output) == 3, output
+        for task in output:
+            task_link = self.hateoas.link(
+                rel='self', title='task',
+                href='https://localhost/api/task/%s' % task['id'])
+            assert task['link'] == task_link, task['link']
+            project_link = self.hateoas.link(
+                rel='parent', title='project',
+                href='https://localhost/api/project/%s' % project.id)
+            assert task['links'] == [project_link], task['links']
+
+    @with_context
+    def test_03_links_disabled(self):
+        """Test HATEOAS links are skipped with links=0"""
+        res = self.app.get("/api/taskrun?links=0")
+        output = json.loads(res.data)
+        assert len(output) == 1, output
+        assert 'link' not in output[0], output
+        assert 'links' not in output[0], output
+
+        res = self.app.get("/api/project/1?links=false")
+        output = json.loads(res.data)
+        assert 'link' not in output, output
+        assert 'links' not in output, output
+
+        res = self.app.get("/api/project/1?links=1")
+        output = json.loads(res.data)
+        assert output['link'] is not None, output
@@ -201,3 +201,33 @@ class TestBulkTaskCSVImport(object):
         task = next(tasks)
 
         assert csv_file.encoding == 'utf-8'
+
+    def test_tasks_are_read_in_chunks(self, request):
+        csv_file = FakeResponse(text='Foo,n_answers\n1,2\n,\n3,4\n5,6\n7,8',
+                                status_code=200,
+                                headers={'content-type': 'text/plain'},
+                                encoding='utf-8')
+        request.return_value = csv_file
+        self.importer.chunk_size = 2
+
+        tasks = list(self.importer.tasks())
+
+        assert len(tasks) == 5, tasks
+        assert tasks[0] == {'info': {'Foo': 1}, 'n_answers': 2}, tasks[0]
+        assert tasks[1] == {'info': {'Foo': ''}}, tasks[1]
+        assert tasks[4] == {'info': {'Foo': 7}, 'n_answers': 8}, tasks[4]
+        # Foo has an empty cell, so it is a float column in every chunk.
+        assert isinstance(tasks[4]['info']['Foo'], float), tasks[4]
+        assert isinstance(tasks[4]['n_answers'], int), tasks[4]
+
+    def test_tasks_checks_every_chunk_before_returning_tasks(self, request):
+        csv_file = FakeResponse(text='Foo,Bar\n1,2\n3,4\n5,6,7',
+                                status_code=200,
+                                headers={'content-type': 'text/plain'},
+                                encoding='utf-8')
+        request.return_value = csv_file
+        self.importer.chunk_size = 2
+
+        tasks = self.importer.tasks()
+
+        assert_raises(BulkImportException, next, tasks)
@@ -0,0 +1,115 @@
+# -*- coding: utf8 -*-
+# This file is part of PYBOSSA.
+#
+# Copyright (C) 2015 Scifabric LTD.
+#
+# PYBOSSA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PYBOSSA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from pybossa.importers.fetch import Fetcher
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    """Answer /<n> with n after a short wait, and /flaky with 503 the first
+    time it is requested."""
+
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+    flaky_calls = 0
+
+    def do_GET(self):
+        cls = self.__class__
+        with cls.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            if self.path == '/flaky':
+                with cls.lock:
+                    cls.flaky_calls += 1
+                    calls = cls.flaky_calls
+                if calls == 1:
+                    return self._reply(503, b'busy')
+                return self._reply(200, b'ok')
+            time.sleep(0.05)
+            self._reply(200, self.path[1:].encode())
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def _reply(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+
+class TestFetcher(object):
+
+    def setUp(self):
+        StubHandler.in_flight = 0
+        StubHandler.max_in_flight = 0
+        StubHandler.flaky_calls = 0
+        self.server = StubServer(('127.0.0.1', 0), StubHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%s' % self.server.server_port
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_get_all_returns_responses_in_order(self):
+        fetcher = Fetcher(max_workers=4)
+        calls = [('%s/%s' % (self.url, n), dict()) for n in range(10)]
+
+        responses = fetcher.get_all(calls)
+
+        assert [r.text for r in responses] == [str(n) for n in range(10)]
+
+    def test_get_all_limits_requests_per_host(self):
+        fetcher = Fetcher(max_workers=8, per_host=2)
+        calls = [('%s/%s' % (self.url, n), dict()) for n in range(8)]
+
+        fetcher.get_all(calls)
+
+        assert StubHandler.max_in_flight == 2, StubHandler.max_in_flight
+
+    def test_get_retries_unavailable_responses(self):
+        fetcher = Fetcher()
+
+        response = fetcher.get('%s/flaky' % self.url)
+
+        assert response.status_code == 200, response.status_code
+        assert StubHandler.flaky_calls == 2, StubHandler.flaky_calls
+
+    def test_get_returns_last_response_when_retries_run_out(self):
+        fetcher = Fetcher(retries=0)
+
+        response = fetcher.get('%s/flaky' % self.url)
+
+        assert response.status_code == 503, response.status_code
@@ -26,7 +26,7 @@ from pybossa.importers import BulkImportException
 from pybossa.importers.flickr import BulkTaskFlickrImport
 
 
-@patch('pybossa.importers.flickr.requests')
+@patch('pybossa.importers.fetch.requests.Session')
 class TestBulkTaskFlickrImport(object):
 
     invalid_response = {'stat': 'fail',
@@ -68,7 +68,8 @@ class TestBulkTaskFlickrImport(object):
         return fake_response
 
     @with_context
-    def test_call_to_flickr_api_endpoint(self, requests):
+    def test_call_to_flickr_api_endpoint(self, Session):
+        requests = Session.return_value
         requests.get.return_value = self.make_response(json.dumps(self.response))
         self.importer._get_album_info()
         url = 'https://api.flickr.com/services/rest/'
@@ -77,10 +78,11 @@ class TestBulkTaskFlickrImport(object):
                    'photoset_id': '72157633923521788',
                    'format': 'json',
                    'nojsoncallback': '1'}
-        requests.get.assert_called_with(url, params=payload)
+        requests.get.assert_called_with(url, params=payload, timeout=30)
 
     @with_context
-    def test_call_to_flickr_api_uses_no_credentials(self, requests):
+    def test_call_to_flickr_api_uses_no_credentials(self, Session):
+        requests = Session.return_value
         requests.get.return_value = self.make_response(json.dumps(self.response))
         self.importer._get_album_info()
 
@@ -89,7 +91,8 @@ class TestBulkTaskFlickrImport(object):
         assert 'auth_token' not in url_call_params
 
     @with_context
-    def test_count_tasks_returns_number_of_photos_in_album(self, requests):
+    def test_count_tasks_returns_number_of_photos_in_album(self, Session):
+        requests = Session.return_value
         requests.get.return_value = self.make_response(json.dumps(self.response))
 
         number_of_tasks = self.importer.count_tasks()
@@ -97,20 +100,23 @@ class TestBulkTaskFlickrImport(object):
         assert number_of_tasks is 3, number_of_tasks
 
     @with_context
-    def test_count_tasks_raises_exception_if_invalid_album(self, requests):
+    def test_count_tasks_raises_exception_if_invalid_album(self, Session):
+        requests = Session.return_value
         requests.get.return_value = self.make_response(json.dumps(self.invalid_response))
         importer = BulkTaskFlickrImport(api_key='fake-key', album_id='bad')
 
         assert_raises(BulkImportException, importer.count_tasks)
 
     @with_context
-    def test_count_tasks_raises_exception_on_non_200_flickr_response(self, requests):
+    def test_count_tasks_raises_exception_on_non_200_flickr_response(self, Session):
+        requests = Session.return_value
         requests.get.return_value = self.make_response('Not Found', 404)
 
         assert_raises(BulkImportException, self.importer.count_tasks)
 
     @with_context
-    def test_tasks_returns_list_of_all_photos(self, requests):
+    def test_tasks_returns_list_of_all_photos(self, Session):
+        requests = Session.return_value
         requests.get.return_value = self.make_response(json.dumps(self.response))
 
         photos = self.importer.tasks()
@@ -118,7 +124,8 @@ class TestBulkTaskFlickrImport(object):
         assert len(photos) == 3, len(photos)
 
     @with_context
-    def test_tasks_returns_tasks_with_title_and_url_info_fields(self, requests):
+    def test_tasks_returns_tasks_with_title_and_url_info_fields(self, Session):
+        requests = Session.return_value
         requests.get.return_value = self.make_response(json.dumps(self.response))
         url = 'https://farm6.staticflickr.com/5441/8947115130_00e2301a0d.jpg'
         url_m = 'https://farm6.staticflickr.com/5441/8947115130_00e2301a0d_m.jpg'
@@ -134,20 +141,23 @@ class TestBulkTaskFlickrImport(object):
         assert photo['info'].get('link') == link, photo['info'].get('link')
 
     @with_context
-    def test_tasks_raises_exception_if_invalid_album(self, requests):
+    def test_tasks_raises_exception_if_invalid_album(self, Session):
+        requests = Session.return_value
         requests.get.return_value = self.make_response(json.dumps(self.invalid_response))
         importer = BulkTaskFlickrImport(api_key='fake-key', album_id='bad')
 
         assert_raises(BulkImportException, importer.tasks)
 
     @with_context
-    def test_tasks_raises_exception_on_non_200_flickr_response(self, requests):
+    def test_tasks_raises_exception_on_non_200_flickr_response(self, Session):
+        requests = Session.return_value
         requests.get.return_value = self.make_response('Not Found', 404)
 
         assert_raises(BulkImportException, self.importer.tasks)
 
     @with_context
-    def test_tasks_returns_all_for_sets_with_more_than_500_photos(self, requests):
+    def test_tasks_returns_all_for_sets_with_more_than_500_photos(self, Session):
+        requests = Session.return_value
         # Deep-copy the object, as we will be modifying it and we don't want
         # these modifications to affect other tests
         first_response = copy.deepcopy(self.response)
@@ -170,7 +180,8 @@ class TestBulkTaskFlickrImport(object):
         assert len(photos) == 600, len(photos)
 
     @with_context
-    def test_tasks_returns_all_for_sets_with_more_than_1000_photos(self, requests):
+    def test_tasks_returns_all_for_sets_with_more_than_1000_photos(self, Session):
+        requests = Session.return_value
         # Deep-copy the object, as we will be modifying it and we don't want
         # these modifications to affect other tests
         first_response = copy.deepcopy(self.response)
@@ -15,8 +15,11 @@
 #
 # You should have received a copy of the GNU Affero General Public License
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+import json
+import zipfile
 from default import Test, with_context, flask_app
-from factories import ProjectFactory, UserFactory
+from factories import ProjectFactory, UserFactory, TaskFactory, TaskRunFactory
+from pybossa.core import task_repo
 from pybossa.jobs import get_export_task_jobs, project_export
 from mock import patch
 
@@ -97,3 +100,118 @@ class TestExport(Test):
         project_export(0)
         assert not csv_exporter.pregenerate_zip_files.called
         assert not json_exporter.pregenerate_zip_files.called
+
+
+class TestIncrementalExport(Test):
+
+    def setUp(self):
+        super(TestIncrementalExport, self).setUp()
+        from pybossa.core import json_exporter, csv_exporter
+        self.json_exporter = json_exporter
+        self.csv_exporter = csv_exporter
+
+    def _zip(self, exporter, project, ty):
+        path = exporter._local_zip_path(project, ty)
+        return zipfile.ZipFile(path)
+
+    @with_context
+    def test_update_zip_appends_new_rows(self):
+        """Test update_zip only appends the task runs added since last run."""
+        project = ProjectFactory.create()
+        task = TaskFactory.create(project=project, n_answers=10)
+        old = TaskRunFactory.create_batch(2, task=task)
+        self.json_exporter.update_zip(project, 'task_run')
+        new = TaskRunFactory.create_batch(3, task=task)
+
+        self.json_exporter.update_zip(project, 'task_run')
+
+        _zip = self._zip(self.json_exporter, project, 'task_run')
+        full, delta = _zip.namelist()
+        assert delta == '%s_task_run_since_%d.json' % (project.short_name,
+                                                       old[-1].id), delta
+        assert [tr['id'] for tr in json.loads(_zip.read(full))] == \
+            [tr.id for tr in old]
+        assert [tr['id'] for tr in json.loads(_zip.read(delta))] == \
+            [tr.id for tr in new]
+
+    @with_context
+    def test_update_zip_csv_appends_new_rows(self):
+        """Test update_zip appends both CSV files for new task runs."""
+        project = ProjectFactory.create()
+        task = TaskFactory.create(project=project, n_answers=10)
+        old = TaskRunFactory.create(task=task)
+        self.csv_exporter.update_zip(project, 'task_run')
+        TaskRunFactory.create(task=task)
+
+        self.csv_exporter.update_zip(project, 'task_run')
+
+        names = self._zip(self.csv_exporter, project, 'task_run').namelist()
+        assert names[2:] == [
+            '%s_task_run_since_%d.csv' % (project.short_name, old.id),
+            '%s_task_run_info_only_since_%d.csv' % (project.short_name,
+                                                    old.id)], names
+
+    @with_context
+    @patch('pybossa.exporter.json_export.JsonExporter._make_zip')
+    def test_update_zip_skips_unchanged_tables(self, make_zip):
+        """Test update_zip does nothing when no rows changed."""
+        project = ProjectFactory.create()
+        TaskFactory.create(project=project)
+        self.json_exporter.update_zip(project, 'task')
+        with patch.object(self.json_exporter, '_zip_matches',
+                          return_value=True):
+            self.json_exporter.update_zip(project, 'task')
+
+        assert make_zip.call_count == 1, make_zip.call_count
+
+    @with_context
+    def test_update_zip_rebuilds_when_rows_change(self):
+        """Test update_zip generates the ZIP again if exported rows changed."""
+        project = ProjectFactory.create()
+        task, _ = TaskFactory.create_batch(2, project=project)
+        self.json_exporter.update_zip(project, 'task')
+        task.state = 'completed'
+        task_repo.update(task)
+        TaskFactory.create(project=project)
+
+        self.json_exporter.update_zip(project, 'task')
+
+        _zip = self._zip(self.json_exporter, project, 'task')
+        assert len(_zip.namelist()) == 1, _zip.namelist()
+        tasks = json.loads(_zip.read(_zip.namelist()[0]))
+        assert len(tasks) == 3, tasks
+        assert tasks[0]['state'] == 'completed', tasks[0]
+
+    @with_context
+    def test_table_state_is_a_watermark(self):
+        """Test the table state changes with added rows, not with edits."""
+        project = ProjectFactory.create()
+        task = TaskFactory.create(project=project, n_answers=10)
+        task_run = TaskRunFactory.create(task=task)
+        state = self.json_exporter._table_state('task_run', project.id)
+
+        task_run.info = dict(answer='edited')
+        task_repo.update(task_run)
+
+        assert self.json_exporter._table_state('task_run',
+                                               project.id) == state
+        new = TaskRunFactory.create(task=task)
+        assert self.json_exporter._table_state('task_run', project.id) == \
+            (new.id, '%d:2' % new.id)
+        assert self.json_exporter._table_state('task_run', project.id,
+                                               task_run.id) == state
+
+    @with_context
+    def test_update_zip_rebuilds_after_max_deltas(self):
+        """Test update_zip generates the ZIP again after EXPORT_MAX_DELTAS."""
+        project = ProjectFactory.create()
+        task = TaskFactory.create(project=project, n_answers=10)
+        with patch.dict(flask_app.config, {'EXPORT_MAX_DELTAS': 1}):
+            for i in range(3):
+                TaskRunFactory.create(task=task)
+                self.json_exporter.update_zip(project, 'task_run')
+
+        _zip = self._zip(self.json_exporter, project, 'task_run')
+        assert len(_zip.namelist()) == 1, _zip.namelist()
+        task_runs = json.loads(_zip.read(_zip.namelist()[0]))
+        assert len(task_runs) == 3, task_runs
@@ -18,6 +18,7 @@
 
 from default import Test, with_context, flask_app
 from pybossa.jobs import import_tasks, task_repo, get_autoimport_jobs
+from pybossa.jobs import import_progress
 from pybossa.model.task import Task
 from pybossa.importers import ImportReport
 from factories import ProjectFactory, TaskFactory, UserFactory
@@ -33,7 +34,18 @@ class TestImportTasksJob(Test):
 
         import_tasks(project.id, **form_data)
 
-        create.assert_called_once_with(task_repo, project.id, **form_data)
+        create.assert_called_once_with(task_repo, project.id,
+                                       progress=import_progress, **form_data)
+
+    @patch('pybossa.jobs.get_current_job')
+    def test_import_progress_saved_in_job_meta(self, get_current_job):
+        job = get_current_job.return_value
+        job.meta = dict()
+
+        import_progress(2000, 1500)
+
+        assert job.meta['progress'] == dict(read=2000, imported=1500)
+        job.save_meta.assert_called_once_with()
 
     @with_context
     @patch('pybossa.jobs.send_mail')
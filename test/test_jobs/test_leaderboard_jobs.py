@@ -18,16 +18,21 @@
 
 from pybossa.leaderboard.jobs import leaderboard
 from pybossa.leaderboard.data import get_leaderboard
-from pybossa.core import db
+from pybossa.core import db, sentinel
+from pybossa.leaderboard.ranking import Leaderboard
 from pybossa.jobs import get_leaderboard_jobs
 from factories import UserFactory, TaskRunFactory
 from default import Test, with_context
-from mock import patch, MagicMock
-from sqlalchemy.exc import ProgrammingError
+from mock import patch
 
 
 class TestLeaderboard(Test):
 
+    def assert_not_ranked_restricted(self, info=None):
+        board = Leaderboard(sentinel.master, info)
+        sql = 'select id from "user" where restrict=true'
+        for row in db.session.execute(sql):
+            assert board.rank(row.id) == (None, None), row
 
     @with_context
     def test_get_leaderboard_jobs_reads_settings(self):
@@ -40,46 +45,67 @@ class TestLeaderboard(Test):
             assert jobs[0]['kwargs'] == {'info': 'n'}, jobs[0]
 
     @with_context
-    @patch('pybossa.leaderboard.jobs.db')
-    def test_materialized_view_refreshed_concurrently(self, db_mock):
-        """Test JOB leaderboard materialized view is refreshed."""
-        result = MagicMock()
-        result.exists = True
-        results = [result]
-        db_mock.slave_session.execute.return_value = results
+    def test_leaderboard_loaded(self):
+        """Test JOB leaderboard loads the Redis leaderboard."""
+        board = Leaderboard(sentinel.master)
+        board.drop()
+        assert not board.is_loaded()
         res = leaderboard()
-        assert db_mock.session.execute.called
-        assert res == 'Materialized view refreshed concurrently'
+        assert board.is_loaded()
+        assert res == 'Leaderboard loaded'
 
     @with_context
-    @patch('pybossa.leaderboard.jobs.exists_materialized_view')
-    @patch('pybossa.leaderboard.jobs.db')
-    def test_materialized_view_refreshed(self, db_mock, exists_mock):
-        """Test JOB leaderboard materialized view is refreshed."""
-        result = MagicMock()
-        result.exists = True
-        results = [result]
-        exists_mock.return_value = True
-        db_mock.slave_session.execute.side_effect = results
-        db_mock.session.execute.side_effect = [ProgrammingError('foo',
-                                                                'bar',
-                                                                'bar'),
-                                               True]
-        res = leaderboard()
-        assert db_mock.session.execute.called
-        assert res == 'Materialized view refreshed'
+    def test_leaderboard_reconciles_scores(self):
+        """Test JOB leaderboard reconciles Redis scores with the DB."""
+        user = UserFactory.create()
+        TaskRunFactory.create_batch(2, user=user)
+        board = Leaderboard(sentinel.master)
+        assert board.rank(user.id) == (1, 2), board.rank(user.id)
+        board.incr(user.id, 5)
+        board.add(12345, 100)
+        leaderboard()
+        assert board.rank(user.id) == (1, 2), board.rank(user.id)
+        assert board.rank(12345) == (None, None)
 
     @with_context
-    @patch('pybossa.leaderboard.jobs.db')
-    def test_materialized_view_created(self, db_mock):
-        """Test JOB leaderboard materialized view is created."""
-        result = MagicMock()
-        result.exists = False
-        results = [result]
-        db_mock.slave_session.execute.return_value = results
-        res = leaderboard()
-        assert db_mock.session.commit.called
-        assert res == 'Materialized view created'
+    def test_leaderboard_keeps_increments_made_while_loading(self):
+        """Test JOB leaderboard adds scores submitted while it loads."""
+        users = UserFactory.create_batch(2)
+        TaskRunFactory.create(user=users[0])
+        board = Leaderboard(sentinel.master)
+        leaderboard()
+
+        def read_scores():
+            scores = [(users[0].id, 1), (users[1].id, 0)]
+            board.incr(users[0].id, 2)
+            board.incr(users[1].id)
+            return scores
+
+        board.load(read_scores)
+        assert board.rank(users[0].id) == (1, 3), board.rank(users[0].id)
+        assert board.rank(users[1].id) == (2, 1), board.rank(users[1].id)
+        assert not sentinel.master.exists(board.pending_key)
+        board.incr(users[1].id)
+        assert board.rank(users[1].id) == (2, 2), board.rank(users[1].id)
+        assert not sentinel.master.exists(board.pending_key)
+
+    @with_context
+    def test_leaderboard_updated_on_submit(self):
+        """Test leaderboard is updated without running the JOB."""
+        users = UserFactory.create_batch(3)
+        restricted = UserFactory.create(restrict=True)
+        TaskRunFactory.create_batch(3, user=users[2])
+        TaskRunFactory.create(user=users[1])
+        top_users = get_leaderboard()
+        assert [u['name'] for u in top_users[:2]] == [users[2].name,
+                                                       users[1].name]
+        assert top_users[0]['score'] == 3, top_users[0]
+        assert restricted.name not in [u['name'] for u in top_users]
+
+        users[2].restrict = True
+        db.session.commit()
+        top_users = get_leaderboard()
+        assert top_users[0]['name'] == users[1].name, top_users
 
     @with_context
     def test_anon_week(self):
@@ -97,9 +123,7 @@ class TestLeaderboard(Test):
         for u in top_users:
             assert u['name'] != restricted.name, u
 
-        results = db.session.execute('select * from users_rank');
-        for r in results:
-            assert r.restrict is False, r
+        self.assert_not_ranked_restricted()
 
     @with_context
     def test_leaderboard_foo_key(self):
@@ -116,9 +140,7 @@ class TestLeaderboard(Test):
             user['score'] == score, user
             score = score - 1
 
-        results = db.session.execute('select * from users_rank_foo');
-        for r in results:
-            assert r.restrict is False, r
+        self.assert_not_ranked_restricted(info='foo')
 
     @with_context
     def test_leaderboard_foo_dash_key(self):
@@ -135,9 +157,7 @@ class TestLeaderboard(Test):
             user['score'] == score, user
             score = score - 1
 
-        results = db.session.execute('select * from "users_rank_foo-dash"');
-        for r in results:
-            assert r.restrict is False, r
+        self.assert_not_ranked_restricted(info='foo-dash')
 
     @with_context
     def test_leaderboard_foo_key_current_user(self):
@@ -158,9 +178,7 @@ class TestLeaderboard(Test):
         assert top_users[-1]['name'] == users[0].name
         assert top_users[-1]['score'] == users[0].info.get('foo')
 
-        results = db.session.execute('select * from users_rank_foo');
-        for r in results:
-            assert r.restrict is False, r
+        self.assert_not_ranked_restricted(info='foo')
 
     @with_context
     def test_leaderboard_foo_dash_key_current_user(self):
@@ -181,9 +199,7 @@ class TestLeaderboard(Test):
         assert top_users[-1]['name'] == users[0].name
         assert top_users[-1]['score'] == users[0].info.get('foo-dash')
 
-        results = db.session.execute('select * from "users_rank_foo-dash"');
-        for r in results:
-            assert r.restrict is False, r
+        self.assert_not_ranked_restricted(info='foo-dash')
 
     @with_context
     def test_leaderboard_foo_key_current_user_window(self):
@@ -207,9 +223,7 @@ class TestLeaderboard(Test):
         assert top_users[24]['score'] >= myself.info.get('n')
         assert top_users[26]['score'] <= myself.info.get('n')
 
-        results = db.session.execute('select * from users_rank_n');
-        for r in results:
-            assert r.restrict is False, r
+        self.assert_not_ranked_restricted(info='n')
 
 
     @with_context
@@ -234,6 +248,4 @@ class TestLeaderboard(Test):
         assert top_users[24]['score'] >= myself.info.get('foo-dash')
         assert top_users[26]['score'] <= myself.info.get('foo-dash')
 
-        results = db.session.execute('select * from "users_rank_foo-dash"');
-        for r in results:
-            assert r.restrict is False, r
+        self.assert_not_ranked_restricted(info='foo-dash')
@@ -26,9 +26,11 @@ from pybossa.sched import (
     get_locked_task
 )
 from pybossa.core import sentinel
+from pybossa.redis_lock import LockManager
 from pybossa.contributions_guard import ContributionsGuard
 from default import with_context
 import json
+from time import time
 
 from mock import patch
 
@@ -257,3 +259,57 @@ class TestLockedSched(sched.Helper):
         timeout = 100
         acquire_lock(task_id, user_id, limit, timeout)
         assert has_lock(task_id, user_id, limit)
+
+    @with_context
+    def test_acquire_lock_respects_limit(self):
+        lock_manager = LockManager(sentinel.master, 100)
+        key = get_task_users_key(1)
+
+        assert lock_manager.acquire_lock(key, 1, 2)
+        assert lock_manager.acquire_lock(key, 2, 2)
+        assert not lock_manager.acquire_lock(key, 3, 2)
+        # A client already holding the lock keeps it
+        assert lock_manager.acquire_lock(key, 1, 2)
+
+    @with_context
+    def test_acquire_lock_prunes_expired_locks(self):
+        expired = LockManager(sentinel.master, 100)
+        key = get_task_users_key(1)
+        expired.acquire_lock(key, 1, 1)
+        sentinel.master.hset(key, 1, time() - 10)
+
+        lock_manager = LockManager(sentinel.master, 100)
+
+        assert lock_manager.acquire_lock(key, 2, 1)
+        assert list(lock_manager.get_locks(key).keys()) == [b'2']
+
+    @with_context
+    def test_acquire_any_lock_returns_first_granted(self):
+        lock_manager = LockManager(sentinel.master, 100)
+        keys = [get_task_users_key(task_id) for task_id in (1, 2, 3)]
+        lock_manager.acquire_lock(keys[0], 1, 1)
+
+        index = lock_manager.acquire_any_lock(keys, 2, [1, 1, 1])
+
+        assert index == 1, index
+        assert lock_manager.has_lock(keys[1], 2)
+        assert not lock_manager.has_lock(keys[2], 2)
+
+    @with_context
+    def test_acquire_any_lock_skips_granted_locks(self):
+        lock_manager = LockManager(sentinel.master, 100)
+        keys = [get_task_users_key(task_id) for task_id in (1, 2, 3)]
+
+        index = lock_manager.acquire_any_lock(keys, 2, [1, 1, 1], skip=1)
+
+        assert index == 1, index
+
+    @with_context
+    def test_acquire_any_lock_returns_None_if_no_lock_granted(self):
+        lock_manager = LockManager(sentinel.master, 100)
+        keys = [get_task_users_key(task_id) for task_id in (1, 2)]
+        for key in keys:
+            lock_manager.acquire_lock(key, 1, 1)
+
+        assert lock_manager.acquire_any_lock(keys, 2, [1, 1]) is None
+        assert lock_manager.acquire_any_lock([], 2, []) is None
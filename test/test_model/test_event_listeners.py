@@ -17,13 +17,12 @@
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 
 from default import Test, with_context
-from factories import TaskFactory, TaskRunFactory
+from factories import TaskFactory, TaskRunFactory, UserFactory
 from mock import patch, MagicMock
-from pybossa.core import db, task_repo, result_repo
+from pybossa.core import db, task_repo, result_repo, user_repo
 from pybossa.model.counter import Counter
 from pybossa.model.event_listeners import *
 from pybossa.jobs import notify_blog_users
-from sqlalchemy import func
 
 
 """Tests for model event listeners."""
@@ -219,7 +218,7 @@ class TestModelEventListeners(Test):
 
     @with_context
     def test_counter_works_add_counter(self):
-        """Test event listener when adding a task run adds a counter."""
+        """Test event listener when adding a task run increases its counter."""
 
         task_run = TaskRunFactory.create()
 
@@ -227,42 +226,29 @@ class TestModelEventListeners(Test):
                                                        task_id=task_run.task.id)\
                      .order_by(Counter.id).all()
 
-        assert len(counters) == 2, counters
-        for c in counters:
-            assert c.task_id == task_run.task.id, c
-            assert c.project_id == task_run.project.id, c
-
-        counters = db.session.query(Counter.project_id, Counter.task_id, func.sum(Counter.n_task_runs))\
-                     .filter_by(project_id=task_run.project.id,
-                                task_id=task_run.task.id)\
-                     .group_by(Counter.project_id, Counter.task_id).all()
-
         assert len(counters) == 1, counters
         counter = counters[0]
-        assert counter[1] == 1, counter
+        assert counter.task_id == task_run.task.id, counter
+        assert counter.project_id == task_run.project.id, counter
+        assert counter.n_task_runs == 1, counter
+
+        TaskRunFactory.create(task=task_run.task)
+        db.session.refresh(counter)
+
+        assert counter.n_task_runs == 2, counter
 
     @with_context
-    def test_delete_taskrun_adds_counter(self):
-        """Delete event for task run adds a counter."""
+    def test_delete_taskrun_decreases_counter(self):
+        """Delete event for task run decreases its counter."""
         task_run = TaskRunFactory.create()
 
         counters = db.session.query(Counter).filter_by(project_id=task_run.project.id,
                                                        task_id=task_run.task.id)\
                      .order_by(Counter.id).all()
 
-        assert len(counters) == 2, counters
-        for c in counters:
-            assert c.task_id == task_run.task.id, c
-            assert c.project_id == task_run.project.id, c
-
-        counters = db.session.query(Counter.project_id, Counter.task_id, func.sum(Counter.n_task_runs))\
-                     .filter_by(project_id=task_run.project.id,
-                                task_id=task_run.task.id)\
-                     .group_by(Counter.project_id, Counter.task_id).all()
-
         assert len(counters) == 1, counters
         counter = counters[0]
-        assert counter[2] == 1, counter
+        assert counter.n_task_runs == 1, counter
 
         db.session.delete(task_run)
         db.session.commit()
@@ -271,17 +257,38 @@ class TestModelEventListeners(Test):
                                                        task_id=task_run.task.id)\
                      .order_by(Counter.id).all()
 
-        assert len(counters) == 3, counters
-        for c in counters:
-            assert c.task_id == task_run.task.id, c
-            assert c.project_id == task_run.project.id, c
+        assert len(counters) == 1, counters
+        counter = counters[0]
+        assert counter.task_id == task_run.task.id, counter
+        assert counter.project_id == task_run.project.id, counter
+        assert counter.n_task_runs == 0, counter
 
+    @with_context
+    @patch('pybossa.cache.users.delete_memoized')
+    def test_reset_api_key_deletes_cached_user(self, delete_memoized):
+        """Changing the API key forgets the user of the old and new keys."""
+        from pybossa.cache.users import get_api_key_user
+        user = UserFactory.create()
+        old_api_key = user.api_key
+        delete_memoized.reset_mock()
 
-        counters = db.session.query(Counter.project_id, Counter.task_id, func.sum(Counter.n_task_runs))\
-                     .filter_by(project_id=task_run.project.id,
-                                task_id=task_run.task.id)\
-                     .group_by(Counter.project_id, Counter.task_id).all()
+        user.api_key = 'new-api-key'
+        user_repo.update(user)
 
-        assert len(counters) == 1, counters
-        counter = counters[0]
-        assert counter[2] == 0, counter
+        delete_memoized.assert_any_call(get_api_key_user, old_api_key)
+        delete_memoized.assert_any_call(get_api_key_user, 'new-api-key')
+
+    @with_context
+    @patch('pybossa.cache.users.delete_memoized')
+    def test_cached_api_key_user_deleted_after_commit(self, delete_memoized):
+        """The cached user is kept until the change is committed."""
+        from pybossa.cache.users import get_api_key_user
+        user = UserFactory.create()
+        delete_memoized.reset_mock()
+
+        user.api_key = 'new-api-key'
+        db.session.flush()
+        assert not delete_memoized.called
+
+        db.session.commit()
+        delete_memoized.assert_any_call(get_api_key_user, 'new-api-key')
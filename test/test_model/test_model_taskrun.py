@@ -59,3 +59,32 @@ class TestModelTaskRun(Test):
         db.session.add(task_run)
         assert_raises(IntegrityError, db.session.commit)
         db.session.rollback()
+
+    @with_context
+    def test_finish_time_range_uses_index(self):
+        """Test TASK_RUN finish_time ranges are answered from its index."""
+        from sqlalchemy import text
+        sql = text('''SELECT pybossa_timestamp(:valid) AS valid,
+                   pybossa_timestamp(:day) AS day,
+                   pybossa_timestamp(:utc) AS utc,
+                   pybossa_timestamp(:zoned) AS zoned,
+                   pybossa_timestamp(:invalid) AS invalid''')
+        row = db.session.execute(sql, dict(valid='2019-01-01T14:37:30.642119',
+                                           day='2019-01-01',
+                                           utc='2019-01-01T14:37:30Z',
+                                           zoned='2021-01-01T23:30:00-05:00',
+                                           invalid='now')).first()
+        assert row.valid.isoformat() == '2019-01-01T14:37:30.642119', row
+        assert row.day.isoformat() == '2019-01-01T00:00:00', row
+        assert row.utc.isoformat() == '2019-01-01T14:37:30', row
+        assert row.zoned.isoformat() == '2021-01-02T04:30:00', row
+        assert row.invalid is None, row
+
+        db.session.execute('SET enable_seqscan = off')
+        sql = text('''EXPLAIN SELECT COUNT(id) FROM task_run
+                   WHERE project_id=1 AND
+                   pybossa_timestamp(task_run.finish_time)
+                   >= NOW() AT TIME ZONE 'utc' - '2 week'::INTERVAL''')
+        plan = ' '.join(row[0] for row in db.session.execute(sql))
+        db.session.rollback()
+        assert 'task_run_project_id_finish_time_idx' in plan, plan
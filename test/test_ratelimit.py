@@ -93,7 +93,7 @@ class TestAPI(object):
     @patch('pybossa.api.api_base.APIBase._db_query')
     def test_00_project_get(self, mock):
         """Test API.project GET rate limit."""
-        mock.return_value = {}
+        mock.return_value = ([], [])
         # GET as Anonymous
         url = '/api/project'
         action = 'get'
@@ -608,6 +608,66 @@ class TestTaskRepositorySaveDeleteUpdate(Test):
         assert_raises(WrongObjectError, self.task_repo.save, bad_object)
 
 
+    @with_context
+    def test_import_tasks_skips_repeated_info(self):
+        """Test import_tasks inserts in batches only the tasks whose info is
+        not in the project yet"""
+
+        project = ProjectFactory.create()
+        TaskFactory.create(project=project, info={'n': 0})
+        tasks = [Task(project_id=project.id, info={'n': i % 5})
+                 for i in range(12)]
+
+        n = self.task_repo.import_tasks(tasks, batch_size=3)
+
+        assert n == 4, n
+        imported = self.task_repo.filter_tasks_by(project_id=project.id)
+        assert sorted(t.info['n'] for t in imported) == list(range(5))
+        for task in imported:
+            assert task.n_answers == 30, task
+            assert task.state == 'ongoing', task
+        sql = 'select count(*) from counter where project_id=%s' % project.id
+        assert db.session.execute(sql).scalar() == 5
+
+
+    @with_context
+    def test_import_tasks_hashes_only_first_repeated_task(self):
+        """Test tasks saved with repeated info do not break the import"""
+
+        project = ProjectFactory.create()
+        first, second = TaskFactory.create_batch(2, project=project,
+                                                 info={'n': 1})
+
+        assert first.info_hash is not None
+        assert second.info_hash is None
+        n = self.task_repo.import_tasks([Task(project_id=project.id,
+                                              info={'n': 1})])
+        assert n == 0, n
+
+
+    @with_context
+    def test_import_tasks_compares_numbers_by_value(self):
+        """Test import_tasks skips tasks whose info only differs in how its
+        numbers are written"""
+
+        project = ProjectFactory.create()
+        TaskFactory.create(project=project, info={'n': 1, 'x': [1.5, 2]})
+        tasks = [Task(project_id=project.id, info={'n': 1.0, 'x': [1.5, 2.0]}),
+                 Task(project_id=project.id, info={'n': 1, 'x': [2, 1.5]})]
+
+        n = self.task_repo.import_tasks(tasks)
+
+        assert n == 1, n
+
+
+    @with_context
+    def test_import_tasks_only_imports_tasks(self):
+        """Test import_tasks raises a WrongObjectError for other objects"""
+
+        assert_raises(WrongObjectError, self.task_repo.import_tasks,
+                      [dict()])
+
+
     @with_context
     def test_update_task(self):
         """Test update persists the changes made to Task instances"""
@@ -0,0 +1,117 @@
+# -*- coding: utf8 -*-
+# This file is part of PYBOSSA.
+#
+# Copyright (C) 2018 Scifabric LTD.
+#
+# PYBOSSA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PYBOSSA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+import json
+
+from helper import sched
+from default import with_context
+from pybossa.core import sentinel, task_repo
+from pybossa.sched import get_depth_first_cached_task
+from pybossa.task_queue import TaskQueue
+from factories import TaskFactory, ProjectFactory, TaskRunFactory
+from factories import UserFactory
+
+
+class TestSchedDepthFirstCached(sched.Helper):
+
+    @with_context
+    def test_falls_back_to_db_and_loads_queue(self):
+        project = ProjectFactory.create(info=dict(sched='depth_first_cached'))
+        tasks = TaskFactory.create_batch(3, project=project)
+        queue = TaskQueue(sentinel.master)
+
+        assert queue.generation(project.id) is None
+        res = get_depth_first_cached_task(project.id, orderby='id', desc=False)
+
+        assert res[0].id == tasks[0].id
+        assert queue.generation(project.id) is not None
+        assert queue.candidates(project.id, 'id', False, 0, -1) == \
+            [task.id for task in tasks]
+
+    @with_context
+    def test_skips_tasks_already_answered(self):
+        project = ProjectFactory.create(info=dict(sched='depth_first_cached'))
+        user = UserFactory.create()
+        tasks = TaskFactory.create_batch(3, project=project, n_answers=2)
+        get_depth_first_cached_task(project.id, user.id)
+
+        TaskRunFactory.create(task=tasks[0], user=user)
+        res = get_depth_first_cached_task(project.id, user.id,
+                                          orderby='id', desc=False)
+
+        assert res[0].id == tasks[1].id
+
+    @with_context
+    def test_follows_priority_and_offset(self):
+        project = ProjectFactory.create(info=dict(sched='depth_first_cached'))
+        TaskFactory.create(project=project, priority_0=0.1)
+        high = TaskFactory.create(project=project, priority_0=0.9)
+        mid = TaskFactory.create(project=project, priority_0=0.5)
+        get_depth_first_cached_task(project.id)
+
+        res = get_depth_first_cached_task(project.id, limit=2)
+        assert [task.id for task in res] == [high.id, mid.id]
+
+        res = get_depth_first_cached_task(project.id, offset=1)
+        assert [task.id for task in res] == [mid.id]
+
+    @with_context
+    def test_completed_tasks_leave_the_queue(self):
+        project = ProjectFactory.create(info=dict(sched='depth_first_cached'))
+        task = TaskFactory.create(project=project, n_answers=1)
+        get_depth_first_cached_task(project.id)
+
+        TaskRunFactory.create(task=task)
+
+        assert get_depth_first_cached_task(project.id, 999) == []
+        assert TaskQueue(sentinel.master).candidates(
+            project.id, 'id', False, 0, -1) == []
+
+    @with_context
+    def test_new_tasks_join_the_queue(self):
+        project = ProjectFactory.create(info=dict(sched='depth_first_cached'))
+        get_depth_first_cached_task(project.id)
+
+        task = TaskFactory.create(project=project)
+
+        res = get_depth_first_cached_task(project.id)
+        assert res[0].id == task.id
+
+    @with_context
+    def test_newtask_api(self):
+        project = ProjectFactory.create(info=dict(sched='depth_first_cached'))
+        TaskFactory.create_batch(2, project=project, info='hola')
+
+        res = self.app.get('api/project/%s/newtask' % project.id)
+        data = json.loads(res.data)
+        task_id = data['id']
+        taskrun = dict(project_id=project.id, task_id=task_id, info='hola')
+        self.app.post('api/taskrun', data=json.dumps(taskrun))
+
+        res = self.app.get('api/project/%s/newtask' % project.id)
+        data = json.loads(res.data)
+        assert data['id'] != task_id, data
+
+    @with_context
+    def test_bulk_updates_drop_the_queue(self):
+        project = ProjectFactory.create(info=dict(sched='depth_first_cached'))
+        TaskFactory.create_batch(2, project=project)
+        get_depth_first_cached_task(project.id)
+
+        task_repo.update_tasks_redundancy(project, 5)
+
+        assert TaskQueue(sentinel.master).generation(project.id) is None
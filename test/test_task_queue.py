@@ -0,0 +1,136 @@
+# -*- coding: utf8 -*-
+# This file is part of PYBOSSA.
+#
+# Copyright (C) 2018 Scifabric LTD.
+#
+# PYBOSSA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PYBOSSA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+
+from pybossa.task_queue import TaskQueue, get_user_param
+import settings_test
+from redis.sentinel import Sentinel
+
+
+class TestTaskQueue(object):
+
+    def setUp(self):
+        sentinel = Sentinel(settings_test.REDIS_SENTINEL)
+        db = getattr(settings_test, 'REDIS_DB', 0)
+        self.connection = sentinel.master_for('mymaster', db=db)
+        self.connection.flushall()
+        self.queue = TaskQueue(self.connection)
+        self.user = ('user_id', 33)
+
+    def test_generation_is_None_if_not_loaded(self):
+        assert self.queue.generation(1) is None
+
+    def test_load_sets_generation(self):
+        generation = self.queue.load(1, [(1, 0.5), (2, 0.1)])
+
+        assert self.queue.generation(1) == generation
+
+    def test_load_adds_late_tasks(self):
+        """Tasks created while loading are added once the queue is loaded."""
+        def late_tasks():
+            assert self.queue.generation(1) is not None
+            return [(3, 0.7)]
+
+        self.queue.load(1, [(1, 0.5), (2, 0.1)], late_tasks)
+
+        assert self.queue.candidates(1, 'id', False, 0, -1) == [1, 2, 3]
+
+    def test_candidates_by_priority(self):
+        self.queue.load(1, [(1, 0.1), (2, 0.9), (3, 0.5)])
+
+        assert self.queue.candidates(1, 'priority_0', True, 0, -1) == [2, 3, 1]
+
+    def test_candidates_by_id(self):
+        self.queue.load(1, [(3, 0.1), (1, 0.9), (2, 0.5)])
+
+        assert self.queue.candidates(1, 'id', False, 0, -1) == [1, 2, 3]
+        assert self.queue.candidates(1, 'id', True, 0, 0) == [3]
+
+    def test_add_task_only_if_loaded(self):
+        assert self.queue.add_task(1, 1, 0.5) is False
+        assert self.queue.candidates(1, 'id', False, 0, -1) == []
+
+        self.queue.load(1, [])
+
+        assert self.queue.add_task(1, 1, 0.5) is True
+        assert self.queue.candidates(1, 'id', False, 0, -1) == [1]
+
+    def test_remove_task(self):
+        self.queue.load(1, [(1, 0.1), (2, 0.9)])
+
+        self.queue.remove_task(1, 2)
+
+        assert self.queue.candidates(1, 'priority_0', True, 0, -1) == [1]
+
+    def test_seen_is_None_if_not_cached(self):
+        generation = self.queue.load(1, [(1, 0.1)])
+
+        assert self.queue.get_seen(1, generation, self.user) is None
+
+    def test_seen_empty_history_is_cached(self):
+        generation = self.queue.load(1, [(1, 0.1)])
+
+        self.queue.set_seen(1, generation, self.user, [])
+
+        assert self.queue.get_seen(1, generation, self.user) == set()
+
+    def test_mark_seen_only_if_cached(self):
+        generation = self.queue.load(1, [(1, 0.1), (2, 0.2)])
+
+        assert self.queue.mark_seen(1, self.user, 1) is False
+
+        self.queue.set_seen(1, generation, self.user, [1])
+
+        assert self.queue.mark_seen(1, self.user, 2) is True
+        assert self.queue.get_seen(1, generation, self.user) == set([1, 2])
+
+        self.queue.unmark_seen(1, self.user, 2)
+        assert self.queue.get_seen(1, generation, self.user) == set([1])
+
+    def test_mark_seen_many(self):
+        generation = self.queue.load(1, [(1, 0.1), (2, 0.2)])
+        other = ('user_ip', '1.1.1.1')
+        self.queue.set_seen(1, generation, self.user, [])
+
+        self.queue.mark_seen_many([(1, self.user, 1), (1, self.user, 2),
+                                   (1, other, 1), (2, self.user, 1)])
+
+        assert self.queue.get_seen(1, generation, self.user) == set([1, 2])
+        assert self.queue.get_seen(1, generation, other) is None
+        assert self.queue.generation(2) is None
+
+    def test_drop_invalidates_queue_and_seen_sets(self):
+        generation = self.queue.load(1, [(1, 0.1)])
+        self.queue.set_seen(1, generation, self.user, [1])
+
+        self.queue.drop(1)
+
+        assert self.queue.generation(1) is None
+        assert self.queue.candidates(1, 'id', False, 0, -1) == []
+        new_generation = self.queue.load(1, [(1, 0.1)])
+        assert new_generation != generation
+        assert self.queue.get_seen(1, new_generation, self.user) is None
+
+    def test_acquire_loading_only_once(self):
+        assert self.queue.acquire_loading(1) is True
+        assert self.queue.acquire_loading(1) is False
+
+    def test_get_user_param(self):
+        assert get_user_param(3) == ('user_id', 3)
+        assert get_user_param(None, '1.1.1.1') == ('user_ip', '1.1.1.1')
+        assert get_user_param(None, None) == ('user_ip', '127.0.0.1')
+        assert get_user_param(3, None, 'ext') == ('external_uid', 'ext')
@@ -311,6 +311,30 @@ class TestWeb(web.Helper):
         assert res.status_code == 200, res.status_code
         assert "Distribution" in str(res.data), res.data
 
+    @with_context
+    def test_project_details_etag(self):
+        """Test WEB project details and stats pages answer If-None-Match"""
+        project = ProjectFactory.create(published=True)
+        for url in ['/project/%s/' % project.short_name,
+                    '/project/%s/stats' % project.short_name]:
+            res = self.app.get(url)
+            etag = res.headers.get('ETag')
+            assert res.status_code == 200, res.status_code
+            assert res.headers['Cache-Control'] == 'private, no-cache', url
+
+            res = self.app.get(url, headers=[('If-None-Match', etag)])
+            assert res.status_code == 304, res.status_code
+
+            # JSON is another representation
+            res = self.app.get(url, headers=[('If-None-Match', etag),
+                                             ('Content-Type',
+                                              'application/json')])
+            assert res.status_code == 200, res.status_code
+
+        TaskRunFactory.create(project=project)
+        res = self.app.get(url, headers=[('If-None-Match', etag)])
+        assert res.status_code == 200, res.status_code
+
     @with_context
     def test_project_stats_json(self):
         """Test WEB project stats page works JSON"""
@@ -4335,6 +4359,46 @@ class TestWeb(web.Helper):
 
         assert exported_task_runs == [], exported_task_runs
 
+    @with_context
+    @patch('pybossa.exporter.Exporter.chunk_size', 2)
+    def test_export_task_json_in_chunks(self):
+        """Test WEB export Tasks to JSON streams every chunk of tasks"""
+        project = ProjectFactory.create()
+        self.clear_temp_container(project.owner_id)
+        tasks = TaskFactory.create_batch(5, project=project,
+                                         info={'question': 'qu'})
+        uri = "/project/%s/tasks/export?type=task&format=json" % project.short_name
+        res = self.app.get(uri, follow_redirects=True)
+        zip = zipfile.ZipFile(BytesIO(res.data))
+        extracted_filename = zip.namelist()[0]
+
+        exported_tasks = json.loads(zip.read(extracted_filename))
+
+        assert [t['id'] for t in exported_tasks] == [t.id for t in tasks]
+        assert exported_tasks[0] == tasks[0].dictize(), exported_tasks[0]
+
+    @with_context
+    @patch('pybossa.exporter.Exporter.chunk_size', 2)
+    def test_export_task_csv_in_chunks(self):
+        """Test WEB export Tasks to CSV includes the columns of every chunk"""
+        project = ProjectFactory.create()
+        self.clear_temp_container(project.owner_id)
+        tasks = TaskFactory.create_batch(4, project=project,
+                                         info={'question': 'qu'})
+        tasks.append(TaskFactory.create(project=project,
+                                        info={'question': 'qu', 'late': 1}))
+        uri = "/project/%s/tasks/export?type=task&format=csv" % project.short_name
+        res = self.app.get(uri, follow_redirects=True)
+        zip = zipfile.ZipFile(BytesIO(res.data))
+
+        csvreader = pd.read_csv(BytesIO(zip.read('project1_task.csv')))
+        info = pd.read_csv(BytesIO(zip.read('project1_task_info_only.csv')))
+
+        assert list(csvreader['id']) == [t.id for t in tasks]
+        assert 'info_late' in csvreader.columns, csvreader.columns
+        assert list(info.columns) == ['question', 'task_id', 'late'], info.columns
+        assert info['late'].isnull().sum() == 4
+
     @with_context
     def test_export_result_csv_with_no_keys(self):
         """Test WEB export Results to CSV with no keys works"""